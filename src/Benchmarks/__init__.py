@@ -0,0 +1,66 @@
+"""
+Performance benchmarks for DungeonBot. Benchmarks are run from the src/ directory, i.e.
+
+python3 -m Benchmarks --output results.json
+python3 -m Benchmarks.encoding
+"""
+import json
+import statistics
+import time
+
+def _summarize(samples: list) -> dict:
+    return {
+        "repeat": len(samples),
+        "mean_ms": statistics.fmean(samples),
+        "median_ms": statistics.median(samples),
+        "min_ms": min(samples),
+        "max_ms": max(samples)
+    }
+
+def time_call(func, *args, repeat: int = 20, warmup: int = 2, **kwargs) -> dict:
+    """
+    Times repeated calls to func
+
+    :param func: Callable being measured
+    :param repeat: Number of timed calls
+    :param warmup: Number of untimed calls made first
+    :return: dict with repeat, mean_ms, median_ms, min_ms and max_ms keys
+    """
+    for i in range(warmup):
+        func(*args, **kwargs)
+
+    samples: list[float] = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        samples.append((time.perf_counter() - start) * 1000)
+
+    return _summarize(samples)
+
+def time_indexed(func, repeat: int = 20, setup = None) -> dict:
+    """
+    Times func(i) for i in range(repeat), letting each call target different data. When setup is passed,
+    setup(i) is called untimed before each call.
+
+    :return: dict with repeat, mean_ms, median_ms, min_ms and max_ms keys
+    """
+    samples: list[float] = []
+    for i in range(repeat):
+        if setup is not None:
+            setup(i)
+        start = time.perf_counter()
+        func(i)
+        samples.append((time.perf_counter() - start) * 1000)
+
+    return _summarize(samples)
+
+def result(suite: str, name: str, timing: dict, **params) -> dict:
+    """
+    Builds a benchmark result entry. The name must be unique within its suite so runs from different
+    commits can be matched up.
+    """
+    return {"suite": suite, "name": name, **params, **timing}
+
+def print_results(results: list):
+    """Prints benchmark results as indented JSON"""
+    print(json.dumps(results, indent=2))
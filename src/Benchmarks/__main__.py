@@ -0,0 +1,70 @@
+"""
+Runs every benchmark suite and writes the results as JSON. Passing --compare prints the change in mean
+time for each benchmark against an earlier results file, i.e. one produced on another commit.
+
+python3 -m Benchmarks [--output results.json] [--users 10000 100000 1000000] [--repeat N] [--compare baseline.json]
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from Benchmarks import dice, database, embed, encoding, startup
+
+SUITES: dict = {
+    "dice": lambda arguments: dice.run(arguments.repeat),
+    "encoding": lambda arguments: encoding.run(arguments.repeat),
+    "database": lambda arguments: database.run(arguments.users, arguments.repeat),
+    "embed": lambda arguments: embed.run(repeat=arguments.repeat),
+    "startup": lambda arguments: startup.run(arguments.repeat),
+}
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(baseline: dict, current: dict):
+    """Prints the relative change in mean time for every benchmark present in both reports"""
+    previous: dict = {(entry["suite"], entry["name"]): entry for entry in baseline["results"]}
+    print(f"Comparing {current.get('commit')} against {baseline.get('commit')}")
+    for entry in current["results"]:
+        before = previous.get((entry["suite"], entry["name"]))
+        if before is None or before["mean_ms"] == 0:
+            continue
+        change = (entry["mean_ms"] - before["mean_ms"]) / before["mean_ms"] * 100
+        print(f"{entry['suite']:>9} {entry['name']:<55} {before['mean_ms']:10.4f} ms -> {entry['mean_ms']:10.4f} ms ({change:+7.1f}%)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    parser.add_argument("--suites", nargs="+", choices=tuple(SUITES), default=list(SUITES))
+    parser.add_argument("--users", type=int, nargs="+", default=[10000], help="Synthetic database sizes")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--compare", help="Earlier JSON report to compare against")
+    arguments = parser.parse_args()
+
+    report: dict = {
+        "commit": _git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": []
+    }
+    for suite in arguments.suites:
+        print(f"Running {suite} benchmarks...", file=sys.stderr)
+        report["results"].extend(SUITES[suite](arguments))
+
+    if arguments.output:
+        with open(arguments.output, "w") as output:
+            json.dump(report, output, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if arguments.compare:
+        with open(arguments.compare) as baseline:
+            compare(json.load(baseline), report)
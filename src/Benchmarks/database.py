@@ -0,0 +1,184 @@
+"""
+Benchmarks every usersDB and orderDB function against synthetic databases
+
+python3 -m Benchmarks.database [--users 10000 100000 1000000] [--repeat N]
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+
+import DBHelper
+from DBHelper import usersDB, orderDB, encounterDB, USERS_TABLE, ORDER_COMMAND_TABLE, USER_ID, NAME, ROLL, MODIFIER
+from DBHelper.orderCache import order_cache
+from DBHelper.encounterCache import encounter_cache
+from DBHelper.groupCommit import GroupCommitWorker
+from Benchmarks import time_indexed, result, print_results
+
+ORDERS_PER_USER: int = 3
+BURST_SIZE: int = 200
+SHARD_COUNTS: tuple = (1, 4)
+GUILDS: int = 8
+
+def use_database(path: str):
+    """
+    Points DBHelper at the database file at path and initializes it. Connections to the previous
+    database are closed and the order cache is emptied.
+    """
+    DBHelper.close_connections()
+    DBHelper.DATABASE_DIRECTORY = path
+    DBHelper.init_database()
+    order_cache.clear()
+
+def build_synthetic_database(path: str, users: int, orders_per_user: int = ORDERS_PER_USER):
+    """
+    Creates a database at path holding user ids 1 to users, each with orders_per_user characters
+    named "Character 1", "Character 2", ...
+    """
+    use_database(path)
+    generator = random.Random(users)
+
+    with DBHelper.transaction() as conn:
+        conn.executemany(f"INSERT INTO {USERS_TABLE} VALUES (?);", ((user_id,) for user_id in range(1, users + 1)))
+        conn.executemany(
+            f"INSERT INTO {ORDER_COMMAND_TABLE} ({USER_ID}, {NAME}, {ROLL}, {MODIFIER}) VALUES (?, ?, ?, ?);",
+            (
+                (user_id, f"Character {k}", generator.randint(1, 20), generator.randint(-2, 5))
+                for user_id in range(1, users + 1)
+                for k in range(1, orders_per_user + 1)
+            )
+        )
+
+def write_burst(user_id: int, grouped: bool = True, size: int = BURST_SIZE):
+    """
+    Adds size characters for user_id through a new GroupCommitWorker. Grouped bursts submit every write at
+    once so they are committed together, otherwise each write waits for the previous one's durable commit.
+    """
+    worker = GroupCommitWorker()
+    try:
+        if grouped:
+            futures = [worker.submit(orderDB.add_order_command, (user_id, f"Burst {k}", 10, 1)) for k in range(size)]
+            for future in futures:
+                future.result()
+        else:
+            for k in range(size):
+                worker.submit(orderDB.add_order_command, (user_id, f"Burst {k}", 10, 1)).result()
+    finally:
+        worker.shutdown()
+
+def write_guild_burst(workers: list, size: int = BURST_SIZE):
+    """
+    Adds size characters spread across GUILDS guilds, each write submitted to the worker of its guild's shard
+    """
+    futures: list = []
+    for k in range(size):
+        guild_id: int = 1 + k % GUILDS
+        futures.append(workers[DBHelper.shard_for_guild(guild_id)].submit(
+            orderDB.add_order_command, (1, f"Burst {k}", 10, 1), {"guild_id": guild_id, "channel_id": guild_id}))
+    for future in futures:
+        future.result()
+
+def _run_shards(directory: str, repeat: int) -> list:
+    """Measures durable write bursts spread across GUILDS guilds for each of SHARD_COUNTS"""
+    original_shards: int = DBHelper.SHARD_COUNT
+    results: list = []
+
+    try:
+        for shards in SHARD_COUNTS:
+            DBHelper.SHARD_COUNT = shards
+            use_database(os.path.join(directory, f"shards_{shards}.db"))
+            workers: list = [GroupCommitWorker(shard) for shard in range(shards)]
+            try:
+                timing = time_indexed(lambda i: write_guild_burst(workers), min(repeat, 5))
+                results.append(result("database", f"shards.burst={BURST_SIZE}.shards={shards}", timing, shards=shards))
+            finally:
+                for worker in workers:
+                    worker.shutdown()
+    finally:
+        DBHelper.SHARD_COUNT = original_shards
+
+    return results
+
+def _run_population(users: int, repeat: int) -> list:
+    generator = random.Random(0)
+    targets: list[int] = [generator.randint(1, users) for i in range(repeat)]
+    new_ids: list[int] = [users + 1 + i for i in range(repeat)]
+    suite: str = "database"
+    params: dict = {"users": users}
+    results: list = []
+
+    def add(name: str, func, setup = None, count: int = repeat):
+        results.append(result(suite, f"{name}.users={users}", time_indexed(func, count, setup), **params))
+
+    #usersDB
+    add("usersDB.get_user", lambda i: usersDB.get_user(targets[i]))
+    add("usersDB.verify_user", lambda i: usersDB.verify_user(targets[i]))
+    add("usersDB.verify_or_add_user", lambda i: usersDB.verify_or_add_user(targets[i]))
+    add("usersDB.add_user", lambda i: usersDB.add_user(new_ids[i]))
+    add("usersDB.remove_user", lambda i: usersDB.remove_user(new_ids[i]))
+    add("usersDB.add_many_users", lambda i: usersDB.add_many_users([(users + repeat + 1 + i * 100 + k,) for k in range(100)]))
+    add("usersDB.get_all_users", lambda i: usersDB.get_all_users(), count=min(repeat, 3))
+
+    #orderDB reads, cold (from SQLite) and warm (from the order cache)
+    cold = lambda i: order_cache.invalidate((targets[i], 0, 0))
+    add("orderDB.get_initiative_order.cold", lambda i: orderDB.get_initiative_order(targets[i]), setup=cold)
+    add("orderDB.get_initiative_order.warm", lambda i: orderDB.get_initiative_order(targets[i]))
+    add("orderDB.get_one_order.cold", lambda i: orderDB.get_one_order(targets[i], "Character 2"), setup=cold)
+    add("orderDB.get_character_id.cold", lambda i: orderDB.get_character_id(targets[i], "Character 2"), setup=cold)
+
+    char_ids: list[int] = [orderDB.get_character_id(target, "Character 1") for target in targets]
+    add("orderDB.get_character_by_id", lambda i: orderDB.get_character_by_id(char_ids[i]))
+
+    #orderDB writes
+    add("orderDB.add_order_command", lambda i: orderDB.add_order_command(targets[i], f"Bench {i}", 10, 1))
+    add("orderDB.update_character_by_id", lambda i: orderDB.update_character_by_id(char_ids[i], roll_value=15, modifier=2))
+    add("orderDB.update_character", lambda i: orderDB.update_character(targets[i], f"Bench {i}", roll_value=12))
+    add("orderDB.remove_one_order", lambda i: orderDB.remove_one_order(targets[i], f"Bench {i}"))
+
+    #encounterDB turns, cold (reloaded from SQLite) and warm (moved within the in-memory encounter)
+    add("encounterDB.next_turn.cold", lambda i: encounterDB.next_turn(targets[i]), setup=lambda i: encounter_cache.invalidate((targets[i], 0, 0)))
+    add("encounterDB.next_turn.warm", lambda i: encounterDB.next_turn(targets[i]))
+    add("orderDB.update_character.in_combat", lambda i: orderDB.update_character(targets[i], "Character 2", roll_value=i % 20 + 1))
+    add("orderDB.clear_user_order", lambda i: orderDB.clear_user_order(targets[i]))
+
+    #BURST_SIZE durable writes committed in groups or one commit per write
+    add(f"groupCommit.grouped.burst={BURST_SIZE}", lambda i: write_burst(targets[i], grouped=True), count=min(repeat, 5))
+    add(f"groupCommit.serial.burst={BURST_SIZE}", lambda i: write_burst(targets[i], grouped=False), count=min(repeat, 5))
+
+    return results
+
+def run(populations: list = [10000], repeat: int = 20) -> list:
+    """
+    Builds a synthetic database for each population size and benchmarks the DBHelper functions against it,
+    then measures write bursts across guilds for each of SHARD_COUNTS
+
+    :param populations: Numbers of users to generate
+    :param repeat: Timed calls per function
+    :return: list of result dicts
+    """
+    original_database: str = DBHelper.DATABASE_DIRECTORY
+    directory: str = tempfile.mkdtemp(prefix="dungeonbot-bench-")
+    results: list = []
+
+    try:
+        for users in populations:
+            build_synthetic_database(os.path.join(directory, f"users_{users}.db"), users)
+            results.extend(_run_population(users, repeat))
+        results.extend(_run_shards(directory, repeat))
+    finally:
+        DBHelper.close_connections()
+        DBHelper.DATABASE_DIRECTORY = original_database
+        order_cache.clear()
+        encounter_cache.clear()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, nargs="+", default=[10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    arguments = parser.parse_args()
+
+    print_results(run(arguments.users, arguments.repeat))
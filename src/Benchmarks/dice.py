@@ -0,0 +1,110 @@
+"""
+Benchmarks roll image generation for every accepted die type and roll count
+
+python3 -m Benchmarks.dice [--repeat N]
+"""
+import argparse
+import os
+import random
+import tempfile
+
+from PIL import Image
+
+from Benchmarks import time_call, time_indexed, result, print_results
+from DungeonBot.cogs.RNG.dieImage import DIE_ASSETS, DieAssetRegistry, ROLL_IMAGE_CACHE, ACCEPTED_DIE_TYPES, ASSET_WIDTH, ASSET_HEIGHT, DIE_SPACING, GRID_COLUMNS, rollImage, render_roll, composite_roll, grid_size
+from DungeonBot.cogs.RNG import diceExpression, diceDistribution
+
+MAX_ROLLS: int = 5
+COMPOSITE_AMOUNTS: tuple = (1, 5, 10, 25, 50, 100)
+EXPRESSIONS: tuple = ("8d6+3", "4d6kh3", "2d20kl1", "100d10", "10000d6")
+ODDS_EXPRESSIONS: tuple = ("3d8+2", "4d6kh3", "100d10", "500d20", "300d100+5")
+
+def clear_distribution_caches():
+    diceDistribution.dice_pmf.cache_clear()
+    diceDistribution.keep_pmf.cache_clear()
+
+def paste_roll(die_max_face: int, rolls: list) -> Image.Image:
+    """Reference compositor pasting one face at a time into the composite_roll grid layout, as render_roll did before composite_roll"""
+    columns, rows, width, height = grid_size(len(rolls))
+    blank: Image.Image = Image.new(mode="RGBA", size=(width, height))
+    for index, roll in enumerate(rolls):
+        x: int = DIE_SPACING + (index % GRID_COLUMNS) * (ASSET_WIDTH + DIE_SPACING)
+        y: int = (index // GRID_COLUMNS) * (ASSET_HEIGHT + DIE_SPACING)
+        blank.paste(DIE_ASSETS.get_face(die_max_face, roll), (x, y))
+    return blank
+
+def run(repeat: int = 20) -> list:
+    """
+    Measures loading every die face from the PNG assets (assets.load.png) and from a die face bundle
+    (assets.load.bundle), then, for each die type and roll count:
+    render: compositing and encoding a new roll image (render_roll)
+    cold: rollImage with an empty roll image cache
+    cached: rollImage where the rolled image is already cached
+    Then compares compositing COMPOSITE_AMOUNTS D20 rolls with composite_roll (composite.numpy) against the
+    paste_roll loop (composite.paste), without encoding.
+    Then measures parsing and rolling each of EXPRESSIONS, and computing the exact distribution of each of
+    ODDS_EXPRESSIONS with empty (odds.cold) and populated (odds.cached) distribution caches.
+
+    :return: list of result dicts
+    """
+    if not DIE_ASSETS.is_loaded():
+        DIE_ASSETS.load()
+
+    generator = random.Random(0)
+    results: list = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        bundle_path: str = os.path.join(directory, "dieFaces.bundle")
+        DIE_ASSETS.write_bundle(bundle_path)
+        for source, use_bundle in (("png", False), ("bundle", True)):
+            registry = DieAssetRegistry(bundle_path=bundle_path)
+            timing = time_call(lambda: (registry.load(use_bundle), registry.close()), repeat=repeat)
+            results.append(result("dice", f"assets.load.{source}", timing))
+
+    for die_type in ACCEPTED_DIE_TYPES:
+        for amount in range(1, MAX_ROLLS + 1):
+            params = {"die_type": die_type, "amount": amount}
+            dice = f"{amount}D{die_type}"
+
+            rolls = [[generator.randint(1, die_type) for i in range(amount)] for j in range(repeat)]
+            timing = time_indexed(lambda i: render_roll(die_type, rolls[i]), repeat)
+            results.append(result("dice", f"render.{dice}", timing, **params))
+
+            timing = time_indexed(lambda i: rollImage(die_type, amount), repeat, setup=lambda i: ROLL_IMAGE_CACHE.clear())
+            results.append(result("dice", f"rollImage.cold.{dice}", timing, **params))
+
+            #A single cached sequence makes every timed call a cache hit
+            ROLL_IMAGE_CACHE.clear()
+            timing = time_call(lambda: (diceExpression.seed(0), rollImage(die_type, amount)), repeat=repeat)
+            results.append(result("dice", f"rollImage.cached.{dice}", timing, **params))
+
+    ROLL_IMAGE_CACHE.clear()
+
+    for amount in COMPOSITE_AMOUNTS:
+        params = {"die_type": 20, "amount": amount}
+        rolls = [[generator.randint(1, 20) for i in range(amount)] for j in range(repeat)]
+        for name, compositor in (("numpy", composite_roll), ("paste", paste_roll)):
+            timing = time_indexed(lambda i: compositor(20, rolls[i]).close(), repeat)
+            results.append(result("dice", f"composite.{name}.{amount}D20", timing, **params))
+
+    #Dice expression evaluation, one vectorized draw per dice term
+    for expression in EXPRESSIONS:
+        timing = time_call(diceExpression.roll_expression, expression, repeat=repeat)
+        results.append(result("dice", f"expression.{expression}", timing, expression=expression))
+
+    for expression in ODDS_EXPRESSIONS:
+        timing = time_indexed(lambda i: diceDistribution.expression_distribution(expression), repeat, setup=lambda i: clear_distribution_caches())
+        results.append(result("dice", f"odds.cold.{expression}", timing, expression=expression))
+
+        timing = time_call(diceDistribution.expression_distribution, expression, repeat=repeat)
+        results.append(result("dice", f"odds.cached.{expression}", timing, expression=expression))
+
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    arguments = parser.parse_args()
+
+    print_results(run(arguments.repeat))
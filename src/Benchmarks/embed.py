@@ -0,0 +1,56 @@
+"""
+Benchmarks building the initiative order embed for large orders
+
+python3 -m Benchmarks.embed [--sizes 10 25 100 1000] [--repeat N]
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+
+import DBHelper
+from DBHelper.orderCache import order_cache
+from DungeonBot.cogs.Initiative import get_initiative_embed
+from Benchmarks import time_indexed, result, print_results
+from Benchmarks.database import build_synthetic_database
+
+def run(sizes: list = [10, 25, 100, 1000], repeat: int = 20) -> list:
+    """
+    Measures get_initiative_embed for orders of each size, with the order read from SQLite (cold) and
+    from the order cache (warm)
+
+    :param sizes: Number of characters in the benchmarked orders
+    :return: list of result dicts
+    """
+    original_database: str = DBHelper.DATABASE_DIRECTORY
+    directory: str = tempfile.mkdtemp(prefix="dungeonbot-bench-")
+    loop = asyncio.new_event_loop()
+    results: list = []
+
+    try:
+        for size in sizes:
+            #A single user holding an order of the benchmarked size
+            build_synthetic_database(os.path.join(directory, f"order_{size}.db"), 1, size)
+            embed = lambda i: loop.run_until_complete(get_initiative_embed(1, {"guild_id": 0, "channel_id": 0}))
+
+            timing = time_indexed(embed, repeat, setup=lambda i: order_cache.clear())
+            results.append(result("embed", f"get_initiative_embed.cold.size={size}", timing, size=size))
+            timing = time_indexed(embed, repeat)
+            results.append(result("embed", f"get_initiative_embed.warm.size={size}", timing, size=size))
+    finally:
+        loop.close()
+        DBHelper.close_connections()
+        DBHelper.DATABASE_DIRECTORY = original_database
+        order_cache.clear()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 25, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    arguments = parser.parse_args()
+
+    print_results(run(arguments.sizes, arguments.repeat))
@@ -0,0 +1,55 @@
+"""
+Compares encode time against output size for every roll image encoding profile
+
+python3 -m Benchmarks.encoding [--repeat N] [--json]
+"""
+import argparse
+
+from PIL import Image
+
+from Benchmarks import time_call, result, print_results
+from DungeonBot.cogs.RNG.dieImage import DIE_ASSETS, ENCODING_PROFILES, ASSET_WIDTH, ASSET_HEIGHT, encode_image
+
+def _composite(die_type: int, rolls: list) -> Image.Image:
+    """Builds the same strip as render_roll without encoding it"""
+    blank = Image.new(mode="RGBA", size=(10 + len(rolls) * (ASSET_WIDTH + 10), ASSET_HEIGHT))
+    x = 10
+    for face in rolls:
+        blank.paste(DIE_ASSETS.get_face(die_type, face), (x, 0))
+        x = x + ASSET_WIDTH + 10
+    return blank
+
+def run(repeat: int = 20) -> list:
+    """
+    Encodes a 1D20 and a 5D20 roll image with every profile
+
+    :return: list of result dicts with profile, dice, bytes and timing keys
+    """
+    if not DIE_ASSETS.is_loaded():
+        DIE_ASSETS.load()
+
+    results: list = []
+    for rolls in ([20], [20, 13, 7, 1, 9]):
+        image = _composite(20, rolls)
+        try:
+            for name, profile in ENCODING_PROFILES.items():
+                size = len(encode_image(image, profile))
+                timing = time_call(encode_image, image, profile, repeat=repeat)
+                dice = f"{len(rolls)}D20"
+                results.append(result("encoding", f"encode.{name}.{dice}", timing, profile=name, dice=dice, bytes=size))
+        finally:
+            image.close()
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    arguments = parser.parse_args()
+
+    results = run(arguments.repeat)
+    if arguments.json:
+        print_results(results)
+    else:
+        for result in results:
+            print(f"{result['dice']:>5} {result['profile']:>8}: {result['bytes']:>7} bytes {result['mean_ms']:8.3f} ms")
@@ -0,0 +1,134 @@
+"""
+Measures the memory held by discord.py's gateway caches under each gateway profile, replaying a simulated
+large guild: a GUILD_CREATE payload followed by a stream of MESSAGE_CREATE events
+
+python3 -m Benchmarks.gateway [--members 50000] [--messages 5000]
+"""
+import argparse
+import gc
+import tracemalloc
+
+import discord
+
+from Benchmarks import print_results
+from DungeonBot.gatewayProfile import GATEWAY_PROFILES, GatewayProfile
+
+GUILD_ID: int = 1000000000000000000
+CHANNELS: int = 200
+ROLES: int = 100
+ONLINE_RATIO: float = 0.25
+TIMESTAMP: str = "2024-01-01T00:00:00+00:00"
+
+def _user(user_id: int) -> dict:
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "global_name": f"User {user_id}", "avatar": None}
+
+def _member(user_id: int) -> dict:
+    return {"user": _user(user_id), "roles": [str(GUILD_ID + 1 + user_id % ROLES)], "joined_at": TIMESTAMP, "deaf": False, "mute": False, "flags": 0}
+
+def guild_payload(members: int, intents: discord.Intents) -> dict:
+    """
+    Builds the GUILD_CREATE payload of a guild with the passed number of members, as sent to a client with the
+    passed intents: members are only sent (after chunking) with the members intent and presences only with the
+    presences intent
+    """
+    member_ids = range(GUILD_ID + 10000, GUILD_ID + 10000 + members)
+    roles: list = [{"id": str(GUILD_ID), "name": "@everyone", "permissions": "0", "position": 0, "color": 0, "hoist": False, "managed": False, "mentionable": False}]
+    roles.extend(
+        {"id": str(GUILD_ID + 1 + k), "name": f"role{k}", "permissions": "0", "position": k + 1, "color": 0, "hoist": False, "managed": False, "mentionable": False}
+        for k in range(ROLES)
+    )
+
+    payload: dict = {
+        "id": str(GUILD_ID),
+        "name": "Benchmark guild",
+        "owner_id": str(GUILD_ID + 10000),
+        "member_count": members,
+        "large": True,
+        "features": [],
+        "emojis": [],
+        "stickers": [],
+        "voice_states": [],
+        "threads": [],
+        "roles": roles,
+        "channels": [
+            {"id": str(GUILD_ID + 5000 + k), "type": 0, "name": f"channel-{k}", "position": k, "permission_overwrites": []}
+            for k in range(CHANNELS)
+        ],
+        "members": [_member(user_id) for user_id in member_ids] if intents.members else [],
+        "presences": [],
+    }
+    if intents.presences:
+        online = member_ids[:int(members * ONLINE_RATIO)]
+        payload["presences"] = [
+            {"user": {"id": str(user_id)}, "status": "online", "activities": [], "client_status": {"desktop": "online"}}
+            for user_id in online
+        ]
+    return payload
+
+def message_payload(message_id: int, members: int) -> dict:
+    """Builds a MESSAGE_CREATE payload posted by one of the guild's members"""
+    user_id: int = GUILD_ID + 10000 + message_id % members
+    member: dict = _member(user_id)
+    del member["user"]
+    return {
+        "id": str(GUILD_ID + 100000000 + message_id),
+        "channel_id": str(GUILD_ID + 5000 + message_id % CHANNELS),
+        "guild_id": str(GUILD_ID),
+        "author": _user(user_id),
+        "member": member,
+        "content": f"Message {message_id} " + "x" * 64,
+        "timestamp": TIMESTAMP,
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0,
+    }
+
+def measure(profile: GatewayProfile, members: int, messages: int) -> dict:
+    """
+    Replays the simulated guild against a client configured with the profile and measures the memory its
+    connection state holds afterwards
+
+    :return: dict with bytes, cached_members and cached_messages keys
+    """
+    payload: dict = guild_payload(members, profile.intents)
+    #Message events are only delivered with a guild messages intent
+    events: list = [message_payload(k, members) for k in range(messages)] if profile.intents.guild_messages else []
+
+    gc.collect()
+    tracemalloc.start()
+    client = discord.Client(**profile.client_options())
+    state = client._connection
+    guild = state._add_guild_from_data(payload)
+    for event in events:
+        state.parse_message_create(event)
+    gc.collect()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"bytes": held, "peak_bytes": peak, "cached_members": len(guild._members), "cached_messages": len(state._messages or ())}
+
+def run(members: int = 50000, messages: int = 5000) -> list:
+    """
+    Measures every gateway profile against the simulated guild
+
+    :return: list of result dicts
+    """
+    results: list = []
+    for name, profile in GATEWAY_PROFILES.items():
+        memory: dict = measure(profile, members, messages)
+        results.append({"suite": "gateway", "name": f"memory.{name}.members={members}", "profile": name, "members": members, "messages": messages, **memory})
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=50000)
+    parser.add_argument("--messages", type=int, default=5000)
+    arguments = parser.parse_args()
+
+    print_results(run(arguments.members, arguments.messages))
@@ -0,0 +1,86 @@
+"""
+Measures the bot's cold start without connecting to Discord. Every sample starts a fresh interpreter, which
+imports DungeonBot, initializes a new database file and reopens it, loads the command extensions and hashes
+the command tree, timing each phase. Exits with status 1 where --max-ms is passed and the mean time to a
+ready-to-connect bot exceeds it, so CI can check cold start.
+
+python3 -m Benchmarks.startup [--repeat N] [--max-ms MS]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from Benchmarks import _summarize, result, print_results
+
+#Run in a fresh interpreter from the src/ directory, printing the phase timings in ms as its last line
+_STARTUP_SCRIPT: str = """
+import time
+started = time.perf_counter()
+import asyncio, json, os, tempfile
+import DungeonBot
+from DungeonBot.cogs import extensions
+from DungeonBot.commandSync import command_tree_hash
+import DBHelper
+phases = {"import": (time.perf_counter() - started) * 1000}
+
+with tempfile.TemporaryDirectory() as directory:
+    DBHelper.DATABASE_DIRECTORY = os.path.join(directory, "dungeonBot.db")
+    for phase in ("database.cold", "database.warm"):
+        DBHelper.close_connections()
+        start = time.perf_counter()
+        DBHelper.init_database()
+        phases[phase] = (time.perf_counter() - start) * 1000
+    DBHelper.close_connections()
+
+async def load_extensions():
+    for ext in extensions:
+        await DungeonBot.DungeonBot.load_extension(f"DungeonBot.cogs.{ext}")
+start = time.perf_counter()
+asyncio.run(load_extensions())
+phases["extensions"] = (time.perf_counter() - start) * 1000
+
+start = time.perf_counter()
+command_tree_hash(DungeonBot.DungeonBot.tree, 0)
+phases["command_tree_hash"] = (time.perf_counter() - start) * 1000
+print(json.dumps(phases))
+"""
+
+def measure_startup() -> dict:
+    """
+    Runs one cold start in a new interpreter
+
+    :return: dict of phase name to milliseconds, including the interpreter's whole run as 'process'
+    """
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT], capture_output=True, text=True, check=True)
+    process_ms: float = (time.perf_counter() - start) * 1000
+    phases: dict = json.loads(completed.stdout.strip().splitlines()[-1])
+    phases["process"] = process_ms
+    return phases
+
+def run(repeat: int = 5) -> list:
+    """
+    Measures repeated cold starts
+
+    :return: list of result dicts, one per phase
+    """
+    samples: dict = {}
+    for i in range(repeat):
+        for phase, elapsed in measure_startup().items():
+            samples.setdefault(phase, []).append(elapsed)
+    return [result("startup", f"startup.{phase}", _summarize(values)) for phase, values in samples.items()]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-ms", type=float, help="Fail where the mean process time exceeds this many milliseconds")
+    arguments = parser.parse_args()
+
+    results: list = run(arguments.repeat)
+    print_results(results)
+    process: dict = next(entry for entry in results if entry["name"] == "startup.process")
+    if arguments.max_ms is not None and process["mean_ms"] > arguments.max_ms:
+        print(f"Cold start took {process['mean_ms']:.1f} ms on average, more than {arguments.max_ms:g} ms", file=sys.stderr)
+        sys.exit(1)
@@ -1,25 +1,395 @@
 """
-Initializes the database and its subsequent tables
+Initializes the database and its subsequent tables. Each database file is prepared lazily, the first time
+a connection to it is requested, so importing DBHelper does no database work.
 """
+import os
 import sqlite3
+import threading
+import time
+import zlib
+from contextlib import closing, contextmanager
+from urllib.parse import quote
+
+import Metrics
 
 DATABASE_DIRECTORY = "./Database/dungeonBot.db"
 USERS_TABLE = 'users'
 ORDER_COMMAND_TABLE = 'order_command_data'
+PRIVATE_SCOPE_TABLE = 'private_scopes'
+TRACKER_TABLE = 'order_trackers'
+ENCOUNTER_TABLE = 'encounters'
+SHARD_LAYOUT_TABLE = 'shard_layout'
 
 #USER TABLE ATTRIBUTES
 ID = "id"
 
 #ORDER TABLE ATTRIBUTES
 USER_ID = "user_id"
+GUILD_ID = "guild_id"
+CHANNEL_ID = "channel_id"
 NAME = "order_title"
 ROLL = "roll_value"
 MODIFIER = "modifier"
+INITIATIVE = "initiative"
 
-def init_user_table():
-    """Initializes the users table if one does not exist"""
-    conn = sqlite3.Connection(DATABASE_DIRECTORY)
+#TRACKER TABLE ATTRIBUTES
+MESSAGE_GUILD_ID = "message_guild_id"
+MESSAGE_CHANNEL_ID = "message_channel_id"
+MESSAGE_ID = "message_id"
+
+#ENCOUNTER TABLE ATTRIBUTES
+ROUND = "round"
+CURRENT_ID = "current_id"
+CURRENT_INITIATIVE = "current_initiative"
+
+#SHARD LAYOUT TABLE ATTRIBUTES
+SHARD = "shard"
+SHARD_TOTAL = "shard_count"
+
+#ORDER TABLE INDICES
+ORDER_LOOKUP_INDEX = "order_command_lookup"
+ORDER_INITIATIVE_INDEX = "order_command_initiative"
+
+#SHARD SETTINGS
+#Guilds are spread across SHARD_COUNT database files by a hash of the guild id. Shard 0 is DATABASE_DIRECTORY,
+#shard n is stored next to it as dungeonBot_n.db. Changing SHARD_COUNT would move guilds to other files, so each file
+#records the layout it was written with and opening it with another SHARD_COUNT raises ShardLayoutError.
+SHARD_COUNT = int(os.getenv("DungeonBotDatabaseShards", "1"))
+
+#Set where several processes share the database files, i.e. the workers started by DungeonBot.cluster: cached
+#orders are then dropped whenever PRAGMA data_version shows another process committed to their shard
+SHARED_DATABASE = os.getenv("DungeonBotSharedDatabase", "0") == "1"
+
+#STORAGE SETTINGS
+#"disk" serves every query from the database files. "memory" copies each shard's file into a shared-cache in-memory
+#database on first use and serves every query from memory, writing it back to the file with the online backup API
+#every BACKUP_INTERVAL_SECONDS and in close_connections: a crash loses at most the writes committed since the last
+#backup. Ignored with SHARED_DATABASE, as every process would hold its own copy.
+#Connections to a shared-cache database lock each other per table and SQLite reports a conflict as SQLITE_LOCKED
+#at once, ignoring busy_timeout, so memory connections retry locked statements for up to BUSY_TIMEOUT_MS instead.
+STORAGE_MODE = os.getenv("DungeonBotDatabaseStorage", "disk")
+BACKUP_INTERVAL_SECONDS = float(os.getenv("DungeonBotDatabaseBackupInterval", "60"))
+
+#CONNECTION SETTINGS
+CACHE_SIZE_KIB = 16384
+BUSY_TIMEOUT_MS = 5000
+
+#GROUP COMMIT SETTINGS
+GROUP_COMMIT_WINDOW_MS = 2
+GROUP_COMMIT_MAX_OPERATIONS = 64
+GROUP_COMMIT_SYNCHRONOUS = "FULL"
+
+#ORDER CACHE SETTINGS
+ORDER_CACHE_MAX_ENTRIES = 1024
+ENCOUNTER_CACHE_MAX_ENTRIES = 256
+
+#MAINTENANCE SETTINGS
+MAINTENANCE_INTERVAL_SECONDS = 300
+FREE_PAGE_THRESHOLD = 256
+FREE_PAGE_RATIO = 0.10
+INCREMENTAL_VACUUM_PAGES = 1024
+
+_connections: dict = {}
+_connections_lock = threading.Lock()
+_group_commits = threading.local()
+_data_versions: dict = {}
+_initialized: set = set()
+_initialize_lock = threading.RLock()
+_initializing = threading.local()
+_memory_databases: dict = {}
+_memory_lock = threading.Lock()
+
+class ShardLayoutError(RuntimeError):
+    def __init__(self, msg="Database shard layout mismatch") -> None:
+        """
+        Error class raised when a database file was written with another SHARD_COUNT or as another shard, where
+        its guilds' orders would no longer be found.
+
+        :inherit RuntimeError:
+        """
+        self.msg = msg
+        super().__init__(self.msg)
+
+def timed_query(func):
+    """Decorator recording each call to a DBHelper function in the database query latency histogram"""
+    function_name: str = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+    return Metrics.timed(Metrics.DB_QUERY_LATENCY, function=function_name)(func)
+
+def read_only(func):
+    """
+    Decorator marking a DBHelper function that never writes. Database workers run such calls on their own outside
+    of group commits, so reads neither take the write lock nor wait out a group's commit, see DBHelper.groupCommit
+    """
+    func.read_only = True
+    return func
+
+def shard_for_guild(guild_id: int) -> int:
+    """
+    Returns the shard storing a guild's initiative orders. Orders outside of a guild, including every
+    order created before orders were scoped to guilds, are stored in shard 0.
+
+    :param guild_id: Discord guild id, 0 for orders outside of a guild
+    :return: Shard number from 0 to SHARD_COUNT - 1
+    """
+    if SHARD_COUNT <= 1 or guild_id == 0:
+        return 0
+    return zlib.crc32(guild_id.to_bytes(8, "little")) % SHARD_COUNT
+
+def shard_path(shard: int) -> str:
+    """Returns the database file of a shard"""
+    if shard == 0:
+        return DATABASE_DIRECTORY
+    root, extension = os.path.splitext(DATABASE_DIRECTORY)
+    return f"{root}_{shard}{extension}"
+
+def memory_storage() -> bool:
+    """Returns True where queries are served from in-memory copies of the database files, see STORAGE_MODE"""
+    return STORAGE_MODE == "memory" and not SHARED_DATABASE
+
+def _memory_uri(path: str) -> str:
+    """Returns the URI of the shared-cache in-memory database holding a database file"""
+    return f"file:dungeonBot-memory-{quote(os.path.abspath(path), safe='')}?mode=memory&cache=shared"
+
+#Messages of SQLITE_LOCKED, raised by shared-cache table and schema locks
+_LOCKED_MESSAGES: tuple = ("database table is locked", "database schema is locked")
+
+def _retry_locked(statement, *args):
+    """
+    Runs a statement, retrying it while another connection to the same shared-cache database holds a lock it needs
+
+    :param statement: Bound execute, executemany or executescript method
+    :raise sqlite3.OperationalError: Raised where the lock is still held after BUSY_TIMEOUT_MS
+    :return: The value returned by statement
+    """
+    deadline: float = time.monotonic() + BUSY_TIMEOUT_MS / 1000
+    delay: float = 0.001
+    while True:
+        try:
+            return statement(*args)
+        except sqlite3.OperationalError as e:
+            if not str(e).startswith(_LOCKED_MESSAGES) or time.monotonic() >= deadline:
+                raise
+        time.sleep(delay)
+        delay = min(delay * 2, 0.05)
+
+class _MemoryCursor(sqlite3.Cursor):
+    """Cursor of a memory connection, waiting out shared-cache locks like busy_timeout waits out file locks"""
+    def execute(self, sql: str, parameters=()):
+        return _retry_locked(super().execute, sql, parameters)
+
+    def executemany(self, sql: str, parameters):
+        return _retry_locked(super().executemany, sql, parameters)
+
+    def executescript(self, script: str):
+        return _retry_locked(super().executescript, script)
+
+class _MemoryConnection(sqlite3.Connection):
+    """Connection to a shared-cache in-memory database running every statement through a _MemoryCursor"""
+    def cursor(self, factory=_MemoryCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, parameters):
+        return self.cursor().executemany(sql, parameters)
+
+    def executescript(self, script: str):
+        return self.cursor().executescript(script)
+
+def _load_memory_database(path: str):
+    """
+    Copies a database file into its in-memory database on first use. The in-memory database lives as long as one
+    connection to it is open, so the connection used to load it is kept until close_connections.
+    """
+    with _memory_lock:
+        if path in _memory_databases:
+            return
+        memory = sqlite3.connect(_memory_uri(path), uri=True, check_same_thread=False, factory=_MemoryConnection)
+        if os.path.exists(path):
+            with closing(sqlite3.connect(path)) as disk:
+                disk.backup(memory)
+        _memory_databases[path] = memory
+
+def _backup_memory_database(path: str):
+    """Writes an in-memory database to its file, the caller holding _memory_lock"""
+    start: float = time.perf_counter()
+    with closing(sqlite3.connect(path)) as disk:
+        disk.execute("PRAGMA synchronous = FULL;")
+        disk.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS};")
+        #The file's pages are replaced within one transaction, an interrupted backup leaves the previous one intact
+        _memory_databases[path].backup(disk)
+    Metrics.observe(Metrics.DB_BACKUP_LATENCY, time.perf_counter() - start)
+
+def backup_database(shard: int = 0) -> bool:
+    """
+    Writes a shard's in-memory database back to its file with the online backup API. Run it on the shard's database
+    worker, i.e. await asyncDB.run_exclusive(DBHelper.backup_database, shard=shard), so it never waits on a write.
+
+    :param shard: Shard number, see shard_for_guild
+    :return: True if the shard is held in memory and was written to its file
+    """
+    path: str = shard_path(shard)
+    with _memory_lock:
+        if path not in _memory_databases:
+            return False
+        _backup_memory_database(path)
+        return True
+
+def _open_connection(path: str) -> sqlite3.Connection:
+    """Opens and configures a new connection to a database file, or to its in-memory copy, see STORAGE_MODE"""
+    if memory_storage():
+        _load_memory_database(path)
+        conn = sqlite3.connect(_memory_uri(path), uri=True, check_same_thread=False, factory=_MemoryConnection)
+    else:
+        conn = sqlite3.connect(path, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode = WAL;")
+    conn.execute("PRAGMA synchronous = NORMAL;")
     conn.execute("PRAGMA foreign_keys = ON;")
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB};")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS};")
+    conn.execute("PRAGMA temp_store = MEMORY;")
+    return conn
+
+def get_connection(shard: int = 0) -> sqlite3.Connection:
+    """
+    Returns the calling thread's warm connection to a shard, opening and configuring one
+    on first use. The shard's database file is initialized by the first connection to it.
+    Connections are kept open until close_connections is called.
+
+    :param shard: Shard number, see shard_for_guild
+    :return: sqlite3.Connection owned by the calling thread
+    """
+    key = (threading.get_ident(), shard_path(shard))
+    conn = _connections.get(key)
+    if conn is None:
+        conn = _open_connection(key[1])
+        with _connections_lock:
+            _connections[key] = conn
+    if key[1] not in _initialized:
+        _initialize(shard, key[1])
+    return conn
+
+def _initialize(shard: int, path: str):
+    """
+    Runs init_shard once per database file. Other threads wait for the file to be ready, while the
+    initializing thread's own get_connection calls pass straight through.
+    """
+    with _initialize_lock:
+        if path in _initialized or getattr(_initializing, "path", None) == path:
+            return
+        _initializing.path = path
+        try:
+            init_shard(shard)
+            _initialized.add(path)
+        finally:
+            _initializing.path = None
+
+@contextmanager
+def transaction(shard: int = 0):
+    """
+    Context manager yielding the calling thread's connection. Commits when the block
+    exits normally and rolls back when an exception is raised, so a failed statement
+    never leaves a transaction open on the shared connection.
+
+    Within a group_commit on the same shard the block runs in a SAVEPOINT instead: it is
+    released into the group's transaction on success and rolled back alone on an exception.
+
+    :param shard: Shard number, see shard_for_guild
+    """
+    conn = get_connection(shard)
+    if getattr(_group_commits, "shard", None) == shard:
+        conn.execute("SAVEPOINT dbhelper_transaction;")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK TO dbhelper_transaction;")
+            conn.execute("RELEASE dbhelper_transaction;")
+            raise
+        conn.execute("RELEASE dbhelper_transaction;")
+    else:
+        with conn:
+            yield conn
+
+@contextmanager
+def group_commit(shard: int = 0):
+    """
+    Context manager batching every transaction() block run by the calling thread on a shard
+    into one transaction, committed once when the context exits. The whole group is rolled
+    back where the context exits with an exception.
+
+    :param shard: Shard number, see shard_for_guild
+    """
+    conn = get_connection(shard)
+    with conn:
+        #Take the write lock up front: a deferred transaction upgrading from a read fails immediately with
+        #SQLITE_BUSY when another process committed since the read, instead of waiting out busy_timeout
+        conn.execute("BEGIN IMMEDIATE;")
+        _group_commits.shard = shard
+        try:
+            yield conn
+        finally:
+            _group_commits.shard = None
+
+def external_commits(shard: int = 0) -> bool:
+    """
+    Returns True where another connection, i.e. one held by another process, may have committed to a shard
+    since the calling thread last checked. Read within a transaction the answer holds until it ends.
+
+    :param shard: Shard number, see shard_for_guild
+    :return: True on a change in 'PRAGMA data_version' and on the calling thread's first check of the shard
+    """
+    key = (threading.get_ident(), shard)
+    version: int = get_connection(shard).execute("PRAGMA data_version;").fetchone()[0]
+    previous: int = _data_versions.get(key)
+    _data_versions[key] = version
+    return previous != version
+
+def close_connections():
+    """
+    Closes every connection opened by get_connection, i.e. at shutdown. In-memory databases are written back
+    to their files first, then released.
+    """
+    with _memory_lock:
+        try:
+            for path in _memory_databases:
+                _backup_memory_database(path)
+        finally:
+            with _connections_lock:
+                for conn in _connections.values():
+                    conn.close()
+                _connections.clear()
+                _data_versions.clear()
+            for memory in _memory_databases.values():
+                memory.close()
+            _memory_databases.clear()
+    #Files may be replaced while closed, the next connection to each checks it again
+    with _initialize_lock:
+        _initialized.clear()
+
+def init_auto_vacuum(shard: int = 0, rebuild: bool = False) -> bool:
+    """
+    Switches the database to auto_vacuum=INCREMENTAL if it is not already. SQLite requires a VACUUM for
+    the new mode to take effect, which is instant on a new database file. On a populated file it rewrites
+    every page, so it is left to reclaim_free_pages unless rebuild is passed.
+
+    :param rebuild: VACUUM a populated database file to apply the mode
+    :return: True if the database uses auto_vacuum=INCREMENTAL
+    """
+    conn = get_connection(shard)
+
+    #0: NONE, 1: FULL, 2: INCREMENTAL
+    if conn.execute("PRAGMA auto_vacuum;").fetchone()[0] == 2:
+        return True
+    if not rebuild and conn.execute("SELECT count(*) FROM sqlite_master;").fetchone()[0] > 0:
+        return False
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL;")
+    conn.execute("VACUUM;")
+    return True
+
+def init_user_table(shard: int = 0):
+    """Initializes the users table if one does not exist"""
+    conn = get_connection(shard)
     cursor = conn.cursor()
 
     cursor.execute(f"""
@@ -28,15 +398,13 @@ def init_user_table():
         );""")
     
     conn.commit()
-    conn.close()
 
-def init_order_table():
+def init_order_table(shard: int = 0):
     """
     Initializes the order command table if does not exist. Used in generating and
     maintaining initiative orders.
     """
-    conn = sqlite3.Connection(DATABASE_DIRECTORY)
-    conn.execute("PRAGMA foreign_keys = ON;")
+    conn = get_connection(shard)
     cursor = conn.cursor()
 
     cursor.execute(f"""
@@ -51,15 +419,228 @@ def init_order_table():
         );""")
     
     conn.commit()
-    conn.close()
 
-def vacuum():
-    """Executes the SQLite 'VACUUM' command to free unused memory"""
-    conn = sqlite3.Connection(DATABASE_DIRECTORY)
-    conn.execute("VACUUM;")
-    conn.close()
+def _migration_order_indices(conn: sqlite3.Connection):
+    """
+    Schema version 1: indexes order lookups by (user id, character name) and adds a generated
+    initiative column (roll value + modifier) indexed per user, so initiative orders are read
+    pre-sorted from an index walk.
+    """
+    conn.execute(f"""
+        CREATE INDEX IF NOT EXISTS {ORDER_LOOKUP_INDEX}
+        ON {ORDER_COMMAND_TABLE} ({USER_ID}, {NAME});""")
+    conn.execute(f"""
+        ALTER TABLE {ORDER_COMMAND_TABLE}
+        ADD COLUMN {INITIATIVE} integer GENERATED ALWAYS AS ({ROLL} + {MODIFIER}) VIRTUAL;""")
+    conn.execute(f"""
+        CREATE INDEX IF NOT EXISTS {ORDER_INITIATIVE_INDEX}
+        ON {ORDER_COMMAND_TABLE} ({USER_ID}, {INITIATIVE});""")
+
+def _migration_order_scopes(conn: sqlite3.Connection):
+    """
+    Schema version 2: scopes initiative orders to a guild and channel. Existing orders keep guild and
+    channel 0, the scope used outside of guilds, and the order indices are rebuilt to lead with the
+    complete (user id, guild id, channel id) scope.
+    """
+    conn.execute(f"""
+        ALTER TABLE {ORDER_COMMAND_TABLE}
+        ADD COLUMN {GUILD_ID} integer NOT NULL DEFAULT 0;""")
+    conn.execute(f"""
+        ALTER TABLE {ORDER_COMMAND_TABLE}
+        ADD COLUMN {CHANNEL_ID} integer NOT NULL DEFAULT 0;""")
+    conn.execute(f"DROP INDEX IF EXISTS {ORDER_LOOKUP_INDEX};")
+    conn.execute(f"DROP INDEX IF EXISTS {ORDER_INITIATIVE_INDEX};")
+    conn.execute(f"""
+        CREATE INDEX {ORDER_LOOKUP_INDEX}
+        ON {ORDER_COMMAND_TABLE} ({USER_ID}, {GUILD_ID}, {CHANNEL_ID}, {NAME});""")
+    conn.execute(f"""
+        CREATE INDEX {ORDER_INITIATIVE_INDEX}
+        ON {ORDER_COMMAND_TABLE} ({USER_ID}, {GUILD_ID}, {CHANNEL_ID}, {INITIATIVE});""")
+
+def _migration_private_scopes(conn: sqlite3.Connection):
+    """
+    Schema version 3: stores the guild channel each user's direct message commands apply to, bound by
+    /initiative private, so every bot process shares it. Only shard 0's table is used.
+    """
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {PRIVATE_SCOPE_TABLE} (
+            {USER_ID} integer NOT NULL PRIMARY KEY,
+            {GUILD_ID} integer NOT NULL,
+            {CHANNEL_ID} integer NOT NULL,
+            FOREIGN KEY ({USER_ID}) REFERENCES {USERS_TABLE} ({ID})
+                   ON UPDATE CASCADE
+                   ON DELETE CASCADE
+        );""")
+
+def _migration_order_trackers(conn: sqlite3.Connection):
+    """
+    Schema version 4: stores the live tracker message of each initiative order, in the shard of the order's guild
+    """
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {TRACKER_TABLE} (
+            {USER_ID} integer NOT NULL,
+            {GUILD_ID} integer NOT NULL,
+            {CHANNEL_ID} integer NOT NULL,
+            {MESSAGE_GUILD_ID} integer NOT NULL,
+            {MESSAGE_CHANNEL_ID} integer NOT NULL,
+            {MESSAGE_ID} integer NOT NULL,
+            PRIMARY KEY ({USER_ID}, {GUILD_ID}, {CHANNEL_ID}),
+            FOREIGN KEY ({USER_ID}) REFERENCES {USERS_TABLE} ({ID})
+                   ON UPDATE CASCADE
+                   ON DELETE CASCADE
+        ) WITHOUT ROWID;""")
+
+def _migration_encounters(conn: sqlite3.Connection):
+    """
+    Schema version 5: stores the turn state of each initiative order in combat, the round and the
+    (initiative, rowid) position of the character whose turn it is
+    """
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {ENCOUNTER_TABLE} (
+            {USER_ID} integer NOT NULL,
+            {GUILD_ID} integer NOT NULL,
+            {CHANNEL_ID} integer NOT NULL,
+            {ROUND} integer NOT NULL,
+            {CURRENT_INITIATIVE} integer NOT NULL,
+            {CURRENT_ID} integer NOT NULL,
+            PRIMARY KEY ({USER_ID}, {GUILD_ID}, {CHANNEL_ID}),
+            FOREIGN KEY ({USER_ID}) REFERENCES {USERS_TABLE} ({ID})
+                   ON UPDATE CASCADE
+                   ON DELETE CASCADE
+        ) WITHOUT ROWID;""")
 
-#Initialize the database
-init_user_table()
-init_order_table()
-vacuum()
\ No newline at end of file
+def _migration_shard_layout(conn: sqlite3.Connection):
+    """
+    Schema version 6: records which shard a database file is and the SHARD_COUNT it was written with, see
+    check_shard_layout
+    """
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SHARD_LAYOUT_TABLE} (
+            {SHARD} integer NOT NULL,
+            {SHARD_TOTAL} integer NOT NULL
+        );""")
+
+def _migration_initiative_ties(conn: sqlite3.Connection):
+    """
+    Schema version 7: rebuilds the order initiative index descending, so orders are read straight from it with
+    tied initiatives oldest row first, i.e. ORDER BY initiative DESC, rowid ASC. The rowid every index ends with
+    keeps ties in insertion order.
+    """
+    conn.execute(f"DROP INDEX IF EXISTS {ORDER_INITIATIVE_INDEX};")
+    conn.execute(f"""
+        CREATE INDEX {ORDER_INITIATIVE_INDEX}
+        ON {ORDER_COMMAND_TABLE} ({USER_ID}, {GUILD_ID}, {CHANNEL_ID}, {INITIATIVE} DESC);""")
+
+#Ordered schema migrations, MIGRATIONS[n] upgrades a database from user_version n to n + 1.
+#New migrations must only ever be appended.
+MIGRATIONS: list = [
+    _migration_order_indices,
+    _migration_order_scopes,
+    _migration_private_scopes,
+    _migration_order_trackers,
+    _migration_encounters,
+    _migration_shard_layout,
+    _migration_initiative_ties,
+]
+
+def migrate(shard: int = 0) -> int:
+    """
+    Brings the database schema of a shard up to date by applying every migration newer than the file's
+    'PRAGMA user_version'. Each migration runs in its own transaction together with its version
+    bump, so an interrupted upgrade resumes from the last completed version. The version is re-read under
+    the write lock, so processes starting together apply each migration once.
+
+    :return: The schema version after migrating
+    """
+    conn = get_connection(shard)
+    version: int = conn.execute("PRAGMA user_version;").fetchone()[0]
+
+    for target in range(version + 1, len(MIGRATIONS) + 1):
+        with conn:
+            conn.execute("BEGIN IMMEDIATE;")
+            if conn.execute("PRAGMA user_version;").fetchone()[0] >= target:
+                continue
+            MIGRATIONS[target - 1](conn)
+            conn.execute(f"PRAGMA user_version = {target};")
+        print(f"Database {shard_path(shard)} migrated to schema version {target}")
+
+    return max(version, len(MIGRATIONS))
+
+def vacuum(shard: int = 0):
+    """
+    Executes the SQLite 'VACUUM' command to free unused memory. This rewrites the entire database
+    file, so it is reserved for manual maintenance; routine space reclamation is handled by
+    reclaim_free_pages.
+    """
+    get_connection(shard).execute("VACUUM;")
+
+def reclaim_free_pages(force: bool = False, shard: int = 0) -> int:
+    """
+    Returns free pages to the file system with 'PRAGMA incremental_vacuum' once the free list
+    grows past FREE_PAGE_THRESHOLD pages or FREE_PAGE_RATIO of the file. At most
+    INCREMENTAL_VACUUM_PAGES pages are released per call to keep each pass short.
+
+    Database files created before auto_vacuum=INCREMENTAL was used are skipped: switching them over rewrites
+    the whole file, which is left to DBHelper.rebuildDatabase while the bot is stopped, or to vacuum.
+
+    :param force: Reclaim regardless of the free page thresholds
+    :param shard: Shard number, see shard_for_guild
+    :return: Number of pages released
+    """
+    if not init_auto_vacuum(shard):
+        return 0
+
+    conn = get_connection(shard)
+    free_pages: int = conn.execute("PRAGMA freelist_count;").fetchone()[0]
+    page_count: int = conn.execute("PRAGMA page_count;").fetchone()[0]
+
+    if free_pages == 0:
+        return 0
+    if not (force or free_pages >= FREE_PAGE_THRESHOLD or free_pages >= page_count * FREE_PAGE_RATIO):
+        return 0
+
+    #incremental_vacuum frees one page per step; executescript runs it to completion
+    conn.executescript(f"PRAGMA incremental_vacuum({INCREMENTAL_VACUUM_PAGES});")
+    return free_pages - conn.execute("PRAGMA freelist_count;").fetchone()[0]
+
+def init_shard(shard: int = 0):
+    """
+    Prepares a shard's database file: sets the vacuum mode of a new file, creates any missing tables and
+    applies pending schema migrations. Safe to call repeatedly; get_connection calls it on first use.
+    """
+    init_auto_vacuum(shard)
+    init_user_table(shard)
+    init_order_table(shard)
+    migrate(shard)
+    check_shard_layout(shard)
+
+def check_shard_layout(shard: int = 0):
+    """
+    Records the shard number and SHARD_COUNT in a shard's file on first use and verifies them afterwards. Files
+    written before the layout was recorded are taken to match the current SHARD_COUNT.
+
+    :param shard: Shard number, see shard_for_guild
+    :raise ShardLayoutError: Raised where the file was written as another shard or with another SHARD_COUNT
+    """
+    conn = get_connection(shard)
+    with conn:
+        conn.execute("BEGIN IMMEDIATE;")
+        layout = conn.execute(f"SELECT {SHARD}, {SHARD_TOTAL} FROM {SHARD_LAYOUT_TABLE};").fetchone()
+        if layout is None:
+            conn.execute(f"INSERT INTO {SHARD_LAYOUT_TABLE} ({SHARD}, {SHARD_TOTAL}) VALUES (?, ?);", (shard, SHARD_COUNT))
+            return
+
+    if layout != (shard, SHARD_COUNT):
+        raise ShardLayoutError(f"{shard_path(shard)} was written as shard {layout[0]} of {layout[1]}, but "
+            f"DungeonBotDatabaseShards is {SHARD_COUNT}. Guilds are assigned to shards by the shard count, set it back to {layout[1]}")
+
+def init_database():
+    """
+    Prepares every shard's database file ahead of first use, see init_shard. With memory_storage() every file is
+    copied into memory first, so startup fails on an unreadable file instead of the first command on its shard.
+    """
+    if memory_storage():
+        for shard in range(SHARD_COUNT):
+            _load_memory_database(shard_path(shard))
+    for shard in range(SHARD_COUNT):
+        get_connection(shard)
@@ -0,0 +1,49 @@
+"""
+Awaitable access to the DBHelper functions. Every call is handed to the group commit worker of its
+shard, a dedicated database thread per shard, so disk I/O never blocks the asyncio event loop,
+concurrent mutations are committed together and guilds on different shards are written in parallel.
+
+Calls are routed by their keyword arguments: 'shard' selects a shard directly, otherwise the shard
+owning 'guild_id' is used (shard 0 where neither is passed).
+"""
+import asyncio
+
+from DBHelper import SHARD_COUNT, close_connections, shard_for_guild
+from DBHelper.groupCommit import GroupCommitWorker
+
+_workers: list = [GroupCommitWorker(shard) for shard in range(SHARD_COUNT)]
+
+def _worker_for(kwargs: dict) -> GroupCommitWorker:
+    if "shard" in kwargs:
+        return _workers[kwargs["shard"]]
+    return _workers[shard_for_guild(kwargs.get("guild_id", 0))]
+
+async def run(func, *args, **kwargs):
+    """
+    Runs a synchronous DBHelper function on its shard's database worker thread and awaits its result once
+    the group it was committed with is durable, i.e.
+    await run(orderDB.add_order_command, user_id, name, roll, modifier, guild_id=guild_id, channel_id=channel_id)
+    Functions marked with DBHelper.read_only run outside of any group.
+
+    :param func: usersDB/orderDB (or any other blocking) function to execute
+    :return: The value returned by func
+    :raise Exception: Any exception raised by func is re-raised in the awaiting coroutine
+    """
+    return await asyncio.wrap_future(_worker_for(kwargs).submit(func, args, kwargs))
+
+async def run_exclusive(func, *args, **kwargs):
+    """
+    Runs a synchronous DBHelper function on its shard's database worker thread outside of any group commit,
+    for work that cannot run inside a transaction, i.e. await run_exclusive(DBHelper.reclaim_free_pages, shard=shard)
+
+    :param func: Blocking function to execute
+    :return: The value returned by func
+    :raise Exception: Any exception raised by func is re-raised in the awaiting coroutine
+    """
+    return await asyncio.wrap_future(_worker_for(kwargs).submit(func, args, kwargs, exclusive=True))
+
+def shutdown():
+    """Waits for queued database work to be committed on every shard, then closes the workers' connections"""
+    for worker in _workers:
+        worker.shutdown()
+    close_connections()
@@ -0,0 +1,200 @@
+"""
+In-memory turn order of initiative orders in combat. Each encounter keeps its characters' sort keys in a
+bisect sorted list, so characters added, removed or updated mid-combat are moved into place with a binary
+search instead of re-sorting the order or reloading it from the database.
+
+The character whose turn it is is tracked by sort key rather than by list index: a character added before
+it or removed from the order leaves the turn where it is, and where the character itself is removed the
+turn passes to the next character in order.
+"""
+import threading
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+import Metrics
+from DBHelper import ENCOUNTER_CACHE_MAX_ENTRIES, shard_for_guild
+from DBHelper.orderCache import _order_key
+
+def turn_key(initiative: int, rowid: int) -> tuple:
+    """Returns the sort key of an order position, matching the order cache's: highest initiative first, oldest row first on ties"""
+    return (-initiative, rowid)
+
+class Encounter():
+    def __init__(self, rows: list, round: int, current: tuple) -> None:
+        """
+        Turn order of one initiative order in combat
+
+        :param rows: list of (rowid, character name, roll value, modifier) tuples
+        :param round: Current round, starting at 1
+        :param current: Sort key (see turn_key) of the character whose turn it is, possibly of a removed character
+        """
+        self.rows: dict = {row[0]: row for row in rows}
+        self.keys: list = sorted(_order_key(row) for row in rows)
+        self.round = round
+        self.current = current
+
+    def add(self, row: tuple):
+        """Inserts a (rowid, character name, roll value, modifier) row in turn order"""
+        self.rows[row[0]] = row
+        insort(self.keys, _order_key(row))
+
+    def remove(self, rowid: int) -> tuple:
+        """Removes a row, returning it or None where it is not part of the encounter"""
+        row = self.rows.pop(rowid, None)
+        if row is not None:
+            del self.keys[bisect_left(self.keys, _order_key(row))]
+        return row
+
+    def update(self, rowid: int, name: str = None, roll: int = None, modifier: int = None):
+        """Applies a committed update to a row, moving it to its new place. The turn follows the row where it is the current one"""
+        row = self.remove(rowid)
+        if row is None:
+            return
+        updated = (
+            rowid,
+            row[1] if name is None else name,
+            row[2] if roll is None else roll,
+            row[3] if modifier is None else modifier
+        )
+        self.add(updated)
+        if self.current == _order_key(row):
+            self.current = _order_key(updated)
+
+    def row_at(self, index: int) -> tuple:
+        """Returns the row at a position in turn order"""
+        return self.rows[self.keys[index][1]]
+
+    def position(self) -> tuple:
+        """
+        Returns the current turn. The turn of a removed character has passed to the next character, into the
+        next round where it was the last one.
+
+        :return: tuple[size 2] of (round, index in turn order), index is 0 for an empty order
+        """
+        index: int = bisect_left(self.keys, self.current)
+        if index == len(self.keys) and self.keys:
+            return (self.round + 1, 0)
+        return (self.round, index)
+
+    def move_to(self, round: int, index: int):
+        """Makes it the turn of the character at index in the passed round"""
+        self.round = round
+        self.current = self.keys[index]
+
+    def next(self):
+        """Passes the turn to the next character, starting the next round after the last one"""
+        round, index = self.position()
+        if not self.keys:
+            return
+        if index + 1 == len(self.keys):
+            self.move_to(round + 1, 0)
+        else:
+            self.move_to(round, index + 1)
+
+    def previous(self):
+        """Returns the turn to the previous character, back into the previous round before the first one of a round after the first"""
+        round, index = self.position()
+        if not self.keys:
+            return
+        if index > 0:
+            self.move_to(round, index - 1)
+        elif round > 1:
+            self.move_to(round - 1, len(self.keys) - 1)
+        else:
+            self.move_to(round, 0)
+
+class EncounterCache():
+    def __init__(self, max_entries: int = ENCOUNTER_CACHE_MAX_ENTRIES) -> None:
+        """
+        LRU bounded cache of encounters keyed by their order's (user id, guild id, channel id) scope. Committed
+        order writes are applied to cached encounters like they are to the order cache. Turn state is stored in
+        the database, so an evicted encounter is reloaded on its next use.
+
+        :param max_entries: Maximum number of encounters held in memory
+        """
+        self.max_entries = max_entries
+        self.hits: int = 0
+        self.misses: int = 0
+        self.__encounters: OrderedDict = OrderedDict()
+        self.__lock = threading.RLock()
+
+    @property
+    def lock(self) -> threading.RLock:
+        """Lock to hold while reading or changing an encounter returned by get"""
+        return self.__lock
+
+    def get(self, scope: tuple) -> Encounter:
+        """Returns the cached encounter of a scope, or None on a cache miss"""
+        with self.__lock:
+            encounter = self.__encounters.get(scope)
+            if encounter is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__encounters.move_to_end(scope)
+            return encounter
+
+    def put(self, scope: tuple, encounter: Encounter):
+        """Stores an encounter, i.e. after loading it from the database"""
+        with self.__lock:
+            self.__encounters.pop(scope, None)
+            self.__encounters[scope] = encounter
+            while len(self.__encounters) > self.max_entries:
+                self.__encounters.popitem(last=False)
+
+    def add_row(self, scope: tuple, rowid: int, name: str, roll: int, modifier: int):
+        """Inserts a newly committed row into a cached encounter, if the encounter is cached"""
+        with self.__lock:
+            encounter = self.__encounters.get(scope)
+            if encounter is not None:
+                encounter.add((rowid, name, roll, modifier))
+
+    def update_row(self, scope: tuple, rowid: int, name: str = None, roll: int = None, modifier: int = None):
+        """Applies a committed update to a row of a cached encounter. Values left as None are unchanged"""
+        with self.__lock:
+            encounter = self.__encounters.get(scope)
+            if encounter is not None:
+                encounter.update(rowid, name, roll, modifier)
+
+    def remove_rows(self, scope: tuple, rowids: list):
+        """Removes committed deletions from a cached encounter"""
+        with self.__lock:
+            encounter = self.__encounters.get(scope)
+            if encounter is not None:
+                for rowid in rowids:
+                    encounter.remove(rowid)
+
+    def invalidate(self, scope: tuple):
+        """Drops a cached encounter so its next use reloads it from the database"""
+        with self.__lock:
+            self.__encounters.pop(scope, None)
+
+    def invalidate_user(self, user_id: int):
+        """Drops every cached encounter of a user, in any guild or channel"""
+        with self.__lock:
+            for scope in [scope for scope in self.__encounters if scope[0] == user_id]:
+                del self.__encounters[scope]
+
+    def invalidate_shard(self, shard: int):
+        """Drops every cached encounter stored in a database shard, see DBHelper.shard_for_guild"""
+        with self.__lock:
+            for scope in [scope for scope in self.__encounters if shard_for_guild(scope[1]) == shard]:
+                del self.__encounters[scope]
+
+    def clear(self):
+        """Drops every cached encounter"""
+        with self.__lock:
+            self.__encounters.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns cache counters
+
+        :return: dict with entries, max_entries, hits and misses keys
+        """
+        with self.__lock:
+            return {"entries": len(self.__encounters), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses}
+
+#Shared cache used by orderDB, usersDB and encounterDB
+encounter_cache = EncounterCache()
+Metrics.register_cache("encounter", encounter_cache.stats)
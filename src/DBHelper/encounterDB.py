@@ -0,0 +1,219 @@
+"""
+Helper module used to track combat turns of initiative orders. An order is in combat from its first next_turn
+until end_encounter or clear_user_order. The turn order is kept in memory by DBHelper.encounterCache while
+the round and current turn are stored in the encounters table of the order's shard.
+"""
+from DBHelper import ENCOUNTER_TABLE, ORDER_COMMAND_TABLE, SHARED_DATABASE, get_connection, transaction, timed_query, read_only, shard_for_guild, external_commits
+from DBHelper.encounterCache import Encounter, encounter_cache, turn_key
+from DBHelper.orderCache import order_cache
+from DBHelper.orderDB import _get_cached_order
+from DBHelper.usersDB import INSERT_USER_IF_MISSING
+
+#Import attribute names
+from DBHelper import USER_ID, GUILD_ID, CHANNEL_ID, ROLL, ROUND, CURRENT_ID, CURRENT_INITIATIVE
+
+#WHERE clause matching the encounter of one order scope
+_SCOPE_FILTER: str = f"{USER_ID} = ? AND {GUILD_ID} = ? AND {CHANNEL_ID} = ?"
+
+def _load_encounter(user_id: int, guild_id: int, channel_id: int) -> Encounter:
+    """
+    Returns an order's encounter from the encounter cache, loading it from the database on a cache miss
+
+    :return: Encounter or None where the order is not in combat
+    """
+    scope: tuple = (user_id, guild_id, channel_id)
+    shard: int = shard_for_guild(guild_id)
+    if SHARED_DATABASE and external_commits(shard):
+        order_cache.invalidate_shard(shard)
+        encounter_cache.invalidate_shard(shard)
+    encounter = encounter_cache.get(scope)
+    if encounter is not None:
+        return encounter
+
+    cursor = get_connection(shard).cursor()
+    cursor.execute(f"""
+        SELECT {ROUND}, {CURRENT_INITIATIVE}, {CURRENT_ID}
+        FROM {ENCOUNTER_TABLE}
+        WHERE {_SCOPE_FILTER};""", scope)
+    state = cursor.fetchone()
+    if state is None:
+        return None
+    encounter = Encounter(_get_cached_order(*scope), state[0], turn_key(state[1], state[2]))
+    encounter_cache.put(scope, encounter)
+    return encounter
+
+def _save_turn(encounter: Encounter, user_id: int, guild_id: int, channel_id: int):
+    """
+    Stores an encounter's round and current turn. The cached encounter is dropped where the write fails, so its
+    next use reloads the stored turn.
+    """
+    try:
+        with transaction(shard_for_guild(guild_id)) as conn:
+            _upsert_turn(conn.cursor(), user_id, guild_id, channel_id, encounter.round, encounter.current)
+    except BaseException:
+        encounter_cache.invalidate((user_id, guild_id, channel_id))
+        raise
+
+def _upsert_turn(cursor, user_id: int, guild_id: int, channel_id: int, round: int, current: tuple):
+    """Writes a turn within the caller's transaction, current being the sort key of the character whose turn it is"""
+    cursor.execute(INSERT_USER_IF_MISSING, (user_id,))
+    cursor.execute(f"""
+        INSERT INTO {ENCOUNTER_TABLE} ({USER_ID}, {GUILD_ID}, {CHANNEL_ID}, {ROUND}, {CURRENT_INITIATIVE}, {CURRENT_ID})
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT ({USER_ID}, {GUILD_ID}, {CHANNEL_ID})
+        DO UPDATE SET
+            {ROUND} = excluded.{ROUND},
+            {CURRENT_INITIATIVE} = excluded.{CURRENT_INITIATIVE},
+            {CURRENT_ID} = excluded.{CURRENT_ID};""",
+        (user_id, guild_id, channel_id, round, -current[0], current[1]))
+
+def _turn(encounter: Encounter) -> tuple:
+    """
+    Returns an encounter's current turn
+
+    :return: None for an empty order or a tuple. Tuple indices: [0]: round, [1]: index in the initiative order, [2]: character name
+    """
+    round, index = encounter.position()
+    if not encounter.keys:
+        return None
+    return (round, index, encounter.row_at(index)[1])
+
+@timed_query
+@read_only
+def get_turn(user_id: int, guild_id: int = 0, channel_id: int = 0):
+    """
+    Returns the current turn of an order in combat
+
+    :param user_id: Owner of the order
+    :param guild_id: Guild the order belongs to, 0 outside of a guild
+    :param channel_id: Channel the order belongs to, 0 outside of a guild
+    :return: None where the order is not in combat or empty, or a tuple. Tuple indices: [0]: round, [1]: index in the initiative order, [2]: character name
+    """
+    with encounter_cache.lock:
+        encounter = _load_encounter(user_id, guild_id, channel_id)
+        return None if encounter is None else _turn(encounter)
+
+@timed_query
+def next_turn(user_id: int, guild_id: int = 0, channel_id: int = 0):
+    """
+    Passes the turn to the next character in initiative order, starting combat at the top of round 1 where
+    the order is not in combat yet
+
+    :param user_id: Owner of the order
+    :param guild_id: Guild the order belongs to, 0 outside of a guild
+    :param channel_id: Channel the order belongs to, 0 outside of a guild
+    :return: None for an empty order or the new turn. Tuple indices: [0]: round, [1]: index in the initiative order, [2]: character name
+    """
+    with encounter_cache.lock:
+        encounter = _load_encounter(user_id, guild_id, channel_id)
+        if encounter is None:
+            #Start combat: the order is read once, later changes are applied to the encounter in place
+            encounter = Encounter(_get_cached_order(user_id, guild_id, channel_id), 1, None)
+            if not encounter.keys:
+                return None
+            encounter.move_to(1, 0)
+        else:
+            if not encounter.keys:
+                return None
+            encounter.next()
+
+        _save_turn(encounter, user_id, guild_id, channel_id)
+        encounter_cache.put((user_id, guild_id, channel_id), encounter)
+        return _turn(encounter)
+
+@timed_query
+def previous_turn(user_id: int, guild_id: int = 0, channel_id: int = 0):
+    """
+    Returns the turn to the previous character in initiative order
+
+    :param user_id: Owner of the order
+    :param guild_id: Guild the order belongs to, 0 outside of a guild
+    :param channel_id: Channel the order belongs to, 0 outside of a guild
+    :return: None where the order is not in combat or empty, or the new turn. Tuple indices: [0]: round, [1]: index in the initiative order, [2]: character name
+    """
+    with encounter_cache.lock:
+        encounter = _load_encounter(user_id, guild_id, channel_id)
+        if encounter is None or not encounter.keys:
+            return None
+        encounter.previous()
+        _save_turn(encounter, user_id, guild_id, channel_id)
+        return _turn(encounter)
+
+@timed_query
+def delay_turn(user_id: int, char_name: str = None, after_name: str = None, guild_id: int = 0, channel_id: int = 0):
+    """
+    Delays a character to act after another one by lowering its roll value, keeping its modifier. Where the
+    delayed character has the current turn, the turn passes to the character that was next.
+
+    :param user_id: Owner of the order
+    :param char_name: Character being delayed, the character whose turn it is where None
+    :param after_name: Character to act after, the character following char_name where None
+    :param guild_id: Guild the order belongs to, 0 outside of a guild
+    :param channel_id: Channel the order belongs to, 0 outside of a guild
+    :raise ValueError: Raised where the order is not in combat, a character does not exist or does not act after char_name
+    :return: The new turn. Tuple indices: [0]: round, [1]: index in the initiative order, [2]: character name
+    """
+    with encounter_cache.lock:
+        encounter = _load_encounter(user_id, guild_id, channel_id)
+        if encounter is None or not encounter.keys:
+            raise ValueError("The initiative order is not in combat, use `/initiative next` to start")
+
+        #The cached encounter is only changed once the new turn is committed
+        round, current_index = encounter.position()
+        index: int = current_index if char_name is None else _index_of(encounter, char_name)
+        if index == len(encounter.keys) - 1 and after_name is None:
+            raise ValueError(f"{encounter.row_at(index)[1]} already acts last")
+        target_index: int = index + 1 if after_name is None else _index_of(encounter, after_name)
+        if target_index <= index:
+            raise ValueError(f"{encounter.row_at(target_index)[1]} acts before {encounter.row_at(index)[1]}, characters can only be delayed")
+
+        delayed = encounter.row_at(index)
+        target = encounter.row_at(target_index)
+        #Ties are ordered oldest first, an older row needs one point less to act after the target
+        roll: int = target[2] + target[3] - delayed[3] - (1 if delayed[0] < target[0] else 0)
+        #Where the delayed character has the turn, it passes to the next character. The turn is pinned to an existing
+        #character, i.e. where the current one was removed
+        current: tuple = encounter.keys[index + 1 if index == current_index else current_index]
+
+        with transaction(shard_for_guild(guild_id)) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                UPDATE {ORDER_COMMAND_TABLE}
+                SET {ROLL} = ?
+                WHERE rowid = ?;""", (roll, delayed[0]))
+            _upsert_turn(cursor, user_id, guild_id, channel_id, round, current)
+
+        order_cache.update_row((user_id, guild_id, channel_id), delayed[0], roll=roll)
+        encounter.update(delayed[0], roll=roll)
+        encounter.round = round
+        encounter.current = current
+        return _turn(encounter)
+
+def _index_of(encounter: Encounter, char_name: str) -> int:
+    """
+    Returns the turn order index of the first character with a name
+
+    :raise ValueError: Raised where no character has the name
+    """
+    for index in range(len(encounter.keys)):
+        if encounter.row_at(index)[1] == char_name:
+            return index
+    raise ValueError(f"{char_name} does not exist")
+
+@timed_query
+def end_encounter(user_id: int, guild_id: int = 0, channel_id: int = 0) -> bool:
+    """
+    Ends combat for an order, keeping the order itself
+
+    :param user_id: Owner of the order
+    :param guild_id: Guild the order belongs to, 0 outside of a guild
+    :param channel_id: Channel the order belongs to, 0 outside of a guild
+    :return: True if the order was in combat
+    """
+    with transaction(shard_for_guild(guild_id)) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"DELETE FROM {ENCOUNTER_TABLE} WHERE {_SCOPE_FILTER};", (user_id, guild_id, channel_id))
+        ended: bool = cursor.rowcount > 0
+
+    encounter_cache.invalidate((user_id, guild_id, channel_id))
+    return ended
@@ -0,0 +1,171 @@
+"""
+Group commit worker. Every DBHelper call submitted from the cogs runs on its shard's database thread, which
+collects the calls queued within GROUP_COMMIT_WINDOW_MS (up to GROUP_COMMIT_MAX_OPERATIONS calls) and
+executes them in a single transaction with a single commit, so concurrent mutations share one fsync.
+
+Callers are answered only once the group's commit is durable (synchronous=FULL on the worker's
+connection), and calls run in submission order on one connection, so a read always observes every
+write submitted before it to the same shard. Functions marked with DBHelper.read_only run on their own
+outside of any group, like exclusive calls, so a read never holds the shard's write lock.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import Metrics
+from DBHelper import GROUP_COMMIT_WINDOW_MS, GROUP_COMMIT_MAX_OPERATIONS, GROUP_COMMIT_SYNCHRONOUS, get_connection, group_commit
+from DBHelper.orderCache import order_cache
+from DBHelper.encounterCache import encounter_cache
+
+class _Job():
+    __slots__ = ("func", "args", "kwargs", "exclusive", "future")
+
+    def __init__(self, func, args: tuple, kwargs: dict, exclusive: bool) -> None:
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.exclusive = exclusive
+        self.future = Future()
+
+class GroupCommitWorker():
+    def __init__(self, shard: int = 0, window_ms: float = GROUP_COMMIT_WINDOW_MS, max_operations: int = GROUP_COMMIT_MAX_OPERATIONS, synchronous: str = GROUP_COMMIT_SYNCHRONOUS) -> None:
+        """
+        Database worker thread committing queued DBHelper calls to one shard in groups
+
+        :param shard: Shard whose writes are grouped, see DBHelper.shard_for_guild
+        :param window_ms: Time the worker waits for more calls after the first call of a group, 0 to only group calls already queued
+        :param max_operations: Maximum number of calls committed together
+        :param synchronous: 'PRAGMA synchronous' level of the worker's connection, FULL makes every acknowledged group durable
+        """
+        self.shard = shard
+        self.window = window_ms / 1000
+        self.max_operations = max_operations
+        self.synchronous = synchronous
+        self.commits: int = 0
+        self.operations: int = 0
+        self.__queue = queue.SimpleQueue()
+        self.__thread: threading.Thread = None
+        self.__lock = threading.Lock()
+        self.__closed: bool = False
+
+    def submit(self, func, args: tuple = (), kwargs: dict = None, exclusive: bool = False) -> Future:
+        """
+        Queues a call for the worker thread, starting the thread on first use
+
+        :param func: usersDB/orderDB (or any other blocking DBHelper) function to execute
+        :param exclusive: Run the call on its own outside of any transaction, i.e. for VACUUM or incremental_vacuum.
+            Always done for functions marked with DBHelper.read_only
+        :raise RuntimeError: Raised where the worker has been shut down
+        :return: concurrent.futures.Future resolved with the value returned by func once its group is committed
+        """
+        job = _Job(func, args, kwargs or {}, exclusive or getattr(func, "read_only", False))
+        with self.__lock:
+            if self.__closed:
+                raise RuntimeError("The database worker has been shut down")
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name=f"DBHelper-{self.shard}", daemon=True)
+                self.__thread.start()
+            self.__queue.put(job)
+        return job.future
+
+    def shutdown(self):
+        """Waits for every queued call to be committed, then stops the worker thread"""
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__closed = True
+            thread = self.__thread
+            self.__queue.put(None)
+        if thread is not None:
+            thread.join()
+
+    def __run(self):
+        try:
+            get_connection(self.shard).execute(f"PRAGMA synchronous = {self.synchronous};")
+        except BaseException as error:
+            self.__fail_queued(error)
+            return
+
+        job: _Job = self.__queue.get()
+        while job is not None:
+            if job.exclusive:
+                self.__run_exclusive(job)
+                job = self.__queue.get()
+                continue
+
+            batch: list = [job]
+            held: bool = False
+            deadline: float = time.monotonic() + self.window
+            while len(batch) < self.max_operations:
+                timeout: float = deadline - time.monotonic()
+                try:
+                    queued = self.__queue.get(timeout=timeout) if timeout > 0 else self.__queue.get_nowait()
+                except queue.Empty:
+                    break
+                if queued is None or queued.exclusive:
+                    #Commit the group before stopping or running the exclusive call
+                    job, held = queued, True
+                    break
+                batch.append(queued)
+
+            self.__commit(batch)
+            if not held:
+                job = self.__queue.get()
+
+    def __fail_queued(self, error: BaseException):
+        """
+        Fails every queued call with the error raised opening the worker's connection and stops the thread. The
+        next submitted call starts a new thread, which opens the connection again.
+        """
+        with self.__lock:
+            self.__thread = None
+            while True:
+                try:
+                    job = self.__queue.get_nowait()
+                except queue.Empty:
+                    return
+                if job is not None and job.future.set_running_or_notify_cancel():
+                    job.future.set_exception(error)
+
+    def __run_exclusive(self, job: _Job):
+        if not job.future.set_running_or_notify_cancel():
+            return
+        try:
+            job.future.set_result(job.func(*job.args, **job.kwargs))
+        except BaseException as error:
+            job.future.set_exception(error)
+
+    def __commit(self, batch: list):
+        """Executes a group of calls in one transaction, then answers every caller once it is committed"""
+        batch = [job for job in batch if job.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        started: float = time.perf_counter()
+        results: list = []
+        try:
+            with group_commit(self.shard):
+                for job in batch:
+                    try:
+                        results.append((job.func(*job.args, **job.kwargs), None))
+                    except Exception as error:
+                        results.append((None, error))
+        except BaseException as error:
+            #The cache was written through by calls whose writes were just rolled back
+            order_cache.clear()
+            encounter_cache.clear()
+            for job in batch:
+                job.future.set_exception(error)
+            return
+
+        self.commits += 1
+        self.operations += len(batch)
+        Metrics.observe(Metrics.DB_GROUP_COMMIT_LATENCY, time.perf_counter() - started)
+        Metrics.increment(Metrics.DB_GROUP_COMMIT_OPERATIONS, len(batch))
+
+        for job, (result, error) in zip(batch, results):
+            if error is None:
+                job.future.set_result(result)
+            else:
+                job.future.set_exception(error)
@@ -0,0 +1,136 @@
+"""Write-through, LRU bounded in-memory cache of initiative orders"""
+import threading
+from bisect import insort
+from collections import OrderedDict
+
+import Metrics
+from DBHelper import ORDER_CACHE_MAX_ENTRIES, shard_for_guild
+
+def _order_key(row: tuple) -> tuple:
+    """Sort key matching get_initiative_order: highest initiative first, oldest row first on ties"""
+    return (-(row[2] + row[3]), row[0])
+
+class OrderCache():
+    def __init__(self, max_entries: int = ORDER_CACHE_MAX_ENTRIES) -> None:
+        """
+        Caches each initiative order as a list of (rowid, character name, roll value, modifier)
+        tuples kept in initiative order, keyed by the order's (user id, guild id, channel id) scope.
+        Writes are applied to cached orders after they are committed to the database, so a cached
+        order is always identical to the stored one. The least recently used order is evicted once
+        more than max_entries orders are cached.
+
+        :param max_entries: Maximum number of orders held in memory
+        """
+        self.max_entries = max_entries
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.__orders: OrderedDict = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, scope: tuple) -> list:
+        """
+        Returns the cached order rows for a scope, or None on a cache miss
+
+        :param scope: (user id, guild id, channel id) tuple
+        :return: list of tuple[size 4] or None. Tuple indices: [0]: rowid, [1]: character name, [2]: roll value, [3]: modifier
+        """
+        with self.__lock:
+            rows = self.__orders.get(scope)
+            if rows is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__orders.move_to_end(scope)
+            return list(rows)
+
+    def put(self, scope: tuple, rows: list):
+        """
+        Stores a complete order, i.e. after loading it from the database
+
+        :param scope: (user id, guild id, channel id) tuple
+        :param rows: list of (rowid, character name, roll value, modifier) tuples
+        """
+        with self.__lock:
+            self.__orders.pop(scope, None)
+            self.__orders[scope] = sorted(rows, key=_order_key)
+            while len(self.__orders) > self.max_entries:
+                self.__orders.popitem(last=False)
+                self.evictions += 1
+
+    def add_row(self, scope: tuple, rowid: int, name: str, roll: int, modifier: int):
+        """Inserts a newly committed row into a cached order, if the order is cached"""
+        with self.__lock:
+            rows = self.__orders.get(scope)
+            if rows is None:
+                return
+            insort(rows, (rowid, name, roll, modifier), key=_order_key)
+
+    def update_row(self, scope: tuple, rowid: int, name: str = None, roll: int = None, modifier: int = None):
+        """Applies a committed update to a cached row. Values left as None are unchanged"""
+        with self.__lock:
+            rows = self.__orders.get(scope)
+            if rows is None:
+                return
+            for index, row in enumerate(rows):
+                if row[0] == rowid:
+                    del rows[index]
+                    updated = (
+                        rowid,
+                        row[1] if name is None else name,
+                        row[2] if roll is None else roll,
+                        row[3] if modifier is None else modifier
+                    )
+                    insort(rows, updated, key=_order_key)
+                    return
+
+    def remove_name(self, scope: tuple, name: str):
+        """Removes every cached row for a character name from a cached order"""
+        with self.__lock:
+            rows = self.__orders.get(scope)
+            if rows is None:
+                return
+            rows[:] = [row for row in rows if row[1] != name]
+
+    def invalidate(self, scope: tuple):
+        """Drops a cached order so the next read reloads it from the database"""
+        with self.__lock:
+            self.__orders.pop(scope, None)
+
+    def invalidate_user(self, user_id: int):
+        """Drops every cached order of a user, in any guild or channel"""
+        with self.__lock:
+            for scope in [scope for scope in self.__orders if scope[0] == user_id]:
+                del self.__orders[scope]
+
+    def invalidate_shard(self, shard: int):
+        """Drops every cached order stored in a database shard, see DBHelper.shard_for_guild"""
+        with self.__lock:
+            for scope in [scope for scope in self.__orders if shard_for_guild(scope[1]) == shard]:
+                del self.__orders[scope]
+
+    def clear(self):
+        """Drops every cached order"""
+        with self.__lock:
+            self.__orders.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns cache counters
+
+        :return: dict with entries, max_entries, hits, misses, evictions and hit_rate keys
+        """
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.__orders),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+#Shared cache used by orderDB and usersDB
+order_cache = OrderCache()
+Metrics.register_cache("order", order_cache.stats)
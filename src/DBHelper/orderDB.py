@@ -1,145 +1,290 @@
-"""Helper module used to maintain the database initiative order table"""
-import sqlite3
-from DBHelper import DATABASE_DIRECTORY, ORDER_COMMAND_TABLE, vacuum
-from DBHelper.usersDB import ID
+"""
+Helper module used to maintain the database initiative order table. Every order is scoped to a user, guild
+and channel; orders outside of a guild use guild and channel 0. Each guild's orders are stored in the
+shard returned by DBHelper.shard_for_guild.
+"""
+from DBHelper import ORDER_COMMAND_TABLE, ENCOUNTER_TABLE, SHARED_DATABASE, get_connection, transaction, timed_query, read_only, shard_for_guild, external_commits
+from DBHelper.usersDB import ID, INSERT_USER_IF_MISSING
+from DBHelper.orderCache import order_cache
+from DBHelper.encounterCache import encounter_cache
 
 #Import attribute names
-from DBHelper import USER_ID, NAME, ROLL, MODIFIER
+from DBHelper import USER_ID, GUILD_ID, CHANNEL_ID, NAME, ROLL, MODIFIER, INITIATIVE, CURRENT_ID, CURRENT_INITIATIVE
 
-def add_order_command(user_id: int, name: str, roll: int, modifier: int):
+#WHERE clause matching every row of one order scope
+_SCOPE_FILTER: str = f"{USER_ID} = ? AND {GUILD_ID} = ? AND {CHANNEL_ID} = ?"
+
+@timed_query
+def add_order_command(user_id: int, name: str, roll: int, modifier: int, guild_id: int = 0, channel_id: int = 0):
     """
-    Add a row to the order table
+    Add a row to the order table, adding the user id to the users table within the same transaction where it
+    does not exist
 
-    :param user_id: FOREIGN KEY user_id, must exist within the users table
+    :param user_id: FOREIGN KEY user_id, added to the users table where it does not exist
     :param name: Character name being added to the initiative order
     :param roll: initiative roll, typically from a D20 (1-20)
     :param modifier: roll modifier (i.e. -1, 0, or 1)
+    :param guild_id: Guild the order belongs to, 0 outside of a guild
+    :param channel_id: Channel the order belongs to, 0 outside of a guild
+    """
+    with transaction(shard_for_guild(guild_id)) as conn:
+        cursor = conn.cursor()
+        cursor.execute(INSERT_USER_IF_MISSING, (user_id,))
+        cursor.execute(f"""
+            INSERT INTO {ORDER_COMMAND_TABLE} ({USER_ID}, {GUILD_ID}, {CHANNEL_ID}, {NAME}, {ROLL}, {MODIFIER})
+            VALUES (?, ?, ?, ?, ?, ?);""", (user_id, guild_id, channel_id, name, roll, modifier))
+
+    order_cache.add_row((user_id, guild_id, channel_id), cursor.lastrowid, name, roll, modifier)
+    encounter_cache.add_row((user_id, guild_id, channel_id), cursor.lastrowid, name, roll, modifier)
+
+@timed_query
+def add_many_order_commands(user_id: int, characters: list, guild_id: int = 0, channel_id: int = 0) -> int:
     """
-    conn = sqlite3.Connection(DATABASE_DIRECTORY)
-    conn.execute("PRAGMA foreign_keys = ON;")
-    cursor = conn.cursor()
+    Adds the passed user id, if it does not exist, and a batch of rows to the order table within a single
+    transaction
+
+    :param user_id: Target user id, added to the users table where it does not exist
+    :param characters: list of (character name, roll, modifier) tuples, i.e.
+        DATA = [("Goblin 1", 12, 2), ("Goblin 2", 7, 2), ("Ogre", 15, 0),]
+    :param guild_id: Guild the order belongs to, 0 outside of a guild
+    :param channel_id: Channel the order belongs to, 0 outside of a guild
+    :return: Number of rows added
+    """
+    scope: tuple = (user_id, guild_id, channel_id)
+    with transaction(shard_for_guild(guild_id)) as conn:
+        cursor = conn.cursor()
+        cursor.execute(INSERT_USER_IF_MISSING, (user_id,))
+        #executemany does not report the new rowids, they are the rowids above the largest one before the batch
+        cursor.execute(f"SELECT coalesce(max(rowid), 0) FROM {ORDER_COMMAND_TABLE};")
+        last_rowid: int = cursor.fetchone()[0]
+        cursor.executemany(f"""
+            INSERT INTO {ORDER_COMMAND_TABLE} ({USER_ID}, {GUILD_ID}, {CHANNEL_ID}, {NAME}, {ROLL}, {MODIFIER})
+            VALUES (?, ?, ?, ?, ?, ?);""", [(*scope, name, roll, modifier) for name, roll, modifier in characters])
+        cursor.execute(f"""
+            SELECT rowid, {NAME}, {ROLL}, {MODIFIER}
+            FROM {ORDER_COMMAND_TABLE}
+            WHERE rowid > ? AND {_SCOPE_FILTER};""", (last_rowid, *scope))
+        added: list = cursor.fetchall()
 
-    cursor.execute(f"INSERT INTO {ORDER_COMMAND_TABLE} VALUES (?, ?, ?, ?);", (user_id, name, roll, modifier))
+    for row in added:
+        order_cache.add_row(scope, *row)
+        encounter_cache.add_row(scope, *row)
+    return len(characters)
 
-    conn.commit()
-    conn.close()
+def _get_cached_order(user_id: int, guild_id: int, channel_id: int) -> list:
+    """
+    Returns an order's rows from the order cache, loading them from the (user id, guild id, channel id, initiative)
+    index on a cache miss. With a SHARED_DATABASE the shard's cached orders are dropped first where another
+    process committed to it since the last read.
 
-def get_initiative_order(user_id: int) -> list:
+    :return: list of tuple[size 4]. Tuple indices: [0]: rowid, [1]: character name, [2]: roll value, [3]: modifier
     """
-    Returns a list of tuples representing the passed user id's initiative roll data. Data is sorted in order
-    from highest to lowest based on the sum of their roll value and their modifier (initiative order)
+    scope: tuple = (user_id, guild_id, channel_id)
+    shard: int = shard_for_guild(guild_id)
+    if SHARED_DATABASE and external_commits(shard):
+        order_cache.invalidate_shard(shard)
+        encounter_cache.invalidate_shard(shard)
+    rows = order_cache.get(scope)
+    if rows is None:
+        cursor = get_connection(shard).cursor()
+        cursor.execute(f"""
+            SELECT rowid, {NAME}, {ROLL}, {MODIFIER}
+            FROM {ORDER_COMMAND_TABLE}
+            WHERE {_SCOPE_FILTER}
+            ORDER BY {INITIATIVE} DESC, rowid ASC;""", scope)
+        rows = cursor.fetchall()
+        order_cache.put(scope, rows)
+    return rows
+
+@timed_query
+@read_only
+def get_initiative_order(user_id: int, guild_id: int = 0, channel_id: int = 0) -> list:
+    """
+    Returns a list of tuples representing the passed user id's initiative roll data within a guild channel. Data is sorted
+    in order from highest to lowest based on the sum of their roll value and their modifier (initiative order), served from
+    the order cache or read directly from the order initiative index. Ties are ordered oldest first.
 
     :param user_id: FOREIGN KEY user_id, must exist within the users table
+    :param guild_id: Guild the order belongs to, 0 outside of a guild
+    :param channel_id: Channel the order belongs to, 0 outside of a guild
     :return: list of tuple[size 3] or None if no ids exist. Tuple indices: [0]: character name, [1]: roll value, [2]: modifier
     """
-    conn = sqlite3.Connection(DATABASE_DIRECTORY)
-    conn.execute("PRAGMA foreign_keys = ON;")
-    cursor = conn.cursor()
+    return [row[1:] for row in _get_cached_order(user_id, guild_id, channel_id)]
 
-    cursor.execute(f"""
-        SELECT {NAME}, {ROLL}, {MODIFIER}
-        FROM {ORDER_COMMAND_TABLE}
-        WHERE {USER_ID} = {user_id};""")
-    
-    order = cursor.fetchall()
-    conn.close()
-
-    order.sort(key=lambda item: item[1] + item[2], reverse=True)
-
-    return order
-
-def get_one_order(user_id: int, char_name: str):
+@timed_query
+@read_only
+def get_one_order(user_id: int, char_name: str, guild_id: int = 0, channel_id: int = 0):
     """
     Returns a row as a tuple where the passed user id and character name are stored within the database or None if the
     row does not exist
 
     :param user_id: FOREIGN KEY user_id, must exist within the users table
     :param char_name: Character name being searched for
+    :param guild_id: Guild the order belongs to, 0 outside of a guild
+    :param channel_id: Channel the order belongs to, 0 outside of a guild
     :return: None if the row does not exist or a tuple if the row does exist. Tuple indices: [0]: character name, [1]: roll value, [2]: modifier
     """
-    conn = sqlite3.Connection(DATABASE_DIRECTORY)
-    conn.execute("PRAGMA foreign_keys = ON;")
-    cursor = conn.cursor()
-
-    cursor.execute(f"""
-        SELECT {NAME}, {ROLL}, {MODIFIER}
-        FROM {ORDER_COMMAND_TABLE}
-        WHERE {USER_ID} = {user_id} AND {NAME} = '{char_name}';""")
-    selection = cursor.fetchone()
-
-    conn.close()
-    return selection
+    for row in _get_cached_order(user_id, guild_id, channel_id):
+        if row[1] == char_name:
+            return row[1:]
+    return None
 
 
-def remove_one_order(user_id: int, char_name: str) -> bool:
+@timed_query
+def remove_one_order(user_id: int, char_name: str, guild_id: int = 0, channel_id: int = 0) -> bool:
     """
     Removes all rows from the database where the passed user id and character name match. Returns True if the rows
     were removed and False if the rows did not exist
 
     :param user_id: FOREIGN KEY user_id, must exist within the users table
     :param char_name: Character name being removed from the order
+    :param guild_id: Guild the order belongs to, 0 outside of a guild
+    :param channel_id: Channel the order belongs to, 0 outside of a guild
     :return: True if the rows were removed and False if the rows did not exist
     """
-    if get_one_order(user_id, char_name) != None:
-        conn = sqlite3.Connection(DATABASE_DIRECTORY)
-        conn.execute("PRAGMA foreign_keys = ON;")
+    with transaction(shard_for_guild(guild_id)) as conn:
         cursor = conn.cursor()
-
         cursor.execute(f"""
             DELETE FROM {ORDER_COMMAND_TABLE}
-            WHERE {USER_ID} = {user_id} AND {NAME} = '{char_name}';""")
+            WHERE {_SCOPE_FILTER} AND {NAME} = ?
+            RETURNING rowid;""", (user_id, guild_id, channel_id, char_name))
+        removed = cursor.fetchall()
 
-        conn.commit()
-        conn.close()
-        vacuum()
-        return True
-    else:
-        return False
+    if removed:
+        order_cache.remove_name((user_id, guild_id, channel_id), char_name)
+        encounter_cache.remove_rows((user_id, guild_id, channel_id), [row[0] for row in removed])
+    return len(removed) > 0
 
-def clear_user_order(user_id: int):
+@timed_query
+def clear_user_order(user_id: int, guild_id: int = 0, channel_id: int = 0):
     """
-    Removes all rows where the passed user id matches
+    Removes all rows of the user's order within a guild channel, ending its encounter where it is in combat
 
     :param user_id: FOREIGN KEY user_id, must exist within the users table
+    :param guild_id: Guild the order belongs to, 0 outside of a guild
+    :param channel_id: Channel the order belongs to, 0 outside of a guild
     """
-    conn = sqlite3.Connection(DATABASE_DIRECTORY)
-    conn.execute("PRAGMA foreign_keys = ON;")
-    cursor = conn.cursor()
+    with transaction(shard_for_guild(guild_id)) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            DELETE FROM {ORDER_COMMAND_TABLE}
+            WHERE {_SCOPE_FILTER};""", (user_id, guild_id, channel_id))
+        cursor.execute(f"""
+            DELETE FROM {ENCOUNTER_TABLE}
+            WHERE {_SCOPE_FILTER};""", (user_id, guild_id, channel_id))
 
-    cursor.execute(f"""
-        DELETE FROM {ORDER_COMMAND_TABLE}
-        WHERE {USER_ID} = {user_id};""")
-    
-    conn.commit()
-    conn.close()
-    vacuum()
+    order_cache.put((user_id, guild_id, channel_id), [])
+    encounter_cache.invalidate((user_id, guild_id, channel_id))
 
-def get_character_id(user_id: int, char_name: str) -> int:
+@timed_query
+def claim_legacy_order(user_id: int, guild_id: int, channel_id: int) -> int:
+    """
+    Moves the user's order kept outside of guilds (guild and channel 0), which holds every order created before orders
+    were scoped to guild channels, to the end of a guild channel's order. The rows are added to the channel before
+    the legacy order is cleared, so an interrupted move leaves a copy instead of losing the order.
+
+    :param user_id: FOREIGN KEY user_id, must exist within the users table
+    :param guild_id: Guild the order is moved to
+    :param channel_id: Channel the order is moved to
+    :return: Number of characters moved
+    """
+    if (guild_id, channel_id) == (0, 0):
+        return 0
+    #Oldest first, keeping the order of initiative ties
+    rows: list = sorted(_get_cached_order(user_id, 0, 0))
+    if not rows:
+        return 0
+    add_many_order_commands(user_id, [row[1:] for row in rows], guild_id, channel_id)
+    clear_user_order(user_id)
+    return len(rows)
+
+@timed_query
+@read_only
+def get_character_id(user_id: int, char_name: str, guild_id: int = 0, channel_id: int = 0) -> int:
     """
     Queries for the characters rowid within the SQLite database and returns the id or None if the character could
     not be found.
 
     :param user_id: FOREIGN KEY user_id, must exist within the users table
     :param char_name: Character being verified
-    :return: Unique integer id for queried character or None if the character does not exist
+    :param guild_id: Guild the order belongs to, 0 outside of a guild
+    :param channel_id: Channel the order belongs to, 0 outside of a guild
+    :return: Unique integer id (within the guild's shard) for queried character or None if the character does not exist
+    """
+    for row in _get_cached_order(user_id, guild_id, channel_id):
+        if row[1] == char_name:
+            return row[0]
+    return None
+
+def _update_assignments(char_name: str = None, roll_value: int = None, modifier: int = None) -> tuple:
     """
-    conn = sqlite3.Connection(DATABASE_DIRECTORY)
-    conn.execute("PRAGMA foreign_keys = ON;")
-    cursor = conn.cursor()
+    Formats the SET clause and parameters of an order row UPDATE from the passed optional values
 
+    :return: tuple of (SET clause, list of parameters), the clause being empty where no value was passed
+    """
+    assignments: list[str] = []
+    parameters: list = []
+    for column, value in ((NAME, char_name), (ROLL, roll_value), (MODIFIER, modifier)):
+        if value != None:
+            assignments.append(f"{column} = ?")
+            parameters.append(value)
+    return (", ".join(assignments), parameters)
+
+def _follow_current_turn(cursor, scope: tuple, row: tuple):
+    """
+    Moves a stored encounter's current turn along with its character's new initiative, within the caller's transaction
+
+    :param scope: (user id, guild id, channel id) tuple
+    :param row: Updated row. Tuple indices: [0]: rowid, [1]: character name, [2]: roll value, [3]: modifier
+    """
     cursor.execute(f"""
-        SELECT rowid
-        FROM {ORDER_COMMAND_TABLE}
-        WHERE {USER_ID} = {user_id} AND {NAME} = '{char_name}';""")
-    
-    result: int = cursor.fetchone()
+        UPDATE {ENCOUNTER_TABLE}
+        SET {CURRENT_INITIATIVE} = ?
+        WHERE {_SCOPE_FILTER} AND {CURRENT_ID} = ?;""", (row[2] + row[3], *scope, row[0]))
 
-    conn.commit()
-    conn.close()
+@timed_query
+def update_character(user_id: int, char_name: str, change_name: str = None, roll_value: int = None, modifier: int = None, guild_id: int = 0, channel_id: int = 0):
+    """
+    Updates the character data of the user's character with the passed name using a single UPDATE ... RETURNING
+    statement. Where several characters share the name, the one highest in the initiative order is updated.
 
-    return result[0] if (not result == None) else result
+    :param user_id: FOREIGN KEY user_id, must exist within the users table
+    :param char_name: Name of the character being updated
+    :param change_name: Optional str value used to update the character's name
+    :param roll_value: Optional int value used to update the character's roll value
+    :param modifier: Optional integer value used to update a character's roll modifier
+    :param guild_id: Guild the order belongs to, 0 outside of a guild
+    :param channel_id: Channel the order belongs to, 0 outside of a guild
+    :raise ValueError: Raised where no optional value was passed
+    :return: None if the character does not exist or a tuple of the updated row. Tuple indices: [0]: character name, [1]: roll value, [2]: modifier
+    """
+    assignments, parameters = _update_assignments(change_name, roll_value, modifier)
+    if assignments == "":
+        raise ValueError(f"You must enter at least one optional value to edit {char_name}!")
 
-def update_character_by_id(char_id: int, char_name:str = None, roll_value: int = None, modifier: int = None) -> bool:
+    with transaction(shard_for_guild(guild_id)) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            UPDATE {ORDER_COMMAND_TABLE}
+            SET {assignments}
+            WHERE rowid = (
+                SELECT rowid FROM {ORDER_COMMAND_TABLE}
+                WHERE {_SCOPE_FILTER} AND {NAME} = ?
+                ORDER BY {INITIATIVE} DESC, rowid ASC
+                LIMIT 1)
+            RETURNING rowid, {NAME}, {ROLL}, {MODIFIER};""", (*parameters, user_id, guild_id, channel_id, char_name))
+        updated = cursor.fetchone()
+        if updated != None:
+            _follow_current_turn(cursor, (user_id, guild_id, channel_id), updated)
+
+    if updated == None:
+        return None
+    order_cache.update_row((user_id, guild_id, channel_id), *updated)
+    encounter_cache.update_row((user_id, guild_id, channel_id), *updated)
+    return updated[1:]
+
+@timed_query
+def update_character_by_id(char_id: int, char_name:str = None, roll_value: int = None, modifier: int = None, guild_id: int = 0) -> bool:
     """
     Updates the character data of a particular row within the order table using a unique row ID.
 
@@ -147,58 +292,47 @@ def update_character_by_id(char_id: int, char_name:str = None, roll_value: int =
     :param char_name: Optional str value used to update the character's name
     :param roll_value: Optional int value used to update the character's roll value
     :param modifier: Optional integer value used to update a character's roll modifier
+    :param guild_id: Guild the character belongs to, row ids are unique within the guild's shard
     :return: True if the data was updated and False if no change was made
     """
-    #Formats the modified data for the SQLite update query
-    updated_data: str = ""
-    if not (char_name == None):
-        updated_data = updated_data + f"{NAME} = '{char_name}'"
-    if not (roll_value == None):
-        if not (updated_data == ""):
-            updated_data = updated_data + ", "
-        updated_data = updated_data + f"{ROLL} = {roll_value}"
-    if not (modifier == None):
-        if not (updated_data == ""):
-            updated_data = updated_data + ", "
-        updated_data = updated_data + f"{MODIFIER} = {modifier}"
+    assignments, parameters = _update_assignments(char_name, roll_value, modifier)
 
     #Executes SQLite UPDATE only if data was changed
-    if not (updated_data == ""):
-        conn = sqlite3.Connection(DATABASE_DIRECTORY)
-        conn.execute("PRAGMA foreign_keys = ON;")
-        cursor = conn.cursor()
+    if assignments == "":
+        return False
 
+    with transaction(shard_for_guild(guild_id)) as conn:
+        cursor = conn.cursor()
         cursor.execute(f"""
             UPDATE {ORDER_COMMAND_TABLE}
-            SET {updated_data}
-            WHERE rowid = {char_id};""")
-        
-        conn.commit()
-        conn.close()
-
-        return True
-    else:
+            SET {assignments}
+            WHERE rowid = ?
+            RETURNING {USER_ID}, {GUILD_ID}, {CHANNEL_ID}, rowid, {NAME}, {ROLL}, {MODIFIER};""", (*parameters, char_id))
+        updated = cursor.fetchone()
+        if updated != None:
+            _follow_current_turn(cursor, updated[:3], updated[3:])
+
+    if updated == None:
         return False
+    order_cache.update_row(updated[:3], *updated[3:])
+    encounter_cache.update_row(updated[:3], *updated[3:])
+    return True
 
-def get_character_by_id(char_id: int):
+@timed_query
+@read_only
+def get_character_by_id(char_id: int, guild_id: int = 0):
     """
     Returns the data for a particular character corresponding to a specified rowid within the order command table.
 
     :param char_id: rowid corresponding to a target character
+    :param guild_id: Guild the character belongs to, row ids are unique within the guild's shard
     :return: None if the row does not exist or a tuple if the row does exist. Tuple indices: [0]: character name, [1]: roll value, [2]: modifier
     """
-    conn = sqlite3.Connection(DATABASE_DIRECTORY)
-    conn.execute("PRAGMA foreign_keys = ON;")
-    cursor = conn.cursor()
+    cursor = get_connection(shard_for_guild(guild_id)).cursor()
 
     cursor.execute(f"""
         SELECT {NAME}, {ROLL}, {MODIFIER}
         FROM {ORDER_COMMAND_TABLE}
-        WHERE rowid = {char_id};""")
-    
-    selection = cursor.fetchone()
-
-    conn.close()
+        WHERE rowid = ?;""", (char_id,))
 
-    print(type(selection))
-    return selection
\ No newline at end of file
+    return cursor.fetchone()
@@ -0,0 +1,23 @@
+"""
+Switches every shard's database file to auto_vacuum=INCREMENTAL, rebuilding files created before it was used
+with a full VACUUM. Rebuilding rewrites each file, so run it once from the src/ directory while the bot is stopped:
+
+python3 -m DBHelper.rebuildDatabase
+"""
+import argparse
+
+import DBHelper
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    try:
+        for shard in range(DBHelper.SHARD_COUNT):
+            if DBHelper.init_auto_vacuum(shard):
+                print(f"{DBHelper.shard_path(shard)} already uses auto_vacuum=INCREMENTAL")
+            else:
+                DBHelper.init_auto_vacuum(shard, rebuild=True)
+                print(f"{DBHelper.shard_path(shard)} rebuilt with auto_vacuum=INCREMENTAL")
+    finally:
+        DBHelper.close_connections()
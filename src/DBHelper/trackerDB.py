@@ -0,0 +1,95 @@
+"""
+Helper module used to maintain the live tracker messages of initiative orders. Each order has at most one
+tracker, stored in the shard of the order's guild as returned by DBHelper.shard_for_guild.
+"""
+from DBHelper import TRACKER_TABLE, get_connection, transaction, timed_query, read_only, shard_for_guild
+from DBHelper.usersDB import INSERT_USER_IF_MISSING
+
+#Import attribute names
+from DBHelper import USER_ID, GUILD_ID, CHANNEL_ID, MESSAGE_GUILD_ID, MESSAGE_CHANNEL_ID, MESSAGE_ID
+
+#WHERE clause matching the tracker of one order scope
+_SCOPE_FILTER: str = f"{USER_ID} = ? AND {GUILD_ID} = ? AND {CHANNEL_ID} = ?"
+
+@timed_query
+def set_tracker(user_id: int, message_guild_id: int, message_channel_id: int, message_id: int, guild_id: int = 0, channel_id: int = 0):
+    """
+    Sets the live tracker message of an order, adding the user id to the users table where it does not exist
+
+    :param user_id: Owner of the order
+    :param message_guild_id: Guild the tracker message was posted in, 0 for a direct message
+    :param message_channel_id: Channel the tracker message was posted in
+    :param message_id: Tracker message id
+    :param guild_id: Guild the order belongs to, 0 outside of a guild
+    :param channel_id: Channel the order belongs to, 0 outside of a guild
+    :return: The replaced tracker or None. Tuple indices: [0]: message guild id, [1]: message channel id, [2]: message id
+    """
+    with transaction(shard_for_guild(guild_id)) as conn:
+        cursor = conn.cursor()
+        cursor.execute(INSERT_USER_IF_MISSING, (user_id,))
+        cursor.execute(f"""
+            SELECT {MESSAGE_GUILD_ID}, {MESSAGE_CHANNEL_ID}, {MESSAGE_ID}
+            FROM {TRACKER_TABLE}
+            WHERE {_SCOPE_FILTER};""", (user_id, guild_id, channel_id))
+        previous = cursor.fetchone()
+        cursor.execute(f"""
+            INSERT INTO {TRACKER_TABLE} ({USER_ID}, {GUILD_ID}, {CHANNEL_ID}, {MESSAGE_GUILD_ID}, {MESSAGE_CHANNEL_ID}, {MESSAGE_ID})
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT ({USER_ID}, {GUILD_ID}, {CHANNEL_ID})
+            DO UPDATE SET
+                {MESSAGE_GUILD_ID} = excluded.{MESSAGE_GUILD_ID},
+                {MESSAGE_CHANNEL_ID} = excluded.{MESSAGE_CHANNEL_ID},
+                {MESSAGE_ID} = excluded.{MESSAGE_ID};""",
+            (user_id, guild_id, channel_id, message_guild_id, message_channel_id, message_id))
+    return previous
+
+@timed_query
+@read_only
+def get_tracker(user_id: int, guild_id: int = 0, channel_id: int = 0):
+    """
+    Returns the live tracker message of an order
+
+    :param user_id: Owner of the order
+    :param guild_id: Guild the order belongs to, 0 outside of a guild
+    :param channel_id: Channel the order belongs to, 0 outside of a guild
+    :return: None if the order has no tracker or a tuple. Tuple indices: [0]: message guild id, [1]: message channel id, [2]: message id
+    """
+    cursor = get_connection(shard_for_guild(guild_id)).cursor()
+
+    cursor.execute(f"""
+        SELECT {MESSAGE_GUILD_ID}, {MESSAGE_CHANNEL_ID}, {MESSAGE_ID}
+        FROM {TRACKER_TABLE}
+        WHERE {_SCOPE_FILTER};""", (user_id, guild_id, channel_id))
+    return cursor.fetchone()
+
+@timed_query
+@read_only
+def get_tracked_scopes(shard: int = 0) -> list:
+    """
+    Returns the scope of every order with a live tracker in a shard, i.e. to load them at startup
+
+    :param shard: Shard number, see DBHelper.shard_for_guild
+    :return: list of tuple[size 3]. Tuple indices: [0]: user id, [1]: guild id, [2]: channel id
+    """
+    cursor = get_connection(shard).cursor()
+
+    cursor.execute(f"SELECT {USER_ID}, {GUILD_ID}, {CHANNEL_ID} FROM {TRACKER_TABLE};")
+    return cursor.fetchall()
+
+@timed_query
+def remove_tracker(user_id: int, message_id: int, guild_id: int = 0, channel_id: int = 0) -> bool:
+    """
+    Removes an order's live tracker where it is still the passed message, i.e. after the message was deleted
+
+    :param user_id: Owner of the order
+    :param message_id: Tracker message id
+    :param guild_id: Guild the order belongs to, 0 outside of a guild
+    :param channel_id: Channel the order belongs to, 0 outside of a guild
+    :return: True if the tracker was removed
+    """
+    with transaction(shard_for_guild(guild_id)) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            DELETE FROM {TRACKER_TABLE}
+            WHERE {_SCOPE_FILTER} AND {MESSAGE_ID} = ?;""", (user_id, guild_id, channel_id, message_id))
+        return cursor.rowcount > 0
@@ -1,10 +1,19 @@
-"""Helper module used to maintain the database users table"""
+"""
+Helper module used to maintain the database users table. Every shard holds its own users table for its
+order rows to reference; the functions below use shard 0 unless noted otherwise.
+"""
 import sqlite3
-from DBHelper import DATABASE_DIRECTORY, USERS_TABLE, vacuum
+from DBHelper import USERS_TABLE, PRIVATE_SCOPE_TABLE, SHARD_COUNT, get_connection, transaction, timed_query, read_only
+from DBHelper.orderCache import order_cache
+from DBHelper.encounterCache import encounter_cache
 
 #Import attribute names
-from DBHelper import ID
+from DBHelper import ID, USER_ID, GUILD_ID, CHANNEL_ID
 
+#Adds a user id where it does not already exist, shared with orderDB so order writes add their user in the same transaction
+INSERT_USER_IF_MISSING: str = f"INSERT INTO {USERS_TABLE} ({ID}) VALUES (?) ON CONFLICT DO NOTHING;"
+
+@timed_query
 def add_user(user_id: int):
     """
     Add a passed user id into the database
@@ -12,14 +21,11 @@ def add_user(user_id: int):
     :param user_id: integer value representing the target user
     :raise sqlite3.IntegrityError: Raised when the target user id already exists within the table
     """
-    conn = sqlite3.Connection(DATABASE_DIRECTORY)
-    cursor = conn.cursor()
-
-    cursor.execute(f"INSERT INTO {USERS_TABLE} VALUES ({user_id});")
-
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"INSERT INTO {USERS_TABLE} VALUES (?);", (user_id,))
 
+@timed_query
 def add_many_users(user_ids: list):
     """
     Add a list of user ids into the database
@@ -29,29 +35,25 @@ def add_many_users(user_ids: list):
     :raise ValueError: Raised when data is formatted incorrectly, must be a list of tuples (123,)
     :raise sqlite3.IntegrityError: Raised when a target user id already exists within the table
     """
-    conn = sqlite3.Connection(DATABASE_DIRECTORY)
-    cursor = conn.cursor()
-
-    cursor.executemany(f"INSERT INTO {USERS_TABLE} VALUES (?);", user_ids)
-
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(f"INSERT INTO {USERS_TABLE} VALUES (?);", user_ids)
 
+@timed_query
+@read_only
 def get_all_users() -> list:
     """
     Returns all users within the database as a list of tuples[size 1]
 
     :return: list of tuple[size 1] or None if no ids exist. Tuple indices: [0]: user_id
     """
-    conn = sqlite3.Connection(DATABASE_DIRECTORY)
-    cursor = conn.cursor()
-    
-    cursor.execute(f"SELECT {ID} FROM {USERS_TABLE};")
-    data = cursor.fetchall()
+    cursor = get_connection().cursor()
 
-    conn.close()
-    return data
+    cursor.execute(f"SELECT {ID} FROM {USERS_TABLE};")
+    return cursor.fetchall()
 
+@timed_query
+@read_only
 def get_user(user_id: int):
     """
     Returns users table row where the id matches the passed user od or None if
@@ -60,32 +62,31 @@ def get_user(user_id: int):
     :param user_id: integer value representing the target user
     :return: tuple or None if id does not exist. Tuple indices: [0]: user_id
     """
-    conn = sqlite3.Connection(DATABASE_DIRECTORY)
-    cursor = conn.cursor()
-
-    cursor.execute(f"SELECT {ID} FROM {USERS_TABLE} WHERE {ID} = {user_id};")
-    id = cursor.fetchone()
+    cursor = get_connection().cursor()
 
-    conn.close()
-    return id
+    cursor.execute(f"SELECT {ID} FROM {USERS_TABLE} WHERE {ID} = ?;", (user_id,))
+    return cursor.fetchone()
 
+@timed_query
 def remove_user(user_id: int):
     """
-    Remove a user with the passed user id if it exists
+    Remove a user with the passed user id from every shard if it exists
 
     :param user_id: integer value representing the target user
     """
-    conn = sqlite3.Connection(DATABASE_DIRECTORY)
-    conn.execute("PRAGMA foreign_keys = ON;")
-    cursor = conn.cursor()
-
-    cursor.execute(f"""
-        DELETE FROM {USERS_TABLE}
-        WHERE {ID} = {user_id};""")
-    
-    conn.commit()
-    conn.close()
-
+    for shard in range(SHARD_COUNT):
+        with transaction(shard) as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                DELETE FROM {USERS_TABLE}
+                WHERE {ID} = ?;""", (user_id,))
+
+    #Order rows and encounters are removed by ON DELETE CASCADE
+    order_cache.invalidate_user(user_id)
+    encounter_cache.invalidate_user(user_id)
+
+@timed_query
+@read_only
 def verify_user(user_id: int) -> bool:
     """
     Verify the passed user id exists within the database
@@ -94,22 +95,50 @@ def verify_user(user_id: int) -> bool:
     """
     return get_user(user_id) != None
 
+@timed_query
 def verify_or_add_user(user_id: int) -> bool:
     """
     Verify the passed user id exists within the database or add the user id to the database
-    if it does not exist
+    if it does not exist, using a single INSERT ... ON CONFLICT DO NOTHING statement
 
     :return: True if the id exists or was added, False if the id could not be verified or added
     """
-    if get_user(user_id) != None:
+    try:
+        with transaction() as conn:
+            conn.execute(INSERT_USER_IF_MISSING, (user_id,))
         return True
-    else:
-        try:
-            add_user(user_id)
-            return True
-        except sqlite3.IntegrityError as e:
-            print(e)
-            return False
-        except Exception as e:
-            print(e)
-            return False
\ No newline at end of file
+    except sqlite3.Error as e:
+        print(e)
+        return False
+
+@timed_query
+def set_private_scope(user_id: int, guild_id: int, channel_id: int):
+    """
+    Binds the user's direct message commands to a guild channel's initiative order, replacing any earlier binding.
+    The user id is added to the users table where it does not exist.
+
+    :param user_id: integer value representing the target user
+    :param guild_id: Guild of the bound order
+    :param channel_id: Channel of the bound order, 0 where orders are shared across the guild
+    """
+    with transaction() as conn:
+        cursor = conn.cursor()
+        cursor.execute(INSERT_USER_IF_MISSING, (user_id,))
+        cursor.execute(f"""
+            INSERT INTO {PRIVATE_SCOPE_TABLE} ({USER_ID}, {GUILD_ID}, {CHANNEL_ID})
+            VALUES (?, ?, ?)
+            ON CONFLICT ({USER_ID}) DO UPDATE SET {GUILD_ID} = excluded.{GUILD_ID}, {CHANNEL_ID} = excluded.{CHANNEL_ID};""", (user_id, guild_id, channel_id))
+
+@timed_query
+@read_only
+def get_private_scope(user_id: int) -> tuple:
+    """
+    Returns the guild channel the user's direct message commands are bound to
+
+    :param user_id: integer value representing the target user
+    :return: tuple[size 2] of (guild id, channel id), (0, 0) where the user has no binding
+    """
+    cursor = get_connection().cursor()
+
+    cursor.execute(f"SELECT {GUILD_ID}, {CHANNEL_ID} FROM {PRIVATE_SCOPE_TABLE} WHERE {USER_ID} = ?;", (user_id,))
+    return cursor.fetchone() or (0, 0)
@@ -1,32 +1,168 @@
+import time
+#Reported as the import phase of startup
+_import_started: float = time.perf_counter()
+
+import asyncio
 import logging
 import logging.handlers
 
 import discord
-from discord.ext import commands
+from discord import app_commands
+from discord.ext import commands, tasks
 from DungeonBot.cogs import extensions
+from DungeonBot.gatewayProfile import GatewayProfile, get_gateway_profile
+from DungeonBot.commandSync import sync_if_changed
+import DBHelper
+import Metrics
+from DBHelper import asyncDB
+
+Metrics.set_gauge(Metrics.STARTUP_PHASE, time.perf_counter() - _import_started, phase="import")
+
+def _record_command_latency(interaction: discord.Interaction, command_name: str):
+    """Records the time since the interaction passed the tree's interaction check"""
+    started = interaction.extras.get("started")
+    if started is not None:
+        Metrics.observe(Metrics.COMMAND_LATENCY, time.perf_counter() - started, command=command_name)
+
+class DungeonBotTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """Timestamps every app command interaction for latency metrics"""
+        interaction.extras["started"] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError) -> None:
+        command_name: str = interaction.command.qualified_name if interaction.command else "unknown"
+        Metrics.increment(Metrics.COMMAND_ERRORS, command=command_name)
+        _record_command_latency(interaction, command_name)
+        await super().on_error(interaction, error)
+
+class DungeonBotBase():
+    def __init__(self, sync_commands: bool = True, maintenance: bool = True, **options) -> None:
+        """
+        Behaviour shared by DungeonBot and ShardedDungeonBot, combined with the discord.py bot class they connect with
 
-class DungeonBot(commands.Bot):
-    def __init__(self, **options) -> None:
-        intents = discord.Intents.all()
-        super().__init__(command_prefix=commands.when_mentioned_or("!"), intents=intents)
+        :param sync_commands: Sync the command tree with Discord on startup, done by one process of a cluster
+        :param maintenance: Run the database maintenance loop, done by one process of a cluster
+        :param options: discord.py client options, i.e. shard_ids and shard_count
+        """
+        profile: GatewayProfile = get_gateway_profile()
+        super().__init__(command_prefix=commands.when_mentioned_or("!"), tree_cls=DungeonBotTree, **profile.client_options(), **options)
+        self.sync_commands = sync_commands
+        self.maintenance = maintenance
+        self.__lag_monitor: asyncio.Task = None
+        self.__setup_finished: float = None
+        self.__ready_reported: bool = False
     
     async def on_ready(self):
         print(f'Logged in: {self.user}!\n')
 
+        #Report the startup breakdown on the first ready only, not after reconnects
+        if not self.__ready_reported and self.__setup_finished is not None:
+            self.__ready_reported = True
+            Metrics.set_gauge(Metrics.STARTUP_PHASE, time.perf_counter() - self.__setup_finished, phase="gateway")
+            print(f"Startup time:\n{Metrics.startup_report()}\n")
+
+    async def on_app_command_completion(self, interaction: discord.Interaction, command: app_commands.Command):
+        _record_command_latency(interaction, command.qualified_name)
+
     async def setup_hook(self) -> None:
         """
         Gathers command extensions from cogs, imported from cogs.
         """
         print("Seeking cogs...")
 
-        for ext in extensions:
-            await self.load_extension(f"DungeonBot.cogs.{ext}")
+        with Metrics.startup_phase("database"):
+            if DBHelper.memory_storage():
+                #Load every shard into memory now rather than on its first command
+                await asyncio.to_thread(DBHelper.init_database)
+            else:
+                #Shard 0 records the shard count, refuse to start where it changed
+                await asyncDB.run_exclusive(DBHelper.check_shard_layout, shard=0)
+
+        with Metrics.startup_phase("extensions"):
+            for ext in extensions:
+                await self.load_extension(f"DungeonBot.cogs.{ext}")
+
+        if self.sync_commands:
+            with Metrics.startup_phase("command_tree"):
+                try:
+                    synced = await sync_if_changed(self.tree, self.application_id)
+                    if synced is None:
+                        print("Command tree unchanged since the last sync, skipping sync")
+                    else:
+                        print(f"Synced command tree: {len(synced)} commands synced")
+                except Exception as e:
+                    print(e)
+
+        if self.maintenance:
+            self.reclaim_database_space.start()
+        if DBHelper.memory_storage():
+            self.backup_database.start()
+        self.write_metrics.start()
+        self.__lag_monitor = asyncio.create_task(Metrics.monitor_event_loop_lag())
+        self.__setup_finished = time.perf_counter()
 
-        print("Syncing command tree...")
+    @tasks.loop(seconds=DBHelper.MAINTENANCE_INTERVAL_SECONDS)
+    async def reclaim_database_space(self):
+        """
+        Background maintenance task releasing free database pages on the database worker thread,
+        keeping VACUUM off the command path.
+        """
+        for shard in range(DBHelper.SHARD_COUNT):
+            try:
+                released = await asyncDB.run_exclusive(DBHelper.reclaim_free_pages, shard=shard)
+                if released:
+                    print(f"Database maintenance: {released} free pages released from {DBHelper.shard_path(shard)}")
+            except Exception as e:
+                print(e)
+
+    @tasks.loop(seconds=DBHelper.BACKUP_INTERVAL_SECONDS)
+    async def backup_database(self):
+        """
+        Background task writing the in-memory databases back to their files on the database worker threads,
+        see DBHelper.STORAGE_MODE
+        """
+        #The first iteration runs at startup, right after the files were loaded
+        if self.backup_database.current_loop == 0:
+            return
+        for shard in range(DBHelper.SHARD_COUNT):
+            try:
+                await asyncDB.run_exclusive(DBHelper.backup_database, shard=shard)
+            except Exception as e:
+                print(e)
+
+    @tasks.loop(seconds=Metrics.PROMETHEUS_INTERVAL_SECONDS)
+    async def write_metrics(self):
+        """
+        Periodically writes the Prometheus metrics file
+        """
         try:
-            synced = await self.tree.sync()
-            print(f"Synced command tree: {len(synced)} commands synced")
+            await asyncio.to_thread(Metrics.write_prometheus)
         except Exception as e:
             print(e)
 
+    async def close(self) -> None:
+        """
+        Closes the gateway connection, then drains the database worker thread. In-memory databases are written
+        back to their files once the worker is drained.
+        """
+        self.reclaim_database_space.cancel()
+        self.backup_database.cancel()
+        self.write_metrics.cancel()
+        if self.__lag_monitor is not None:
+            self.__lag_monitor.cancel()
+        await super().close()
+        asyncDB.shutdown()
+
+class DungeonBot(DungeonBotBase, commands.Bot):
+    """DungeonBot connecting every gateway shard from a single process"""
+
+class ShardedDungeonBot(DungeonBotBase, commands.AutoShardedBot):
+    """
+    DungeonBot connecting a range of gateway shards (shard_ids out of shard_count), run by the workers of
+    DungeonBot.cluster
+    """
+    async def on_shard_ready(self, shard_id: int):
+        print(f"Shard {shard_id} of {self.shard_count} ready")
+
 DungeonBot = DungeonBot()
\ No newline at end of file
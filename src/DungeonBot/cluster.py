@@ -0,0 +1,241 @@
+"""
+Cluster launcher. Runs DungeonBot as several worker processes, each connecting a contiguous range of the
+bot's gateway shards with a ShardedDungeonBot, under a supervisor that restarts any worker exiting
+unexpectedly. Workers are started one at a time, each once the previous worker's shards are ready, so
+their gateway identifies stay within Discord's rate limit.
+
+Workers share the database files. SQLite's locks serialize their writes and DungeonBotSharedDatabase is set
+for every worker, so cached orders are checked against the other workers' commits. Only worker 0 syncs the
+command tree and runs database maintenance, and each worker writes its own metrics file.
+
+python3 -m DungeonBot.cluster [--workers N] [--shards N] [--fake-gateway] [--crash-after SECONDS]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+
+import discord
+
+import Metrics
+from DungeonBot import ShardedDungeonBot
+from DungeonBot.fakeGateway import FakeGateway
+
+#Number of worker processes, main.py starts a cluster where this is greater than 1
+CLUSTER_WORKERS: int = int(os.getenv("DungeonBotClusterWorkers", "1"))
+
+#Total number of gateway shards across the cluster, 0 to use the count recommended by Discord
+GATEWAY_SHARDS: int = int(os.getenv("DungeonBotGatewayShards", "0"))
+
+#SUPERVISOR SETTINGS
+WORKER_READY_TIMEOUT_SECONDS: float = 300
+WORKER_STOP_TIMEOUT_SECONDS: float = 30
+RESTART_DELAY_SECONDS: float = 5
+MAX_RESTART_DELAY_SECONDS: float = 300
+#A worker running this long before exiting is restarted without backing off
+STABLE_UPTIME_SECONDS: float = 600
+SUPERVISOR_POLL_SECONDS: float = 1
+
+def shard_ranges(shard_count: int, workers: int) -> list:
+    """
+    Splits the gateway shards into contiguous ranges of near equal size, one per worker
+
+    :return: list of shard id lists, at most shard_count long
+    """
+    workers = min(workers, shard_count)
+    size, remainder = divmod(shard_count, workers)
+    ranges: list = []
+    start: int = 0
+    for worker in range(workers):
+        end: int = start + size + (1 if worker < remainder else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+async def recommended_shard_count(token: str) -> int:
+    """Returns the number of gateway shards Discord recommends for the bot"""
+    async with discord.Client(intents=discord.Intents.none()) as client:
+        await client.login(token)
+        shards, _, _ = await client.http.get_bot_gateway()
+    return shards
+
+def _metrics_file(worker_id: int) -> str:
+    """Returns a worker's Prometheus file, next to the configured one"""
+    if not Metrics.PROMETHEUS_FILE:
+        return ""
+    root, extension = os.path.splitext(Metrics.PROMETHEUS_FILE)
+    return f"{root}_worker{worker_id}{extension}"
+
+async def _run_worker(worker_id: int, shard_ids: list, shard_count: int, token: str, events, fake_gateway: bool, crash_after: float):
+    bot = ShardedDungeonBot(shard_ids=shard_ids, shard_count=shard_count, sync_commands=worker_id == 0 and not fake_gateway, maintenance=worker_id == 0)
+
+    async def report_ready():
+        events.put(worker_id)
+    bot.add_listener(report_ready, "on_ready")
+
+    #The supervisor stops workers with SIGTERM, Ctrl+C sends SIGINT to the whole process group
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, lambda: asyncio.ensure_future(bot.close()))
+
+    if fake_gateway:
+        await FakeGateway(bot, shard_ids, shard_count, crash_after=crash_after).run()
+    else:
+        async with bot:
+            await bot.start(token)
+
+def worker_main(worker_id: int, shard_ids: list, shard_count: int, token: str, events, fake_gateway: bool = False, crash_after: float = None):
+    """
+    Entry point of a worker process: runs a ShardedDungeonBot for a range of gateway shards until it is closed
+
+    :param worker_id: Worker number, worker 0 syncs the command tree and runs database maintenance
+    :param shard_ids: Gateway shards connected by this worker
+    :param shard_count: Total number of gateway shards across the cluster
+    :param token: Bot token
+    :param events: multiprocessing Queue the worker id is put on once every shard is ready
+    :param fake_gateway: Run against a FakeGateway instead of connecting to Discord
+    :param crash_after: With fake_gateway, exit without cleanup after this many seconds
+    """
+    asyncio.run(_run_worker(worker_id, shard_ids, shard_count, token, events, fake_gateway, crash_after))
+
+class Supervisor():
+    def __init__(self, token: str, workers: int, shard_count: int, fake_gateway: bool = False, crash_after: float = None) -> None:
+        """
+        Starts and supervises the worker processes of a cluster
+
+        :param token: Bot token
+        :param workers: Number of worker processes, capped at shard_count
+        :param shard_count: Total number of gateway shards
+        :param fake_gateway: Run the workers against a FakeGateway instead of connecting to Discord
+        :param crash_after: With fake_gateway, make each worker's first run exit after this many seconds
+        """
+        self.token = token
+        self.shard_count = shard_count
+        self.ranges: list = shard_ranges(shard_count, workers)
+        self.fake_gateway = fake_gateway
+        self.crash_after = crash_after
+        self.restarts: list = [0] * len(self.ranges)
+        self.__context = multiprocessing.get_context("spawn")
+        self.__events = self.__context.Queue()
+        self.__processes: list = [None] * len(self.ranges)
+        self.__started: list = [0.0] * len(self.ranges)
+        self.__failures: list = [0] * len(self.ranges)
+        self.__restart_at: dict = {}
+        self.__ready: set = set()
+        self.__stopping = threading.Event()
+
+    def start_worker(self, worker_id: int):
+        """Starts a worker process and waits until its shards are ready, it exits or WORKER_READY_TIMEOUT_SECONDS pass"""
+        shard_ids: list = self.ranges[worker_id]
+        crash_after: float = self.crash_after if self.restarts[worker_id] == 0 else None
+        process = self.__context.Process(
+            target=worker_main,
+            args=(worker_id, shard_ids, self.shard_count, self.token, self.__events, self.fake_gateway, crash_after),
+            name=f"DungeonBot-worker-{worker_id}"
+        )
+
+        #Spawned workers read their configuration from the environment when importing DBHelper and Metrics
+        os.environ["DungeonBotSharedDatabase"] = "1"
+        os.environ["DungeonBotMetricsFile"] = _metrics_file(worker_id)
+        process.start()
+        self.__processes[worker_id] = process
+        self.__started[worker_id] = time.monotonic()
+        self.__ready.discard(worker_id)
+        print(f"Worker {worker_id} (pid {process.pid}) starting shards {shard_ids[0]}-{shard_ids[-1]} of {self.shard_count}")
+
+        deadline: float = time.monotonic() + WORKER_READY_TIMEOUT_SECONDS
+        while worker_id not in self.__ready and process.is_alive() and not self.__stopping.is_set():
+            self.__receive_events(min(SUPERVISOR_POLL_SECONDS, max(deadline - time.monotonic(), 0)))
+            if time.monotonic() >= deadline:
+                print(f"Worker {worker_id} was not ready within {WORKER_READY_TIMEOUT_SECONDS} seconds")
+                break
+
+    def __receive_events(self, timeout: float):
+        try:
+            worker_id: int = self.__events.get(timeout=timeout)
+        except queue.Empty:
+            return
+        self.__ready.add(worker_id)
+        print(f"Worker {worker_id} ready")
+
+    def __check_workers(self):
+        """Schedules a restart for every worker that exited, backing off while a worker keeps failing"""
+        if self.__stopping.is_set():
+            return
+        now: float = time.monotonic()
+        for worker_id, process in enumerate(self.__processes):
+            if process is None or process.is_alive() or worker_id in self.__restart_at:
+                continue
+            if now - self.__started[worker_id] >= STABLE_UPTIME_SECONDS:
+                self.__failures[worker_id] = 0
+            delay: float = min(RESTART_DELAY_SECONDS * 2 ** self.__failures[worker_id], MAX_RESTART_DELAY_SECONDS)
+            self.__failures[worker_id] += 1
+            self.__restart_at[worker_id] = now + delay
+            print(f"Worker {worker_id} exited with code {process.exitcode}, restarting in {delay:g} seconds")
+
+        for worker_id, restart_at in list(self.__restart_at.items()):
+            if now >= restart_at:
+                del self.__restart_at[worker_id]
+                self.restarts[worker_id] += 1
+                self.start_worker(worker_id)
+
+    def run(self):
+        """Starts every worker and supervises them until stop is called or the supervisor receives SIGINT or SIGTERM"""
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda signum, frame: self.__stopping.set())
+
+        for worker_id in range(len(self.ranges)):
+            if self.__stopping.is_set():
+                break
+            self.start_worker(worker_id)
+
+        while not self.__stopping.is_set():
+            self.__receive_events(SUPERVISOR_POLL_SECONDS)
+            self.__check_workers()
+
+        self.__stop_workers()
+
+    def stop(self):
+        """Makes run stop every worker and return"""
+        self.__stopping.set()
+
+    def __stop_workers(self):
+        """Asks every worker to close, killing workers still running after WORKER_STOP_TIMEOUT_SECONDS"""
+        print("Stopping workers...")
+        processes: list = [process for process in self.__processes if process is not None and process.is_alive()]
+        for process in processes:
+            process.terminate()
+        deadline: float = time.monotonic() + WORKER_STOP_TIMEOUT_SECONDS
+        for process in processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+def supervise(token: str, workers: int = CLUSTER_WORKERS, shard_count: int = GATEWAY_SHARDS, fake_gateway: bool = False, crash_after: float = None):
+    """
+    Runs a cluster until the process receives SIGINT or SIGTERM
+
+    :param token: Bot token, unused with fake_gateway
+    :param workers: Number of worker processes
+    :param shard_count: Total number of gateway shards, 0 for Discord's recommended count (one per worker with fake_gateway)
+    :param fake_gateway: Run the workers against a FakeGateway instead of connecting to Discord
+    :param crash_after: With fake_gateway, make each worker's first run exit after this many seconds
+    """
+    if shard_count <= 0:
+        shard_count = workers if fake_gateway else asyncio.run(recommended_shard_count(token))
+    Supervisor(token, workers, shard_count, fake_gateway, crash_after).run()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=max(CLUSTER_WORKERS, 1))
+    parser.add_argument("--shards", type=int, default=GATEWAY_SHARDS, help="Total gateway shards, 0 for Discord's recommended count")
+    parser.add_argument("--fake-gateway", action="store_true", help="Run the workers against a local stand-in for the Discord gateway")
+    parser.add_argument("--crash-after", type=float, help="With --fake-gateway, exit each worker without cleanup after this many seconds once")
+    arguments = parser.parse_args()
+
+    supervise(os.getenv("DungeonBotToken"), arguments.workers, arguments.shards, arguments.fake_gateway, arguments.crash_after)
@@ -2,35 +2,86 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 
-import DBHelper
-from DBHelper import usersDB, orderDB
+from DBHelper import orderDB, usersDB, trackerDB, encounterDB, asyncDB
 from DungeonBot.cogs.RNG.dieImage import Die
+from DungeonBot.cogs.Initiative.partyList import parse_party, PartyListError
+from DungeonBot.cogs.Initiative.liveTracker import LiveTrackers, partial_message
 
-def get_initiative_embed(user_id: int) -> discord.Embed:
+#Orders are kept per guild channel, set to False to share one order across all of a guild's channels
+CHANNEL_SCOPED_ORDERS: bool = True
+
+#Scope of orders used outside of guilds, holding every order created before orders were scoped to guild channels
+LEGACY_SCOPE: dict = {"guild_id": 0, "channel_id": 0}
+
+async def get_order_scope(interaction: discord.Interaction) -> dict:
+    """
+    Returns the scope of the initiative order an interaction applies to. Commands used in a guild apply to
+    that guild channel's order, direct messages apply to the order of the channel /initiative private was
+    last used in, or to the user's personal order otherwise. The /initiative private binding is stored in
+    the database, as direct messages and guild commands may be handled by different bot processes.
+
+    :return: dict of guild_id and channel_id keyword arguments for the orderDB functions
+    """
+    if interaction.guild_id == None:
+        guild_id, channel_id = await asyncDB.run(usersDB.get_private_scope, interaction.user.id)
+    else:
+        guild_id = interaction.guild_id
+        channel_id = interaction.channel_id if CHANNEL_SCOPED_ORDERS else 0
+    return {"guild_id": guild_id, "channel_id": channel_id}
+
+async def get_initiative_embed(user_id: int, scope: dict) -> discord.Embed:
     """
     Formats and returns a discord Embed containing a target users initiative 
-    order roles
+    order roles, marking the character whose turn it is where the order is in combat
 
     :param user_id: The target user's discord user id
+    :param scope: Order scope returned by get_order_scope
     :return discord.Embed: A formatted Embed object
     """
-    embed = discord.Embed(color=discord.Color.dark_green(), title="Initiative Order")
-    items = orderDB.get_initiative_order(user_id)
+    items = await asyncDB.run(orderDB.get_initiative_order, user_id, **scope)
+    turn = await asyncDB.run(encounterDB.get_turn, user_id, **scope)
+    title = "Initiative Order" if turn == None else f"Initiative Order - Round {turn[0]}"
+    embed = discord.Embed(color=discord.Color.dark_green(), title=title)
     index = 1
     for item in items:
         r = item[1]
         m = item[2]
-        embed.add_field(name=f"{index}. {item[0]}", value=f"{r+m} ({r} + {m})", inline=False)
+        marker = "▶ " if turn != None and turn[1] == index - 1 else ""
+        embed.add_field(name=f"{marker}{index}. {item[0]}", value=f"{r+m} ({r} + {m})", inline=False)
         index = index + 1
     return embed
 
 class initiative(app_commands.Group):
+    def __init__(self, trackers: LiveTrackers, **kwargs) -> None:
+        """
+        :param trackers: Live tracker messages edited as orders change
+        """
+        super().__init__(**kwargs)
+        self.trackers = trackers
+
+    async def send_order_update(self, interaction: discord.Interaction, user_id: int, scope: dict, show: bool, msg: str):
+        """
+        Answers a command that changed an order and schedules an edit of the order's live tracker. The order's
+        embed is sent where show is True and the order has no live tracker, msg otherwise.
+        """
+        self.trackers.touch(user_id, scope)
+        if show and await self.trackers.get_message(user_id, scope) is None:
+            embed = await get_initiative_embed(user_id, scope)
+            await interaction.response.send_message(embed=embed)
+        else:
+            await interaction.response.send_message(content=msg)
+
     @app_commands.command()
     async def private(self, interaction: discord.Interaction):
         """Direct message the user for private order entry"""
         try:
-            msg = "Use `/interaction [add, remove, or clear]` to manage you initiative order!\n"
-            msg = msg + "Use `/interaction show` to share your initiative order back in the target channel."
+            #Direct message commands apply to this channel's order until /initiative private is used elsewhere
+            if interaction.guild_id != None:
+                scope = await get_order_scope(interaction)
+                await asyncDB.run(usersDB.set_private_scope, interaction.user.id, scope["guild_id"], scope["channel_id"])
+
+            msg = "Use `/initiative [add, remove, or clear]` to manage you initiative order!\n"
+            msg = msg + "Use `/initiative show` to share your initiative order back in the target channel."
             await interaction.user.send(msg)
             await interaction.response.send_message("I DM'd you!")
         except Exception as e:
@@ -41,19 +92,83 @@ class initiative(app_commands.Group):
     async def show(self, interaction: discord.Interaction):
         """Display current initiative order"""
         try:
-            embed = get_initiative_embed(interaction.user.id)
+            user_id: int = interaction.user.id
+            scope: dict = await get_order_scope(interaction)
+
+            #Point to the live tracker instead of posting the order again
+            tracker = await asyncDB.run(trackerDB.get_tracker, user_id, **scope)
+            if tracker is not None:
+                guild_id, channel_id, message_id = tracker
+                url = f"https://discord.com/channels/{guild_id or '@me'}/{channel_id}/{message_id}"
+                await interaction.response.send_message(f"Live tracker: {url}", ephemeral=True)
+                return
+
+            embed = await get_initiative_embed(user_id, scope)
+            #Point users with an order from before orders were scoped to channels to /initiative claim
+            if not embed.fields and scope != LEGACY_SCOPE and await asyncDB.run(orderDB.get_initiative_order, user_id, **LEGACY_SCOPE):
+                embed.set_footer(text="Your initiative order from before orders were kept per channel is still available, use /initiative claim to move it here")
             await interaction.response.send_message(embed=embed)
         except Exception as e:
             await interaction.response.send_message("Something went wrong")
             print(e)
+
+    @app_commands.command()
+    async def track(self, interaction: discord.Interaction):
+        """Post a pinned initiative order message that updates as the order changes"""
+        try:
+            user_id: int = interaction.user.id
+            scope: dict = await get_order_scope(interaction)
+
+            embed = await get_initiative_embed(user_id, scope)
+            await interaction.response.send_message(embed=embed)
+            message: discord.Message = await interaction.original_response()
+            previous = await asyncDB.run(trackerDB.set_tracker, user_id, interaction.guild_id or 0, message.channel.id, message.id, **scope)
+            self.trackers.mark_rendered(user_id, scope)
+
+            #Pinning needs the Manage Messages permission, the tracker is still edited without it
+            try:
+                await message.pin()
+                if previous is not None:
+                    await partial_message(interaction.client, *previous).unpin()
+            except discord.HTTPException:
+                pass
+        except Exception as e:
+            if not interaction.response.is_done():
+                await interaction.response.send_message("Something went wrong")
+            print(e)
     
     @app_commands.command()
     async def clear(self, interaction: discord.Interaction):
         """Empty the initiative order"""
-        user_id: int = interaction.user.id
-        orderDB.clear_user_order(user_id)
-        DBHelper.vacuum()
-        await interaction.response.send_message(content="Initiative order cleared!")
+        try:
+            user_id: int = interaction.user.id
+            scope: dict = await get_order_scope(interaction)
+            await asyncDB.run(orderDB.clear_user_order, user_id, **scope)
+            await self.send_order_update(interaction, user_id, scope, False, "Initiative order cleared!")
+        except Exception as e:
+            await interaction.response.send_message("Something went wrong")
+            print(e)
+
+    @app_commands.command()
+    async def claim(self, interaction: discord.Interaction):
+        """Move your initiative order from before orders were kept per channel to this channel"""
+        try:
+            user_id: int = interaction.user.id
+            scope: dict = await get_order_scope(interaction)
+
+            if scope == LEGACY_SCOPE:
+                await interaction.response.send_message("Use `/initiative claim` in the channel the order should move to")
+                return
+
+            moved: int = await asyncDB.run(orderDB.claim_legacy_order, user_id, **scope)
+            if moved == 0:
+                await interaction.response.send_message("You have no initiative order from before orders were kept per channel")
+                return
+            self.trackers.touch(user_id, LEGACY_SCOPE)
+            await self.send_order_update(interaction, user_id, scope, False, f"{moved} characters moved to this channel's initiative order!")
+        except Exception as e:
+            await interaction.response.send_message("Something went wrong")
+            print(e)
 
     @app_commands.command()
     @app_commands.describe(
@@ -64,29 +179,54 @@ class initiative(app_commands.Group):
         )
     async def add(self, interaction: discord.Interaction, char_name: str, modifier: int = 0, roll_value: int = None, show: bool = False):
         """Add a character to the initiative order"""
-        user_id = interaction.user.id
-
         try:
-            usersDB.verify_or_add_user(user_id)
+            user_id = interaction.user.id
+            scope: dict = await get_order_scope(interaction)
 
             #Generate a D20 roll where roll isn't specified
             if roll_value == None:
                 die: Die = Die(20)
                 roll_value = die.roll()
 
-            orderDB.add_order_command(user_id, char_name, roll_value, modifier)
+            await asyncDB.run(orderDB.add_order_command, user_id, char_name, roll_value, modifier, **scope)
 
             #Show the initiative embed after adding if show is True
-            if show:
-                embed = get_initiative_embed(user_id)
-                await interaction.response.send_message(embed=embed)
-            else:
-                msg = f"{char_name} added: roll({roll_value}), modifier({modifier}), initiative({roll_value+modifier})"
-                await interaction.response.send_message(content=msg)
+            msg = f"{char_name} added: roll({roll_value}), modifier({modifier}), initiative({roll_value+modifier})"
+            await self.send_order_update(interaction, user_id, scope, show, msg)
         except Exception as e:
             await interaction.response.send_message("Something went wrong")
             print(e)
     
+    @app_commands.command()
+    @app_commands.describe(
+        characters = "Characters to add, i.e. 'Goblin x6 +2, Ogre +0, Wizard -1 =17' (=17 sets the roll value)",
+        show = "Show the initiative order after adding"
+        )
+    async def add_many(self, interaction: discord.Interaction, characters: str, show: bool = False):
+        """Add several characters to the initiative order at once"""
+        try:
+            user_id = interaction.user.id
+            scope: dict = await get_order_scope(interaction)
+
+            party: list = parse_party(characters)
+
+            #Generate every missing D20 roll in one batch
+            missing: int = sum(1 for name, modifier, roll_value in party if roll_value == None)
+            rolls = iter(Die(20).roll_many(missing)) if missing else iter(())
+            rows = [(name, roll_value if roll_value != None else next(rolls), modifier) for name, modifier, roll_value in party]
+
+            await asyncDB.run(orderDB.add_many_order_commands, user_id, rows, **scope)
+
+            #Show the initiative embed after adding if show is True
+            added = ", ".join(f"{name} ({roll_value + modifier})" for name, roll_value, modifier in rows)
+            msg = f"{len(rows)} characters added: {added}"
+            await self.send_order_update(interaction, user_id, scope, show, msg if len(msg) <= 2000 else msg[:1997] + "...")
+        except PartyListError as error:
+            await interaction.response.send_message(error)
+        except Exception as e:
+            await interaction.response.send_message("Something went wrong")
+            print(e)
+
     @app_commands.command()
     @app_commands.describe(
         char_name = "Character name",
@@ -94,18 +234,13 @@ class initiative(app_commands.Group):
         )
     async def remove(self, interaction: discord.Interaction, char_name: str, show: bool = False):
         """Remove a character from the initiative order"""
-        user_id = interaction.user.id
-
         try:
-            usersDB.verify_or_add_user(user_id)
+            user_id = interaction.user.id
+            scope: dict = await get_order_scope(interaction)
 
-            if orderDB.remove_one_order(user_id, char_name):
+            if await asyncDB.run(orderDB.remove_one_order, user_id, char_name, **scope):
                 #Show the initiative embed after removing if show is True
-                if show:
-                    embed = get_initiative_embed(user_id)
-                    await interaction.response.send_message(embed=embed)
-                else:
-                    await interaction.response.send_message(f"{char_name} removed!")
+                await self.send_order_update(interaction, user_id, scope, show, f"{char_name} removed!")
             else:
                 await interaction.response.send_message(f"{char_name} does not exist")
         except Exception as e:
@@ -123,33 +258,115 @@ class initiative(app_commands.Group):
     )
     async def update(self, interaction: discord.Interaction, char_name: str, change_name:str = None, roll_value: int = None, auto_roll:bool = False, modifier: int = None, show: bool = False):
         """Update a character's data"""
-        user_id = interaction.user.id
-
         try:
-            usersDB.verify_or_add_user(user_id)
-            char_id = orderDB.get_character_id(user_id, char_name)
-
-            if (char_id != None):
-                if(auto_roll):
-                    die:Die = Die(20)
-                    roll_value = die.roll()
-                if orderDB.update_character_by_id(char_id, change_name, roll_value, modifier):
-                    if(show):
-                        embed = get_initiative_embed(user_id)
-                        await interaction.response.send_message(embed=embed)
-                    else:
-                        data = orderDB.get_character_by_id(char_id)
-                        await interaction.response.send_message(f"Updated: name ({data[0]}), roll ({data[1]}), and modifier ({data[2]})")
-                else:
-                    await interaction.response.send_message(f"You must enter at least one optional value to edit {char_name}!")
+            user_id = interaction.user.id
+            scope: dict = await get_order_scope(interaction)
+
+            if change_name == None and roll_value == None and modifier == None and not auto_roll:
+                await interaction.response.send_message(f"You must enter at least one optional value to edit {char_name}!")
+                return
+
+            if(auto_roll):
+                die:Die = Die(20)
+                roll_value = die.roll()
+
+            data = await asyncDB.run(orderDB.update_character, user_id, char_name, change_name, roll_value, modifier, **scope)
+            if data != None:
+                msg = f"Updated: name ({data[0]}), roll ({data[1]}), and modifier ({data[2]})"
+                await self.send_order_update(interaction, user_id, scope, show, msg)
             else:
                 await interaction.response.send_message(f"{char_name} does not exist")
         except Exception as e:
             await interaction.response.send_message(f"Something went wrong")
             print(e)
         
+    @app_commands.command()
+    @app_commands.describe(show = "Show the initiative order after passing the turn")
+    async def next(self, interaction: discord.Interaction, show: bool = False):
+        """Pass the turn to the next character, starting combat if it has not started"""
+        try:
+            user_id = interaction.user.id
+            scope: dict = await get_order_scope(interaction)
+
+            turn = await asyncDB.run(encounterDB.next_turn, user_id, **scope)
+            if turn == None:
+                await interaction.response.send_message("The initiative order is empty")
+                return
+            await self.send_order_update(interaction, user_id, scope, show, f"Round {turn[0]}: {turn[2]}'s turn!")
+        except Exception as e:
+            await interaction.response.send_message("Something went wrong")
+            print(e)
+
+    @app_commands.command()
+    @app_commands.describe(show = "Show the initiative order after returning the turn")
+    async def prev(self, interaction: discord.Interaction, show: bool = False):
+        """Return the turn to the previous character"""
+        try:
+            user_id = interaction.user.id
+            scope: dict = await get_order_scope(interaction)
+
+            turn = await asyncDB.run(encounterDB.previous_turn, user_id, **scope)
+            if turn == None:
+                await interaction.response.send_message("The initiative order is not in combat, use `/initiative next` to start")
+                return
+            await self.send_order_update(interaction, user_id, scope, show, f"Round {turn[0]}: {turn[2]}'s turn!")
+        except Exception as e:
+            await interaction.response.send_message("Something went wrong")
+            print(e)
+
+    @app_commands.command()
+    @app_commands.describe(
+        char_name = "Character delaying (the character whose turn it is by default)",
+        after = "Character to act after (the next character by default)",
+        show = "Show the initiative order after delaying"
+        )
+    async def delay(self, interaction: discord.Interaction, char_name: str = None, after: str = None, show: bool = False):
+        """Delay a character's turn until after another character"""
+        try:
+            user_id = interaction.user.id
+            scope: dict = await get_order_scope(interaction)
+
+            turn = await asyncDB.run(encounterDB.delay_turn, user_id, char_name, after, **scope)
+            await self.send_order_update(interaction, user_id, scope, show, f"Turn delayed! Round {turn[0]}: {turn[2]}'s turn!")
+        except ValueError as error:
+            await interaction.response.send_message(error)
+        except Exception as e:
+            await interaction.response.send_message("Something went wrong")
+            print(e)
+
+    @app_commands.command()
+    @app_commands.describe(end = "End combat, keeping the initiative order")
+    async def round(self, interaction: discord.Interaction, end: bool = False):
+        """Display the current round and turn"""
+        try:
+            user_id = interaction.user.id
+            scope: dict = await get_order_scope(interaction)
+
+            if end:
+                if await asyncDB.run(encounterDB.end_encounter, user_id, **scope):
+                    await self.send_order_update(interaction, user_id, scope, False, "Combat ended!")
+                else:
+                    await interaction.response.send_message("The initiative order is not in combat")
+                return
+
+            turn = await asyncDB.run(encounterDB.get_turn, user_id, **scope)
+            if turn == None:
+                await interaction.response.send_message("The initiative order is not in combat, use `/initiative next` to start")
+            else:
+                await interaction.response.send_message(f"Round {turn[0]}: {turn[2]}'s turn!")
+        except Exception as e:
+            await interaction.response.send_message("Something went wrong")
+            print(e)
+
 async def setup(bot: commands.Bot):
     cmd_name = "initiative"
     cmd_description = "Initiative order commands"
-    bot.tree.add_command(initiative(name=cmd_name, description=cmd_description))
-    print(f"Command extension: {cmd_name} added")
\ No newline at end of file
+    trackers = LiveTrackers(bot, get_initiative_embed)
+    await trackers.load()
+    bot.tree.add_command(initiative(trackers, name=cmd_name, description=cmd_description))
+    print(f"Command extension: {cmd_name} added")
+
+async def teardown(bot: commands.Bot):
+    group = bot.tree.get_command("initiative")
+    if isinstance(group, initiative):
+        group.trackers.cancel()
\ No newline at end of file
@@ -0,0 +1,152 @@
+"""
+Live tracker messages: a pinned initiative order embed per order, edited in place as the order changes.
+
+Every mutation of an order bumps the order's version. Edits are debounced per order: the first mutation after
+a quiet period is shown immediately, later mutations within TRACKER_EDIT_WINDOW_SECONDS of the last edit are
+coalesced into one edit at the end of the window, and the embed is only re-rendered where the version changed
+since the last edit.
+
+The scopes of orders with a tracker are held in memory, loaded at startup and added to by /initiative track, so
+mutations of the other orders cost no database lookup. Trackers posted by another process of a cluster since this
+one started are not known to it and are only edited by mutations handled by that process.
+"""
+import asyncio
+import os
+
+import discord
+
+from DBHelper import SHARD_COUNT, trackerDB, asyncDB
+
+#Minimum time between two edits of the same tracker message
+TRACKER_EDIT_WINDOW_SECONDS: float = float(os.getenv("DungeonBotTrackerEditWindow", "2"))
+
+def partial_message(client: discord.Client, guild_id: int, channel_id: int, message_id: int) -> discord.PartialMessage:
+    """Returns a message by id without fetching it, guild_id 0 for a direct message"""
+    return client.get_partial_messageable(channel_id, guild_id=guild_id or None).get_partial_message(message_id)
+
+class LiveTrackers():
+    def __init__(self, client: discord.Client, render, window: float = TRACKER_EDIT_WINDOW_SECONDS) -> None:
+        """
+        Keeps the live tracker messages of initiative orders up to date
+
+        :param client: Client used to edit tracker messages
+        :param render: Coroutine function returning the embed of an order, called as render(user_id, scope)
+        :param window: Minimum time in seconds between two edits of the same tracker message
+        """
+        self.client = client
+        self.render = render
+        self.window = window
+        self.edits: int = 0
+        self.__versions: dict = {}
+        self.__rendered: dict = {}
+        self.__last_edit: dict = {}
+        self.__pending: dict = {}
+        self.__tracked: set = set()
+
+    @staticmethod
+    def _key(user_id: int, scope: dict) -> tuple:
+        return (user_id, scope["guild_id"], scope["channel_id"])
+
+    async def load(self):
+        """Loads the scopes of every order with a tracker message, i.e. at extension setup"""
+        for shard in range(SHARD_COUNT):
+            self.__tracked.update(await asyncDB.run(trackerDB.get_tracked_scopes, shard=shard))
+
+    def touch(self, user_id: int, scope: dict):
+        """
+        Records a committed mutation of an order and schedules an edit of its tracker message, if it has one
+
+        :param user_id: Owner of the order
+        :param scope: Order scope returned by get_order_scope
+        """
+        key: tuple = self._key(user_id, scope)
+        if key not in self.__tracked:
+            return
+        self.__versions[key] = self.__versions.get(key, 0) + 1
+        self.__schedule(key)
+
+    def mark_rendered(self, user_id: int, scope: dict):
+        """
+        Records a newly posted tracker message as showing the order's current version
+
+        :param user_id: Owner of the order
+        :param scope: Order scope returned by get_order_scope
+        """
+        key: tuple = self._key(user_id, scope)
+        self.__tracked.add(key)
+        self.__versions.setdefault(key, 0)
+        self.__rendered[key] = self.__versions[key]
+        self.__last_edit[key] = asyncio.get_running_loop().time()
+
+    async def get_message(self, user_id: int, scope: dict) -> discord.PartialMessage:
+        """
+        Returns an order's tracker message
+
+        :return: discord.PartialMessage or None if the order has no tracker
+        """
+        tracker = await asyncDB.run(trackerDB.get_tracker, user_id, **scope)
+        if tracker is None:
+            return None
+        return partial_message(self.client, *tracker)
+
+    def cancel(self):
+        """Cancels every scheduled edit, i.e. when the extension is unloaded"""
+        for task in self.__pending.values():
+            task.cancel()
+        self.__pending.clear()
+
+    def __schedule(self, key: tuple):
+        if key in self.__pending:
+            return
+        loop = asyncio.get_running_loop()
+        last_edit: float = self.__last_edit.get(key)
+        delay: float = 0.0 if last_edit is None else max(0.0, last_edit + self.window - loop.time())
+        self.__pending[key] = asyncio.create_task(self.__flush(key, delay))
+
+    def __forget(self, key: tuple):
+        """Drops the state of an order without a tracker message"""
+        self.__tracked.discard(key)
+        self.__versions.pop(key, None)
+        self.__rendered.pop(key, None)
+        self.__last_edit.pop(key, None)
+
+    async def __flush(self, key: tuple, delay: float):
+        """Edits an order's tracker message once the window allows it, where the order changed since the last edit"""
+        tracked: bool = False
+        try:
+            await asyncio.sleep(delay)
+            version: int = self.__versions.get(key, 0)
+            if version == self.__rendered.get(key):
+                tracked = True
+                return
+
+            user_id, guild_id, channel_id = key
+            scope: dict = {"guild_id": guild_id, "channel_id": channel_id}
+            message = await self.get_message(user_id, scope)
+            if message is None:
+                return
+            try:
+                await message.edit(embed=await self.render(user_id, scope))
+            except discord.NotFound:
+                #The tracker message was deleted, stop tracking the order
+                await asyncDB.run(trackerDB.remove_tracker, user_id, message.id, **scope)
+                return
+
+            tracked = True
+            self.edits += 1
+            self.__rendered[key] = version
+            self.__last_edit[key] = asyncio.get_running_loop().time()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            #Retry once the window passed, i.e. after a rate limit or a transient error
+            tracked = True
+            self.__last_edit[key] = asyncio.get_running_loop().time()
+            print(e)
+        finally:
+            self.__pending.pop(key, None)
+            if not tracked:
+                self.__forget(key)
+            elif key in self.__versions and self.__versions[key] != self.__rendered.get(key):
+                #Mutations made while this edit was in flight get one more edit after the window
+                self.__schedule(key)
@@ -0,0 +1,70 @@
+"""
+Parser for party lists used to add several characters to the initiative order at once, i.e.
+'Goblin x6 +2, Ogre +0, Wizard -1 =17'
+
+Entries are separated by commas, semicolons or new lines:
+Name: character name
+xN: add N copies named 'Name 1' to 'Name N' (optional)
++M / -M: initiative modifier (optional, 0 by default)
+=R: roll value (optional, rolled with a D20 otherwise)
+"""
+import re
+
+#Maximum number of characters added by a single party list
+MAX_PARTY_SIZE: int = 50
+
+_ENTRY_PATTERN = re.compile(r"""
+    ^(?P<name>.+?)
+    (?:\s+[xX](?P<count>\d+))?
+    (?:\s*(?P<modifier>[+-]\s*\d+))?
+    (?:\s*=\s*(?P<roll>\d+))?$
+""", re.VERBOSE)
+
+_SEPARATOR_PATTERN = re.compile(r"[,;\n]")
+
+class PartyListError(ValueError):
+    def __init__(self, msg="Invalid party list") -> None:
+        """
+        Error class raised when a party list cannot be parsed or exceeds MAX_PARTY_SIZE characters.
+
+        :inherit ValueError:
+        """
+        self.msg = msg
+        super().__init__(self.msg)
+
+def parse_party(text: str) -> list:
+    """
+    Parses a party list into individual characters
+
+    :param text: Party list, i.e. 'Goblin x6 +2, Ogre +0'
+    :raise PartyListError: Raised where an entry is malformed or the list exceeds MAX_PARTY_SIZE characters
+    :return: list of (character name, modifier, roll value or None) tuples
+    """
+    characters: list = []
+
+    for entry in _SEPARATOR_PATTERN.split(text):
+        entry = entry.strip()
+        if entry == "":
+            continue
+
+        match = _ENTRY_PATTERN.match(entry)
+        if match is None:
+            raise PartyListError(f"I couldn't read '{entry}', use the format 'Goblin x6 +2'")
+
+        name: str = match.group("name").strip()
+        count: int = int(match.group("count") or 1)
+        modifier: int = int(match.group("modifier").replace(" ", "")) if match.group("modifier") else 0
+        roll: int = int(match.group("roll")) if match.group("roll") else None
+        if count < 1:
+            raise PartyListError(f"'{entry}' must add at least one character")
+        if len(characters) + count > MAX_PARTY_SIZE:
+            raise PartyListError(f"I can only add up to {MAX_PARTY_SIZE} characters at once")
+
+        if count == 1:
+            characters.append((name, modifier, roll))
+        else:
+            characters.extend((f"{name} {number}", modifier, roll) for number in range(1, count + 1))
+
+    if not characters:
+        raise PartyListError("Enter at least one character, i.e. 'Goblin x6 +2, Ogre +0'")
+    return characters
@@ -3,23 +3,34 @@ from discord.ext import commands
 from discord import app_commands
 
 from io import BytesIO
-from DungeonBot.cogs.RNG.dieImage import rollImage, Die, ACCEPTED_DIE_TYPES
+from DungeonBot.cogs.RNG.dieImage import warm_roll_image_cache, get_encoding_profile, Die, ACCEPTED_DIE_TYPES, DIE_ASSETS, MAX_IMAGE_ROLLS
+from DungeonBot.cogs.RNG.renderPool import RENDER_POOL
+from DungeonBot.cogs.RNG.diceExpression import roll_expression, DiceExpressionError
+from DungeonBot.cogs.RNG.diceDistribution import expression_distribution
+
+#Maximum number of individual die values listed per term in /rng expr
+EXPRESSION_VALUES_SHOWN: int = 20
+
+#Pre-render every single die roll image when the extension is loaded
+WARM_ROLL_IMAGE_CACHE: bool = True
 
 class RNG(app_commands.Group):
     @app_commands.command()
     @app_commands.describe(
-        amount = "Number of die to roll (1 to 5)",
+        amount = f"Number of die to roll (1 to {MAX_IMAGE_ROLLS})",
         die_type = f"Type of die to roll {ACCEPTED_DIE_TYPES}"
     )
     async def roll(self, interaction: discord.Interaction, die_type: int, amount: int = 1 ):
-        """Roll an existing die up to five times"""
+        """Roll an existing die up to 100 times"""
+        #Closed in finally, which also runs where validation fails before either is created
+        image_byte_array: BytesIO = None
+        discord_image_file: discord.File = None
         try:
-            filename:str = "rollImage.png"
+            filename:str = f"rollImage.{get_encoding_profile().extension}"
 
             #Generates die image as a Byte array and the total roll value
-            image_byte_array: BytesIO
             total_roll_value: int
-            image_byte_array, total_roll_value = rollImage(die_max_face=die_type, amount_of_rolls=amount)
+            image_byte_array, total_roll_value = await RENDER_POOL.roll_image(die_max_face=die_type, amount_of_rolls=amount)
             image_byte_array.seek(0)
            
             #Creates embed and sets author header and roll field
@@ -39,8 +50,10 @@ class RNG(app_commands.Group):
         except (OSError):
             await interaction.response.send_message(f'Sorry, something went wrong...')
         finally:
-            image_byte_array.close()
-            discord_image_file.close()
+            if image_byte_array is not None:
+                image_byte_array.close()
+            if discord_image_file is not None:
+                discord_image_file.close()
     
     @app_commands.command()
     @app_commands.describe(
@@ -59,10 +72,7 @@ class RNG(app_commands.Group):
             
             die: Die = Die(head)
             embed = discord.Embed(title="Random values", color=discord.Color.dark_green())
-            msg = ""
-
-            for i in range(1, amount + 1):
-                msg = msg + f"**{i}.** {die.roll()}\n"
+            msg = "\n".join(f"**{i}.** {value}" for i, value in enumerate(die.roll_many(amount), start=1))
             embed.add_field(name=f"Values:", value=msg,inline=False)
             
             await interaction.response.send_message(embed=embed)
@@ -70,8 +80,80 @@ class RNG(app_commands.Group):
             interaction.response.send_message("Something went wrong")
             print(e)
 
+    @app_commands.command()
+    @app_commands.describe(
+        expression = "Dice expression, i.e. 8d6+3, 4d6kh3, 2d20kl1 or 100d10"
+    )
+    async def expr(self, interaction: discord.Interaction, expression: str):
+        """Roll a dice expression"""
+        try:
+            parsed, total, results = roll_expression(expression)
+
+            embed = discord.Embed(color=discord.Color.dark_green())
+            embed.set_author(name=interaction.user.display_name, icon_url=interaction.user.display_avatar.url)
+            embed.add_field(name=f"Roll: {parsed}", value=f"**Total: {total}**", inline=False)
+
+            #List the rolled values of each dice term, up to the first 25 terms (Discord's field limit)
+            for term, values, subtotal in results[:24]:
+                if values is None:
+                    continue
+                shown = ", ".join(str(value) for value in values[:EXPRESSION_VALUES_SHOWN].tolist())
+                if len(values) > EXPRESSION_VALUES_SHOWN:
+                    shown = shown + f", ... ({len(values)} dice)"
+                embed.add_field(name=f"{'-' if term.sign < 0 else ''}{term}: {abs(subtotal)}", value=shown, inline=False)
+
+            await interaction.response.send_message(embed=embed)
+        except DiceExpressionError as error:
+            await interaction.response.send_message(error)
+        except Exception as e:
+            await interaction.response.send_message("Something went wrong")
+            print(e)
+
+    @app_commands.command()
+    @app_commands.describe(
+        expression = "Dice expression, i.e. 3d8+2 or 2d20kh1",
+        target = "Total to compare against",
+        comparison = "Chance of rolling at least, at most or exactly the target (at least by default)"
+    )
+    @app_commands.choices(comparison=[
+        app_commands.Choice(name="at least", value="at least"),
+        app_commands.Choice(name="at most", value="at most"),
+        app_commands.Choice(name="exactly", value="exactly")
+    ])
+    async def odds(self, interaction: discord.Interaction, expression: str, target: int, comparison: str = "at least"):
+        """Calculate the exact odds of a dice expression's total"""
+        try:
+            distribution = expression_distribution(expression)
+            if comparison == "at most":
+                probability = distribution.at_most(target)
+            elif comparison == "exactly":
+                probability = distribution.exactly(target)
+            else:
+                probability = distribution.at_least(target)
+
+            embed = discord.Embed(color=discord.Color.dark_green())
+            embed.add_field(name=f"Odds: {expression.strip()} {comparison} {target}", value=f"**{probability * 100:.4g}%**", inline=False)
+            embed.add_field(name="Range", value=f"{distribution.minimum} to {distribution.maximum}", inline=True)
+            embed.add_field(name="Average", value=f"{distribution.mean():.2f}", inline=True)
+
+            await interaction.response.send_message(embed=embed)
+        except DiceExpressionError as error:
+            await interaction.response.send_message(error)
+        except Exception as e:
+            await interaction.response.send_message("Something went wrong")
+            print(e)
+
 async def setup(bot: commands.Bot):
+    #Decode and validate every die asset so a missing asset fails at startup rather than mid-roll
+    DIE_ASSETS.load()
+    if WARM_ROLL_IMAGE_CACHE:
+        warm_roll_image_cache()
+    RENDER_POOL.start()
+
     cmd_name = "rng"
     cmd_description = "Random number generation commands"
     bot.tree.add_command(RNG(name=cmd_name, description=cmd_description))
-    print(f"Command extension: {cmd_name} added")
\ No newline at end of file
+    print(f"Command extension: {cmd_name} added")
+
+async def teardown(bot: commands.Bot):
+    RENDER_POOL.shutdown()
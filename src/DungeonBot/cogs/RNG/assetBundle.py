@@ -0,0 +1,92 @@
+"""
+Packed die face bundle: every die face stored as uncompressed RGBA pixels in one file, so the assets are loaded
+with a single mmap instead of opening and decoding each PNG. Faces are read in place from the mapping, which
+processes loading the same bundle share through the page cache.
+
+File layout, little endian:
+    header: magic (8 bytes), face width (uint32), face height (uint32), number of die types (uint32)
+    index: one (die type (uint32), number of faces (uint32), offset (uint64)) entry per die type
+    data: the faces of each die type in order, face n at offset + (n - 1) * width * height * 4, every
+          die type's block starting at a BUNDLE_ALIGNMENT aligned offset
+
+Build the bundle from the src/ directory after changing the PNG assets:
+
+python3 -m DungeonBot.cogs.RNG.buildAssetBundle
+"""
+import mmap
+import os
+import struct
+
+import numpy as np
+
+#Bundle built from the PNG assets, empty to always decode the PNGs
+ASSET_BUNDLE_PATH: str = os.getenv("DungeonBotAssetBundle", "./Assets/dieFaces.bundle")
+
+BUNDLE_MAGIC: bytes = b"DBDIE\x00\x00\x01"
+BUNDLE_ALIGNMENT: int = 4096
+
+_HEADER = struct.Struct("<8sIII")
+_ENTRY = struct.Struct("<IIQ")
+
+def write_bundle(arrays: dict, path: str = ASSET_BUNDLE_PATH):
+    """
+    Writes a bundle, replacing the file atomically
+
+    :param arrays: dict of die type to uint8 array of shape (faces, height, width, 4), face n at index n - 1
+    :param path: Bundle file path
+    :raise ValueError: Raised where the arrays do not share one face size
+    """
+    shapes: set = {array.shape[1:] for array in arrays.values()}
+    if len(shapes) != 1 or next(iter(shapes))[2] != 4:
+        raise ValueError(f"Die faces must share one RGBA size, got {shapes}")
+    height, width, channels = shapes.pop()
+
+    offset: int = _HEADER.size + _ENTRY.size * len(arrays)
+    index: list = []
+    for die_type, array in arrays.items():
+        offset = -(-offset // BUNDLE_ALIGNMENT) * BUNDLE_ALIGNMENT
+        index.append((die_type, array.shape[0], offset))
+        offset += array.nbytes
+
+    temporary: str = f"{path}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(_HEADER.pack(BUNDLE_MAGIC, width, height, len(arrays)))
+        for entry in index:
+            file.write(_ENTRY.pack(*entry))
+        for (die_type, faces, offset), array in zip(index, arrays.values()):
+            file.seek(offset)
+            file.write(np.ascontiguousarray(array, dtype=np.uint8).tobytes())
+    os.replace(temporary, path)
+
+def read_bundle(path: str = ASSET_BUNDLE_PATH) -> tuple:
+    """
+    Memory maps a bundle. The returned arrays are read only views of the mapping, which stays open as long as
+    any of them is referenced.
+
+    :param path: Bundle file path
+    :raise OSError: Raised where the bundle cannot be opened
+    :raise ValueError: Raised where the file is not a bundle or is truncated
+    :return: tuple[size 3] of (face width, face height, dict of die type to uint8 array of shape (faces, height, width, 4))
+    """
+    with open(path, "rb") as file:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    try:
+        if len(mapping) < _HEADER.size:
+            raise ValueError(f"{path} is not a die face bundle")
+        magic, width, height, count = _HEADER.unpack_from(mapping, 0)
+        if magic != BUNDLE_MAGIC or len(mapping) < _HEADER.size + count * _ENTRY.size:
+            raise ValueError(f"{path} is not a die face bundle")
+        face_bytes: int = width * height * 4
+        index: list = [_ENTRY.unpack_from(mapping, _HEADER.size + position * _ENTRY.size) for position in range(count)]
+        if any(offset + faces * face_bytes > len(mapping) for die_type, faces, offset in index):
+            raise ValueError(f"{path} is truncated")
+    except BaseException:
+        mapping.close()
+        raise
+
+    arrays: dict = {}
+    for die_type, faces, offset in index:
+        array = np.frombuffer(mapping, dtype=np.uint8, count=faces * face_bytes, offset=offset)
+        arrays[die_type] = array.reshape(faces, height, width, 4)
+    return (width, height, arrays)
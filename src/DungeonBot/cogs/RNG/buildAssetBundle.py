@@ -0,0 +1,22 @@
+"""
+Packs the PNG die assets into the die face bundle loaded by DieAssetRegistry, see DungeonBot.cogs.RNG.assetBundle.
+Run from the src/ directory after changing the assets:
+
+python3 -m DungeonBot.cogs.RNG.buildAssetBundle [--output PATH]
+"""
+import argparse
+import os
+
+from DungeonBot.cogs.RNG.assetBundle import ASSET_BUNDLE_PATH
+from DungeonBot.cogs.RNG.dieImage import DieAssetRegistry
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default=ASSET_BUNDLE_PATH, help="Bundle file to write")
+    arguments = parser.parse_args()
+
+    registry = DieAssetRegistry()
+    registry.load(use_bundle=False)
+    registry.write_bundle(arguments.output)
+    registry.close()
+    print(f"Die face bundle written to {arguments.output} ({os.path.getsize(arguments.output)} bytes)")
@@ -0,0 +1,154 @@
+"""
+Exact probability distributions for dice expressions. The distribution of N identical dice is built by
+convolving the memoized distributions of two smaller pools, so large pools reuse every pool computed
+before them and a few hundred dice take milliseconds.
+"""
+from functools import lru_cache
+from itertools import product
+
+import numpy as np
+
+from DungeonBot.cogs.RNG.diceExpression import DiceExpression, DiceTerm, DiceExpressionError, parse
+
+#Convolutions with more output points than this use FFT instead of direct convolution
+FFT_THRESHOLD: int = 4096
+
+#Keep/drop terms are enumerated exactly, which is limited to this many outcomes
+MAX_KEEP_OUTCOMES: int = 200000
+
+#Largest range of totals an expression distribution may cover
+MAX_DISTRIBUTION_POINTS: int = 1000000
+
+class Distribution():
+    def __init__(self, offset: int, pmf: np.ndarray) -> None:
+        """
+        Probability mass function over integer totals. pmf[i] is the probability of rolling offset + i.
+
+        :param offset: Smallest possible total
+        :param pmf: Probabilities of each total from offset upwards
+        """
+        self.offset = offset
+        self.pmf = pmf
+
+    @property
+    def minimum(self) -> int:
+        return self.offset
+
+    @property
+    def maximum(self) -> int:
+        return self.offset + len(self.pmf) - 1
+
+    def mean(self) -> float:
+        return float(np.dot(np.arange(self.offset, self.maximum + 1), self.pmf))
+
+    def exactly(self, total: int) -> float:
+        """Probability of rolling exactly total"""
+        if total < self.minimum or total > self.maximum:
+            return 0.0
+        return float(self.pmf[total - self.offset])
+
+    def at_least(self, total: int) -> float:
+        """Probability of rolling total or higher"""
+        index: int = max(0, total - self.offset)
+        return float(min(1.0, self.pmf[index:].sum()))
+
+    def at_most(self, total: int) -> float:
+        """Probability of rolling total or lower"""
+        index: int = total - self.offset + 1
+        if index <= 0:
+            return 0.0
+        return float(min(1.0, self.pmf[:index].sum()))
+
+    def cdf(self) -> np.ndarray:
+        """Cumulative probabilities, cdf[i] being the probability of rolling offset + i or lower"""
+        return np.cumsum(self.pmf)
+
+def convolve(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """
+    Convolves two probability mass functions, using FFT for large outputs
+
+    :return: pmf of the sum of the two independent distributions
+    """
+    size: int = len(first) + len(second) - 1
+    if size <= FFT_THRESHOLD or min(len(first), len(second)) < 32:
+        return np.convolve(first, second)
+
+    transform_size: int = 1 << (size - 1).bit_length()
+    result = np.fft.irfft(np.fft.rfft(first, transform_size) * np.fft.rfft(second, transform_size), transform_size)[:size]
+    #FFT round-off can leave tiny negative values
+    np.clip(result, 0.0, None, out=result)
+    return result / result.sum()
+
+@lru_cache(maxsize=1024)
+def dice_pmf(count: int, sides: int) -> np.ndarray:
+    """
+    Memoized pmf of the total of count dice with the given sides, over totals count to count * sides.
+    Built from the cached pmfs of count // 2 and count - count // 2 dice.
+
+    :return: Read only numpy array of length count * (sides - 1) + 1
+    """
+    if count == 1:
+        pmf = np.full(sides, 1.0 / sides)
+    else:
+        half: int = count // 2
+        pmf = convolve(dice_pmf(half, sides), dice_pmf(count - half, sides))
+    pmf.flags.writeable = False
+    return pmf
+
+@lru_cache(maxsize=256)
+def keep_pmf(count: int, sides: int, keep: str, keep_count: int) -> np.ndarray:
+    """
+    Memoized pmf of a keep highest/lowest term, i.e. 4d6kh3, found by enumerating every outcome
+
+    :raise DiceExpressionError: Raised when the term has more than MAX_KEEP_OUTCOMES outcomes
+    :return: Read only numpy array over totals keep_count to keep_count * sides
+    """
+    if sides ** count > MAX_KEEP_OUTCOMES:
+        raise DiceExpressionError(f"Exact odds for keep/drop rolls are limited to {MAX_KEEP_OUTCOMES} outcomes, {count}d{sides} has {sides ** count}")
+
+    outcomes = np.sort(np.array(list(product(range(1, sides + 1), repeat=count)), dtype=np.int64), axis=1)
+    kept = outcomes[:, count - keep_count:] if keep == "h" else outcomes[:, :keep_count]
+    totals = kept.sum(axis=1) - keep_count
+
+    pmf = np.bincount(totals, minlength=keep_count * (sides - 1) + 1) / len(outcomes)
+    pmf.flags.writeable = False
+    return pmf
+
+def term_distribution(term) -> Distribution:
+    """Returns the distribution of a single signed expression term"""
+    if not isinstance(term, DiceTerm):
+        return Distribution(term.sign * term.value, np.ones(1))
+
+    if term.keep is None or term.keep_count >= term.count:
+        pmf = dice_pmf(term.count, term.sides)
+        kept: int = term.count
+    else:
+        pmf = keep_pmf(term.count, term.sides, term.keep, term.keep_count)
+        kept = term.keep_count
+
+    if term.sign > 0:
+        return Distribution(kept, pmf)
+    return Distribution(-kept * term.sides, pmf[::-1])
+
+def expression_distribution(expression) -> Distribution:
+    """
+    Computes the exact distribution of a dice expression
+
+    :param expression: Expression text or a parsed DiceExpression
+    :raise DiceExpressionError: Raised where the expression is invalid, covers more than MAX_DISTRIBUTION_POINTS totals
+        or a keep/drop term is too large to enumerate
+    :return: Distribution of the expression total
+    """
+    parsed: DiceExpression = parse(expression) if isinstance(expression, str) else expression
+
+    points: int = sum(term.count * (term.sides - 1) for term in parsed.terms if isinstance(term, DiceTerm))
+    if points > MAX_DISTRIBUTION_POINTS:
+        raise DiceExpressionError(f"{parsed} has too many possible totals to calculate exact odds")
+
+    offset: int = 0
+    pmf: np.ndarray = np.ones(1)
+    for term in parsed.terms:
+        distribution = term_distribution(term)
+        offset += distribution.offset
+        pmf = convolve(pmf, distribution.pmf)
+    return Distribution(offset, pmf)
@@ -0,0 +1,214 @@
+"""
+Dice expression engine. Parses expressions such as '8d6+3', '4d6kh3', '2d20kl1' or '100d10 - 2d4' and
+rolls every dice term with a single batched NumPy draw.
+
+Supported terms, combined with '+' and '-':
+NdM: roll N dice with M faces (N defaults to 1, i.e. 'd20')
+NdMkhX / NdMkX: keep the highest X dice
+NdMklX: keep the lowest X dice
+NdMdhX / NdMdlX: drop the highest/lowest X dice
+C: a constant
+"""
+import re
+
+import numpy as np
+
+#Limits protecting the bot from oversized expressions
+MAX_DICE: int = 100000
+MAX_SIDES: int = 1000000
+MAX_TERMS: int = 20
+
+_TERM_PATTERN = re.compile(r"""
+    \s*(?P<sign>[+-])?\s*
+    (?:
+        (?P<count>\d*)[dD](?P<sides>\d+)(?:(?P<modifier>kh|kl|k|dh|dl)(?P<modifier_count>\d+))?
+        |
+        (?P<constant>\d+)
+    )\s*
+""", re.VERBOSE | re.IGNORECASE)
+
+_generator: np.random.Generator = np.random.default_rng()
+
+def seed(value: int = None):
+    """Reseeds the shared random generator, i.e. for reproducible benchmarks"""
+    global _generator
+    _generator = np.random.default_rng(value)
+
+def roll_dice(sides: int, count: int = 1) -> np.ndarray:
+    """
+    Rolls count dice with the given number of sides in one vectorized draw
+
+    :param sides: Highest face of the die
+    :param count: Number of dice rolled
+    :return: numpy array of count values between 1 and sides (inclusive)
+    """
+    return _generator.integers(1, sides + 1, size=count)
+
+class DiceExpressionError(ValueError):
+    def __init__(self, msg="Invalid dice expression") -> None:
+        """
+        Error class raised when a dice expression cannot be parsed or exceeds the expression limits.
+
+        :inherit ValueError:
+        """
+        self.msg = msg
+        super().__init__(self.msg)
+
+class DiceTerm():
+    def __init__(self, sign: int, count: int, sides: int, keep: str = None, keep_count: int = None) -> None:
+        """
+        A group of identical dice within an expression, i.e. '4d6kh3'
+
+        :param sign: 1 or -1
+        :param count: Number of dice rolled
+        :param sides: Highest face of the die
+        :param keep: None, "h" to keep the highest keep_count dice or "l" to keep the lowest keep_count dice
+        :param keep_count: Number of dice kept when keep is set
+        """
+        self.sign = sign
+        self.count = count
+        self.sides = sides
+        self.keep = keep
+        self.keep_count = keep_count
+
+    def roll(self) -> tuple:
+        """
+        Rolls the term
+
+        :return: tuple of (numpy array of every rolled value, signed total of the kept values)
+        """
+        values: np.ndarray = roll_dice(self.sides, self.count)
+        return (values, self.sign * int(self.kept(values).sum()))
+
+    def kept(self, values: np.ndarray) -> np.ndarray:
+        """Returns the values counted towards the total, in no particular order"""
+        if self.keep is None or self.keep_count >= self.count:
+            return values
+        if self.keep == "h":
+            return np.partition(values, self.count - self.keep_count)[self.count - self.keep_count:]
+        return np.partition(values, self.keep_count - 1)[:self.keep_count]
+
+    def __str__(self) -> str:
+        keep: str = "" if self.keep is None else f"k{self.keep}{self.keep_count}"
+        return f"{self.count}d{self.sides}{keep}"
+
+class ConstantTerm():
+    def __init__(self, sign: int, value: int) -> None:
+        """A constant within an expression, i.e. the '3' in '8d6+3'"""
+        self.sign = sign
+        self.value = value
+
+    def __str__(self) -> str:
+        return str(self.value)
+
+class DiceExpression():
+    def __init__(self, terms: list) -> None:
+        """
+        A parsed dice expression. Use parse() to build one from text.
+
+        :param terms: DiceTerm and ConstantTerm objects in expression order
+        """
+        self.terms = terms
+
+    def roll(self) -> tuple:
+        """
+        Rolls every dice term of the expression
+
+        :return: tuple of (total, list of (term, numpy array of rolled values or None for constants, signed term total))
+        """
+        results: list = []
+        total: int = 0
+        for term in self.terms:
+            if isinstance(term, ConstantTerm):
+                subtotal = term.sign * term.value
+                results.append((term, None, subtotal))
+            else:
+                values, subtotal = term.roll()
+                results.append((term, values, subtotal))
+            total += subtotal
+        return (total, results)
+
+    def dice_count(self) -> int:
+        return sum(term.count for term in self.terms if isinstance(term, DiceTerm))
+
+    def __str__(self) -> str:
+        text: str = ""
+        for index, term in enumerate(self.terms):
+            if index == 0:
+                text = str(term) if term.sign > 0 else f"-{term}"
+            else:
+                text = text + (" + " if term.sign > 0 else " - ") + str(term)
+        return text
+
+def parse(expression: str) -> DiceExpression:
+    """
+    Parses a dice expression
+
+    :param expression: Expression text, i.e. '4d6kh3 + 2'
+    :raise DiceExpressionError: Raised where the expression is malformed or exceeds MAX_DICE, MAX_SIDES or MAX_TERMS
+    :return: DiceExpression ready to roll
+    """
+    terms: list = []
+    position: int = 0
+    text: str = expression.strip()
+
+    if text == "":
+        raise DiceExpressionError("Enter a dice expression, i.e. 8d6+3 or 4d6kh3")
+
+    while position < len(text):
+        match = _TERM_PATTERN.match(text, position)
+        if match is None or match.end() == position:
+            raise DiceExpressionError(f"I couldn't read '{text[position:]}' in {text}")
+        if terms and match.group("sign") is None:
+            raise DiceExpressionError(f"Terms must be joined with + or -: {text}")
+        position = match.end()
+
+        sign: int = -1 if match.group("sign") == "-" else 1
+        if match.group("constant") is not None:
+            terms.append(ConstantTerm(sign, int(match.group("constant"))))
+        else:
+            count: int = int(match.group("count") or 1)
+            sides: int = int(match.group("sides"))
+            if count < 1 or sides < 1:
+                raise DiceExpressionError("Dice counts and sides must be at least 1")
+            if sides > MAX_SIDES:
+                raise DiceExpressionError(f"Dice may have at most {MAX_SIDES} sides")
+
+            keep: str = None
+            keep_count: int = None
+            modifier = match.group("modifier")
+            if modifier is not None:
+                modifier = modifier.lower()
+                modifier_count = int(match.group("modifier_count"))
+                if modifier_count > count:
+                    raise DiceExpressionError(f"Can't keep or drop {modifier_count} of {count} dice")
+                if modifier in ("k", "kh"):
+                    keep, keep_count = "h", modifier_count
+                elif modifier == "kl":
+                    keep, keep_count = "l", modifier_count
+                elif modifier == "dl":
+                    keep, keep_count = "h", count - modifier_count
+                else:
+                    keep, keep_count = "l", count - modifier_count
+                if keep_count < 1:
+                    raise DiceExpressionError("At least one die must be kept")
+            terms.append(DiceTerm(sign, count, sides, keep, keep_count))
+
+        if len(terms) > MAX_TERMS:
+            raise DiceExpressionError(f"Expressions may have at most {MAX_TERMS} terms")
+
+    parsed = DiceExpression(terms)
+    if parsed.dice_count() > MAX_DICE:
+        raise DiceExpressionError(f"I can roll at most {MAX_DICE} dice at once")
+    return parsed
+
+def roll_expression(expression: str) -> tuple:
+    """
+    Parses and rolls a dice expression
+
+    :raise DiceExpressionError: Raised where the expression is invalid
+    :return: tuple of (parsed DiceExpression, total, term results as returned by DiceExpression.roll)
+    """
+    parsed: DiceExpression = parse(expression)
+    total, results = parsed.roll()
+    return (parsed, total, results)
@@ -1,8 +1,16 @@
 import discord
+import os
+import time
+import numpy as np
 from PIL import Image
-from random import randint
 from io import BytesIO
 
+import Metrics
+
+from DungeonBot.cogs.RNG.rollImageCache import RollImageCache
+from DungeonBot.cogs.RNG.diceExpression import roll_dice
+from DungeonBot.cogs.RNG.assetBundle import ASSET_BUNDLE_PATH, read_bundle, write_bundle
+
 ACCEPTED_DIE_TYPES: tuple = (2, 4, 6, 8, 10, 12, 20)
 
 ASSET_WIDTH: int = 96
@@ -10,12 +18,61 @@ ASSET_HEIGHT: int = 96
 
 ASSETS_DIRECTORY = "./Assets/"
 
+#Roll image layout: dice are laid out left to right in rows of up to GRID_COLUMNS dice, DIE_SPACING pixels apart
+MAX_IMAGE_ROLLS: int = 100
+GRID_COLUMNS: int = 10
+DIE_SPACING: int = 10
+
+#Total size of encoded roll images kept in memory
+ROLL_IMAGE_CACHE_BYTES: int = 8 * 1024 * 1024
+#Largest roll kept in the roll image cache, larger rolls rarely repeat and would evict the warmed single die images
+ROLL_IMAGE_CACHE_MAX_ROLLS: int = 5
+
+class EncodingProfile():
+    def __init__(self, name: str, format: str, extension: str, save_options: dict, quantize: bool = False, scale: float = 1.0) -> None:
+        """
+        Describes how a composited roll image is encoded before it is uploaded
+
+        :param name: Profile name used in configuration
+        :param format: Pillow save format, i.e. "PNG" or "WEBP"
+        :param extension: File extension for the uploaded attachment
+        :param save_options: Keyword arguments passed to Image.save
+        :param quantize: Reduce the image to a 256 color palette before encoding
+        :param scale: Factor the image is resized by before encoding
+        """
+        self.name = name
+        self.format = format
+        self.extension = extension
+        self.save_options = save_options
+        self.quantize = quantize
+        self.scale = scale
+
+ENCODING_PROFILES: dict = {
+    #Full RGBA PNG at Pillow's default settings
+    "png": EncodingProfile("png", "PNG", "png", {}),
+    #Full RGBA PNG with minimal zlib effort, larger files but the quickest encode
+    "fast": EncodingProfile("fast", "PNG", "png", {"compress_level": 1}),
+    #256 color palette PNG, the smallest PNG uploads
+    "palette": EncodingProfile("palette", "PNG", "png", {"compress_level": 6}, quantize=True),
+    #Lossless WebP
+    "webp": EncodingProfile("webp", "WEBP", "webp", {"lossless": True, "method": 0, "quality": 0}),
+    #Half resolution fast PNG
+    "small": EncodingProfile("small", "PNG", "png", {"compress_level": 1}, scale=0.5),
+}
+
+#Encoding profile used for roll images, one of the ENCODING_PROFILES keys
+ENCODING_PROFILE: str = os.getenv("DungeonBotEncodingProfile", "png")
+
 class Die():
     def __init__(self, maxDieFace: int):
         self.__dieType = maxDieFace
 
     def roll(self) -> int:
-        return randint(1, self.__dieType)
+        return int(roll_dice(self.__dieType, 1)[0])
+
+    def roll_many(self, amount: int) -> list:
+        """Rolls the die amount times with a single vectorized draw"""
+        return roll_dice(self.__dieType, amount).tolist()
     
     def getDieType(self) -> int:
         return self.__dieType
@@ -24,80 +81,304 @@ class Die():
         self.__dieType = maxDieFace
         return self.__dieType == maxDieFace
 
-def rollImage(die_max_face: int, amount_of_rolls: int, filename: str = "image.png") -> tuple:
+class DieAssetRegistry():
+    def __init__(self, directory: str = ASSETS_DIRECTORY, bundle_path: str = ASSET_BUNDLE_PATH) -> None:
+        """
+        In-memory registry of decoded die face assets. Every face of every accepted die type is decoded
+        once by load() and kept as an RGBA surface, so rolls composite from memory instead of opening
+        and decoding PNG files. The faces of each die type are also stacked into one read only array, so
+        a roll's faces are gathered with a single indexing operation. Where a die face bundle (see
+        DungeonBot.cogs.RNG.assetBundle) exists, the arrays and surfaces are views of its memory mapping instead.
+
+        :param directory: Directory containing the die assets ("D6_1.png")
+        :param bundle_path: Die face bundle loaded in place of the PNG assets where it exists, empty to always decode the PNGs
+        """
+        self.directory = directory
+        self.bundle_path = bundle_path
+        self.source: str = None
+        self.__faces: dict = {}
+        self.__arrays: dict = {}
+
+    def load(self, use_bundle: bool = True):
+        """
+        Maps the die face bundle, falling back to decoding every PNG asset where there is no valid bundle.
+        All PNG assets are checked before raising so a single error reports everything that is missing or malformed.
+
+        :param use_bundle: Load the bundle where it exists, False to always decode the PNG assets
+        :raise DieAssetNotFoundError: Raised when any asset is missing, unreadable or not ASSET_WIDTH x ASSET_HEIGHT
+        """
+        if use_bundle and self.bundle_path and os.path.exists(self.bundle_path):
+            try:
+                self.__load_bundle()
+                return
+            except (OSError, ValueError) as error:
+                print(f"Die face bundle not loaded, decoding the PNG assets instead: {error}")
+
+        faces: dict = {}
+        problems: list[str] = []
+
+        for die_type in ACCEPTED_DIE_TYPES:
+            for face in range(1, die_type + 1):
+                filename = f'D{die_type}_{face}.png'
+                try:
+                    with Image.open(f'{self.directory}{filename}') as asset:
+                        surface = asset.convert("RGBA")
+                except (OSError, ValueError):
+                    problems.append(filename)
+                    continue
+                if surface.size != (ASSET_WIDTH, ASSET_HEIGHT):
+                    problems.append(f'{filename} {surface.size}')
+                    surface.close()
+                    continue
+                faces[(die_type, face)] = surface
+
+        if problems:
+            for surface in faces.values():
+                surface.close()
+            raise DieAssetNotFoundError(f"Missing or invalid die assets in {self.directory}: {', '.join(problems)}")
+
+        arrays: dict = {}
+        for die_type in ACCEPTED_DIE_TYPES:
+            stack = np.stack([np.asarray(faces[(die_type, face)]) for face in range(1, die_type + 1)])
+            stack.flags.writeable = False
+            arrays[die_type] = stack
+
+        self.close()
+        self.__faces = faces
+        self.__arrays = arrays
+        self.source = "png"
+
+    def __load_bundle(self):
+        """
+        Maps the die face bundle, creating each face surface over the mapping without copying
+
+        :raise OSError: Raised where the bundle cannot be opened
+        :raise ValueError: Raised where the bundle is invalid or does not hold every face of every accepted die type
+        """
+        width, height, arrays = read_bundle(self.bundle_path)
+        if (width, height) != (ASSET_WIDTH, ASSET_HEIGHT):
+            raise ValueError(f"{self.bundle_path} holds {width}x{height} faces, expected {ASSET_WIDTH}x{ASSET_HEIGHT}")
+        missing: list = [die_type for die_type in ACCEPTED_DIE_TYPES if die_type not in arrays or arrays[die_type].shape[0] != die_type]
+        if missing:
+            raise ValueError(f"{self.bundle_path} is missing faces of {', '.join(f'D{die_type}' for die_type in missing)}")
+
+        faces: dict = {}
+        for die_type in ACCEPTED_DIE_TYPES:
+            for face in range(1, die_type + 1):
+                faces[(die_type, face)] = Image.frombuffer("RGBA", (width, height), arrays[die_type][face - 1], "raw", "RGBA", 0, 1)
+
+        self.close()
+        self.__faces = faces
+        self.__arrays = {die_type: arrays[die_type] for die_type in ACCEPTED_DIE_TYPES}
+        self.source = "bundle"
+
+    def write_bundle(self, path: str = None):
+        """
+        Writes the loaded faces to a die face bundle
+
+        :param path: Bundle file path, the registry's bundle_path by default
+        """
+        write_bundle(self.__arrays, path or self.bundle_path)
+
+    def is_loaded(self) -> bool:
+        return len(self.__faces) > 0
+
+    def get_face(self, die_type: int, face: int) -> Image.Image:
+        """
+        Returns the decoded RGBA surface for a die face. The surface is shared and must not be closed or modified.
+
+        :raise KeyError: Raised when the die face has not been loaded
+        """
+        return self.__faces[(die_type, face)]
+
+    def get_face_array(self, die_type: int) -> np.ndarray:
+        """
+        Returns every face of a die type as a read only uint8 array of shape (die_type, ASSET_HEIGHT, ASSET_WIDTH, 4),
+        face n being at index n - 1
+
+        :raise KeyError: Raised when the die type has not been loaded
+        """
+        return self.__arrays[die_type]
+
+    def close(self):
+        """Releases every decoded surface"""
+        for surface in self.__faces.values():
+            surface.close()
+        self.__faces = {}
+        self.__arrays = {}
+        self.source = None
+
+#Shared die face registry, loaded by the RNG extension at setup
+DIE_ASSETS = DieAssetRegistry()
+
+#Shared cache of encoded roll images keyed by (encoding profile, die type, (roll values...))
+ROLL_IMAGE_CACHE = RollImageCache(ROLL_IMAGE_CACHE_BYTES)
+Metrics.register_cache("roll_image", ROLL_IMAGE_CACHE.stats)
+
+def rollImage(die_max_face: int, amount_of_rolls: int, filename: str = "image.png", profile: str = None) -> tuple:
     """
-    Generates an image containing up to four dice with random values. Returns the image as a discord file and the total rolled value as an integer.
+    Generates an image containing up to MAX_IMAGE_ROLLS dice with random values. Returns the image as a discord file and the total rolled value as an integer.
     Raises a RollValueAndTypeError where the passed max die face is not within the accepted die types (2, 4, 6, 8, 10, 12, 20) or the amount of
-    rolls is not a value from 1 to 4.
+    rolls is not a value from 1 to MAX_IMAGE_ROLLS.
 
     :param die_max_face: Integer representing the max face on a typical DnD die (2, 4, 6, 8, 10, 12, 20)
-    :param amount_of_rolls: Integer representing the amount of times the die will be rolled, must be between 1 and 4 (inclusive)
+    :param amount_of_rolls: Integer representing the amount of times the die will be rolled, must be between 1 and MAX_IMAGE_ROLLS (inclusive)
     :param filename: The name of the discord file being returned, 'image.png' by default
-    :raise ValueError: Raised where die_max_face or amount_of_rolls is invalid
+    :param profile: Name of the ENCODING_PROFILES entry used to encode the image, ENCODING_PROFILE by default
+    :raise ValueError: Raised where die_max_face or amount_of_rolls is invalid, or profile is unknown
     :raise FileNotFoundError: Raised when a die asset cannot be found, must exist within Assets directory with proper naming convention ("D6_1.png")
     :return: Returns the image within a discord.File object and the calculated total of the rolls as an integer, or None where an exception is raised
     """
+    profile = get_encoding_profile(profile).name
+    rolls: list[int] = roll_for_image(die_max_face, amount_of_rolls)
+
+    #Calculated total to be returned
+    total: int = sum(rolls)
+
+    if amount_of_rolls > ROLL_IMAGE_CACHE_MAX_ROLLS:
+        return (BytesIO(render_roll(die_max_face, rolls, profile)), total)
+
+    #Serve repeated rolls from the encoded image cache
+    key: tuple = (profile, die_max_face, tuple(rolls))
+    image: bytes = ROLL_IMAGE_CACHE.get(key)
+    if image is None:
+        image = render_roll(die_max_face, rolls, profile)
+        ROLL_IMAGE_CACHE.put(key, image)
+
+    return (BytesIO(image), total)
+
+def roll_for_image(die_max_face: int, amount_of_rolls: int) -> list:
+    """
+    Validates an image roll request and generates its roll values
+
+    :param die_max_face: Integer representing the max face on a typical DnD die (2, 4, 6, 8, 10, 12, 20)
+    :param amount_of_rolls: Integer representing the amount of times the die will be rolled
+    :raise RollValueAndTypeError: Raised where die_max_face or amount_of_rolls is invalid
+    :return: list of roll values
+    """
     #Verifies dieMaxFace and amount_of_rolls are accepted values
     if not _is_valid_type_and_roll(dieType=die_max_face, amount=amount_of_rolls):
-        raise RollValueAndTypeError(f'Your roll must be a valid DnD die type {ACCEPTED_DIE_TYPES} any you may only roll up to five dice. You tried to roll: {amount_of_rolls}D{die_max_face}')
+        raise RollValueAndTypeError(f'Your roll must be a valid DnD die type {ACCEPTED_DIE_TYPES} any you may only roll up to {MAX_IMAGE_ROLLS} dice. You tried to roll: {amount_of_rolls}D{die_max_face}')
 
-    #Roll value creation variables
     die: Die = Die(die_max_face)
-    rolls: list[int] = []
-    required_assets: set = set()
-    
-    #Generate die roll values and a set containing only the required assets
-    for i in range(amount_of_rolls):
-        rolls.append(die.roll())
-        required_assets.add(rolls[i])
-    
-    #Calculated total to be returned
-    total: int = sum(rolls)
+    return die.roll_many(amount_of_rolls)
+
+def get_encoding_profile(profile: str = None) -> EncodingProfile:
+    """
+    Returns the named encoding profile, or the configured ENCODING_PROFILE where profile is None
+
+    :raise ValueError: Raised when the profile does not exist
+    """
+    name: str = ENCODING_PROFILE if profile is None else profile
+    if name not in ENCODING_PROFILES:
+        raise ValueError(f"Unknown encoding profile '{name}', expected one of {tuple(ENCODING_PROFILES)}")
+    return ENCODING_PROFILES[name]
 
-    #Generation variables
-    asset_X_coordinate_pointer: int = 10
-    asset_y_coordinate = 0
-    assets: dict = {}
-    image_byte_array: BytesIO = BytesIO()
-    blank: Image
+def grid_size(amount: int) -> tuple:
+    """
+    Returns the layout of a roll image: dice fill rows of up to GRID_COLUMNS dice from the top left, with
+    DIE_SPACING pixels before, between and after the dice of a row and between rows
+
+    :param amount: Number of dice in the image
+    :return: tuple[size 4] of (columns, rows, image width, image height)
+    """
+    columns: int = min(amount, GRID_COLUMNS)
+    rows: int = -(-amount // GRID_COLUMNS)
+    return (columns, rows, DIE_SPACING + columns * (ASSET_WIDTH + DIE_SPACING), rows * (ASSET_HEIGHT + DIE_SPACING) - DIE_SPACING)
+
+def composite_roll(die_max_face: int, rolls: list) -> Image.Image:
+    """
+    Lays out the die faces for a sequence of roll values in a grid (see grid_size). The faces are gathered from the
+    registry's face arrays with one indexing operation and copied into the canvas row by row with array slicing,
+    so the canvas is converted to an image once.
+
+    :param die_max_face: Integer representing the max face on a typical DnD die (2, 4, 6, 8, 10, 12, 20)
+    :param rolls: Roll values in display order, each between 1 and die_max_face
+    :return: RGBA image, closed by the caller
+    """
+    columns, rows, width, height = grid_size(len(rolls))
+    faces: np.ndarray = DIE_ASSETS.get_face_array(die_max_face)[np.asarray(rolls) - 1]
+
+    #Each row is ASSET_HEIGHT + DIE_SPACING pixels tall, the last row's spacing is cut off below
+    canvas: np.ndarray = np.zeros((rows * (ASSET_HEIGHT + DIE_SPACING), width, 4), dtype=np.uint8)
+    #View of the canvas as (row, y, column, x, channel) cells with each die at the cell's top left
+    cells: np.ndarray = canvas[:, DIE_SPACING:].reshape(rows, ASSET_HEIGHT + DIE_SPACING, columns, ASSET_WIDTH + DIE_SPACING, 4)
+
+    full_rows: int = len(rolls) // columns
+    if full_rows:
+        grid = faces[:full_rows * columns].reshape(full_rows, columns, ASSET_HEIGHT, ASSET_WIDTH, 4)
+        cells[:full_rows, :ASSET_HEIGHT, :, :ASSET_WIDTH] = grid.transpose(0, 2, 1, 3, 4)
+    remaining: int = len(rolls) - full_rows * columns
+    if remaining:
+        cells[full_rows, :ASSET_HEIGHT, :remaining, :ASSET_WIDTH] = faces[full_rows * columns:].transpose(1, 0, 2, 3)
+
+    return Image.fromarray(canvas[:height])
+
+def render_roll(die_max_face: int, rolls: list, profile: str = None) -> bytes:
+    """
+    Composites the die faces for a sequence of roll values into a grid (see composite_roll) and returns it
+    encoded with the requested encoding profile
+
+    :param die_max_face: Integer representing the max face on a typical DnD die (2, 4, 6, 8, 10, 12, 20)
+    :param rolls: Roll values in display order, each between 1 and die_max_face
+    :param profile: Name of the ENCODING_PROFILES entry used to encode the image, ENCODING_PROFILE by default
+    :return: Encoded image bytes
+    """
+    encoding: EncodingProfile = get_encoding_profile(profile)
+
+    #Decode every asset up front when used outside of the RNG extension
+    if not DIE_ASSETS.is_loaded():
+        DIE_ASSETS.load()
+
+    start: float = time.perf_counter()
+    image: Image.Image = composite_roll(die_max_face, rolls)
+    Metrics.observe(Metrics.IMAGE_RENDER_LATENCY, time.perf_counter() - start, die_type=die_max_face)
 
     try:
-        #blank base image generation variables
-        asset_maximum_width: int = 0
-        asset_maximum_height: int = 0
-
-        #Pre-load all required assets and initialize asset maximum height and width values
-        for i in required_assets:
-            assets[i] = Image.open(f'{ASSETS_DIRECTORY}D{die_max_face}_{i}.png')
-            if (assets[i].width > asset_maximum_width):
-                asset_maximum_width = assets[i].width
-            if (assets[i].height > asset_maximum_height):
-                asset_maximum_height = assets[i].height
-        
-        #Generate blank image
-        blank_width: int = 10
-        for i in range(0, amount_of_rolls):
-            blank_width = blank_width + asset_maximum_width + 10
-        blank = Image.new(mode="RGBA", size=(blank_width, asset_maximum_height))
-        
-        #Paste each asset within the generated blank image
-        for i in rolls:
-            blank.paste(assets[i], (asset_X_coordinate_pointer, asset_y_coordinate))
-            asset_X_coordinate_pointer = asset_X_coordinate_pointer + ASSET_WIDTH + 10
-        
-        #convert the image to a byte array
-        blank.save(image_byte_array, format="PNG")
-
-        return (image_byte_array, total)
-    except FileNotFoundError:
-        raise DieAssetNotFoundError("Sorry, a die asset appears to be missing or corrupted. Please contact your admin!")
-    except Exception as e:
-        print(e)
+        start = time.perf_counter()
+        encoded: bytes = encode_image(image, encoding)
+        Metrics.observe(Metrics.IMAGE_ENCODE_LATENCY, time.perf_counter() - start, profile=encoding.name)
+        return encoded
     finally:
-        # Close all open class calls
-        for key in assets:
-            assets[key].close()
-        blank.close()
+        image.close()
+
+def encode_image(image: Image.Image, encoding: EncodingProfile) -> bytes:
+    """
+    Encodes a composited RGBA image using an encoding profile
+
+    :param image: Composited roll image, left open for the caller to close
+    :param encoding: Profile describing the scale, palette and format of the output
+    :return: Encoded image bytes
+    """
+    converted: list = []
+    try:
+        if encoding.scale != 1.0:
+            size = (max(1, round(image.width * encoding.scale)), max(1, round(image.height * encoding.scale)))
+            image = image.resize(size, Image.Resampling.BILINEAR)
+            converted.append(image)
+        if encoding.quantize:
+            image = image.quantize(colors=256, method=Image.Quantize.FASTOCTREE)
+            converted.append(image)
+
+        with BytesIO() as image_byte_array:
+            image.save(image_byte_array, format=encoding.format, **encoding.save_options)
+            return image_byte_array.getvalue()
+    finally:
+        for intermediate in converted:
+            intermediate.close()
+
+def warm_roll_image_cache(profile: str = None):
+    """
+    Renders every single die roll output (i.e. all twenty 1D20 images) into the roll image cache
+
+    :param profile: Name of the ENCODING_PROFILES entry to warm, ENCODING_PROFILE by default
+    """
+    profile = get_encoding_profile(profile).name
+    for die_type in ACCEPTED_DIE_TYPES:
+        for face in range(1, die_type + 1):
+            key: tuple = (profile, die_type, (face,))
+            if key not in ROLL_IMAGE_CACHE:
+                ROLL_IMAGE_CACHE.put(key, render_roll(die_type, [face], profile))
 
 def _is_valid_type_and_roll(dieType: int, amount: int) -> bool:
     """
@@ -105,7 +386,7 @@ def _is_valid_type_and_roll(dieType: int, amount: int) -> bool:
     """
     if dieType not in ACCEPTED_DIE_TYPES:
         return False
-    if not (amount >= 1 and amount <= 5):
+    if not (amount >= 1 and amount <= MAX_IMAGE_ROLLS):
         return False
     return True
 
@@ -0,0 +1,113 @@
+"""
+Worker pool used to composite and encode roll images off of the asyncio event loop
+"""
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from io import BytesIO
+
+import Metrics
+from DungeonBot.cogs.RNG.dieImage import DIE_ASSETS, ROLL_IMAGE_CACHE, ROLL_IMAGE_CACHE_MAX_ROLLS, get_encoding_profile, roll_for_image, render_roll
+
+#"thread" or "process". Pillow releases the GIL while compositing and encoding, so threads scale
+#across cores for most workloads; processes avoid the GIL entirely at the cost of a copy of the assets per worker,
+#unless the die face bundle is built, which worker processes map and share.
+RENDER_POOL_KIND: str = os.getenv("DungeonBotRenderPool", "thread")
+RENDER_POOL_WORKERS: int = int(os.getenv("DungeonBotRenderWorkers", os.cpu_count() or 1))
+
+#Maximum number of renders queued or running at once. Further rolls wait for a free slot.
+RENDER_QUEUE_DEPTH: int = RENDER_POOL_WORKERS * 4
+
+def _init_process_worker():
+    """Decodes the die assets once in each worker process"""
+    DIE_ASSETS.load()
+
+class RenderPool():
+    def __init__(self, kind: str = RENDER_POOL_KIND, workers: int = RENDER_POOL_WORKERS, queue_depth: int = RENDER_QUEUE_DEPTH) -> None:
+        """
+        Executes render_roll on a pool of worker threads or processes. At most queue_depth renders are
+        submitted at once; additional callers are held back until a slot frees up, so a burst of rolls
+        cannot grow the pool's queue without bound.
+
+        :param kind: "thread" or "process"
+        :param workers: Number of worker threads or processes
+        :param queue_depth: Maximum number of queued and running renders
+        :raise ValueError: Raised when kind is not "thread" or "process"
+        """
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown render pool kind: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.__executor: Executor = None
+        #Created by the first render, within the event loop that awaits it
+        self.__slots: asyncio.Semaphore = None
+
+    def start(self):
+        """Starts the worker pool, i.e. at extension setup"""
+        if self.__executor is not None:
+            return
+        if self.kind == "process":
+            self.__executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_process_worker
+            )
+        else:
+            self.__executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="RenderPool")
+
+    def shutdown(self):
+        """Waits for running renders to finish and stops the worker pool"""
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=True)
+            self.__executor = None
+        self.__slots = None
+
+    async def render(self, die_max_face: int, rolls: list, profile: str = None) -> bytes:
+        """
+        Renders a roll image on the worker pool, waiting for a free queue slot first. Render and encode
+        timings recorded inside worker processes stay in those processes; the queue wait is always recorded.
+
+        :param die_max_face: Integer representing the max face on a typical DnD die (2, 4, 6, 8, 10, 12, 20)
+        :param rolls: Roll values in display order
+        :param profile: Name of the encoding profile, dieImage.ENCODING_PROFILE by default
+        :return: Encoded image bytes
+        """
+        self.start()
+        if self.__slots is None:
+            self.__slots = asyncio.Semaphore(self.queue_depth)
+        queued: float = time.perf_counter()
+        async with self.__slots:
+            Metrics.observe(Metrics.RENDER_QUEUE_LATENCY, time.perf_counter() - queued, kind=self.kind)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.__executor, render_roll, die_max_face, list(rolls), profile)
+
+    async def roll_image(self, die_max_face: int, amount_of_rolls: int, profile: str = None) -> tuple:
+        """
+        Awaitable equivalent of dieImage.rollImage. Cached images are returned immediately; cache misses
+        are rendered on the worker pool.
+
+        :param die_max_face: Integer representing the max face on a typical DnD die (2, 4, 6, 8, 10, 12, 20)
+        :param amount_of_rolls: Integer representing the amount of times the die will be rolled
+        :param profile: Name of the encoding profile, dieImage.ENCODING_PROFILE by default
+        :raise RollValueAndTypeError: Raised where die_max_face or amount_of_rolls is invalid
+        :return: Returns the image within a BytesIO object and the calculated total of the rolls as an integer
+        """
+        profile = get_encoding_profile(profile).name
+        rolls: list[int] = roll_for_image(die_max_face, amount_of_rolls)
+        if amount_of_rolls > ROLL_IMAGE_CACHE_MAX_ROLLS:
+            return (BytesIO(await self.render(die_max_face, rolls, profile)), sum(rolls))
+
+        key: tuple = (profile, die_max_face, tuple(rolls))
+
+        image: bytes = ROLL_IMAGE_CACHE.get(key)
+        if image is None:
+            image = await self.render(die_max_face, rolls, profile)
+            ROLL_IMAGE_CACHE.put(key, image)
+
+        return (BytesIO(image), sum(rolls))
+
+#Shared render pool, started by the RNG extension at setup
+RENDER_POOL = RenderPool()
@@ -0,0 +1,78 @@
+"""LRU cache of encoded roll images bounded by a total byte budget"""
+import threading
+from collections import OrderedDict
+
+class RollImageCache():
+    def __init__(self, byte_budget: int) -> None:
+        """
+        Maps a roll key, i.e. (encoding profile, die type, (roll values...)), to the finished image bytes for that roll.
+        The least recently used images are evicted once the cached bytes exceed byte_budget. Images
+        larger than the whole budget are never cached.
+
+        :param byte_budget: Maximum total size of the cached images in bytes
+        """
+        self.byte_budget = byte_budget
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+        self.__images: OrderedDict = OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key: tuple) -> bytes:
+        """
+        Returns the cached image bytes for a roll key or None on a cache miss
+        """
+        with self.__lock:
+            image = self.__images.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.__images.move_to_end(key)
+            return image
+
+    def put(self, key: tuple, image: bytes):
+        """
+        Stores the image bytes for a roll key, evicting least recently used images to stay within budget
+        """
+        if len(image) > self.byte_budget:
+            return
+        with self.__lock:
+            previous = self.__images.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous)
+            self.__images[key] = image
+            self.size += len(image)
+            while self.size > self.byte_budget:
+                _, evicted = self.__images.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def __contains__(self, key: tuple) -> bool:
+        with self.__lock:
+            return key in self.__images
+
+    def clear(self):
+        """Drops every cached image"""
+        with self.__lock:
+            self.__images.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        """
+        Returns cache counters
+
+        :return: dict with entries, bytes, byte_budget, hits, misses, evictions and hit_rate keys
+        """
+        with self.__lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.__images),
+                "bytes": self.size,
+                "byte_budget": self.byte_budget,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
@@ -0,0 +1,94 @@
+import discord
+from discord.ext import commands
+from discord import app_commands
+
+import Metrics
+
+#Discord rejects embed field values longer than 1024 characters
+FIELD_LIMIT: int = 1024
+
+def _format_histograms(histograms: dict, metric: str, label: str, limit: int = 10) -> str:
+    """
+    Formats the histograms of one metric, one line per label value, ordered by total time spent
+    """
+    rows: list = []
+    for (name, labels), histogram in histograms.items():
+        if name != metric or histogram.count == 0:
+            continue
+        value = dict(labels).get(label, "")
+        rows.append((histogram.sum, value, histogram))
+    rows.sort(key=lambda row: row[0], reverse=True)
+
+    lines: list[str] = []
+    for total, value, histogram in rows[:limit]:
+        lines.append(
+            f"`{value}` n={histogram.count} mean={total / histogram.count * 1000:.2f}ms "
+            f"p50={histogram.quantile(0.5) * 1000:.2f}ms p95={histogram.quantile(0.95) * 1000:.2f}ms"
+        )
+
+    text = "\n".join(lines) if lines else "No data yet"
+    return text if len(text) <= FIELD_LIMIT else text[:FIELD_LIMIT - 3] + "..."
+
+def get_stats_embed() -> discord.Embed:
+    """
+    Formats and returns a discord Embed summarizing the bot's performance metrics
+
+    :return discord.Embed: A formatted Embed object
+    """
+    histograms: dict = Metrics.REGISTRY.histograms()
+    gauges: dict = Metrics.REGISTRY.gauges()
+    counters: dict = Metrics.REGISTRY.counters()
+
+    embed = discord.Embed(color=discord.Color.dark_green(), title="DungeonBot Stats")
+    embed.add_field(name="Commands", value=_format_histograms(histograms, Metrics.COMMAND_LATENCY, "command"), inline=False)
+    embed.add_field(name="Database", value=_format_histograms(histograms, Metrics.DB_QUERY_LATENCY, "function"), inline=False)
+    embed.add_field(name="Image render", value=_format_histograms(histograms, Metrics.IMAGE_RENDER_LATENCY, "die_type"), inline=False)
+    embed.add_field(name="Image encode", value=_format_histograms(histograms, Metrics.IMAGE_ENCODE_LATENCY, "profile"), inline=False)
+
+    errors: float = sum(value for (name, labels), value in counters.items() if name == Metrics.COMMAND_ERRORS)
+    lag = histograms.get((Metrics.EVENT_LOOP_LAG, ()))
+    if lag is not None and lag.count:
+        lag_text = f"last={gauges.get((Metrics.EVENT_LOOP_LAG_LAST, ()), 0.0) * 1000:.2f}ms p99={lag.quantile(0.99) * 1000:.2f}ms"
+    else:
+        lag_text = "No data yet"
+    embed.add_field(name="Event loop lag", value=lag_text, inline=True)
+    embed.add_field(name="Command errors", value=f"{errors:g}", inline=True)
+
+    group_commits = histograms.get((Metrics.DB_GROUP_COMMIT_LATENCY, ()))
+    if group_commits is not None and group_commits.count:
+        operations: float = counters.get((Metrics.DB_GROUP_COMMIT_OPERATIONS, ()), 0)
+        commit_text = f"n={group_commits.count} ops/commit={operations / group_commits.count:.1f} p95={group_commits.quantile(0.95) * 1000:.2f}ms"
+    else:
+        commit_text = "No data yet"
+    embed.add_field(name="Group commits", value=commit_text, inline=True)
+
+    caches: list[str] = []
+    for (name, labels), value in sorted(gauges.items()):
+        if name == Metrics.CACHE_ENTRIES:
+            cache = dict(labels)["cache"]
+            hits = counters.get((Metrics.CACHE_HITS, labels), 0)
+            misses = counters.get((Metrics.CACHE_MISSES, labels), 0)
+            rate = hits / (hits + misses) * 100 if hits + misses else 0.0
+            caches.append(f"`{cache}` entries={value:g} hit rate={rate:.1f}%")
+    embed.add_field(name="Caches", value="\n".join(caches) if caches else "No data yet", inline=False)
+
+    return embed
+
+@app_commands.command()
+#Only hides the command from members without the permission, guilds can override it
+@app_commands.default_permissions(administrator=True)
+async def stats(interaction: discord.Interaction):
+    """Show command latency, database and rendering statistics"""
+    try:
+        if not await interaction.client.is_owner(interaction.user):
+            await interaction.response.send_message("Only the bot owner can view stats", ephemeral=True)
+            return
+        await interaction.response.send_message(embed=get_stats_embed(), ephemeral=True)
+    except Exception as e:
+        await interaction.response.send_message("Something went wrong")
+        print(e)
+
+async def setup(bot: commands.Bot):
+    cmd_name = "stats"
+    bot.tree.add_command(stats)
+    print(f"Command extension: {cmd_name} added")
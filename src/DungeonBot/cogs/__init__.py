@@ -1,5 +1,6 @@
 #List of extensions to load
 extensions: list[str] = [
     "RNG",
-    "Initiative"
+    "Initiative",
+    "Stats"
     ]
\ No newline at end of file
@@ -0,0 +1,67 @@
+"""
+Command tree sync skipping. Syncing the command tree is a rate limited Discord API call, so the bot stores a
+hash of the last synced tree and only syncs again once a command's signature (name, description, parameters,
+choices or permissions) changes.
+"""
+import hashlib
+import inspect
+import json
+import os
+
+from discord import app_commands
+
+#File holding the hash of the last synced command tree, empty to sync on every start
+COMMAND_TREE_HASH_FILE: str = os.getenv("DungeonBotCommandTreeHashFile", "./Database/commandTree.sha256")
+
+def _command_payload(command, tree: app_commands.CommandTree) -> dict:
+    """
+    Returns the payload tree.sync sends for a command. discord.py 2.4 added the tree argument of to_dict, used
+    to report translated names; earlier versions take no argument.
+    """
+    if len(inspect.signature(command.to_dict).parameters) == 0:
+        return command.to_dict()
+    return command.to_dict(tree)
+
+def command_tree_hash(tree: app_commands.CommandTree, application_id: int) -> str:
+    """
+    Returns a SHA-256 hex digest of the global command payload tree.sync sends for an application
+
+    :param tree: Command tree with every extension loaded
+    :param application_id: Application the tree is synced to, so switching bot accounts forces a sync
+    """
+    payload: list = sorted((_command_payload(command, tree) for command in tree.get_commands()), key=lambda command: command["name"])
+    serialized: str = json.dumps({"application_id": application_id, "commands": payload}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+def read_synced_hash(path: str = COMMAND_TREE_HASH_FILE) -> str:
+    """Returns the hash stored by the last sync, or None where there is none"""
+    if not path:
+        return None
+    try:
+        with open(path) as file:
+            return file.read().strip()
+    except OSError:
+        return None
+
+def write_synced_hash(tree_hash: str, path: str = COMMAND_TREE_HASH_FILE):
+    """Stores the hash of a synced tree, replacing the file atomically"""
+    if not path:
+        return
+    temporary: str = f"{path}.tmp"
+    with open(temporary, "w") as file:
+        file.write(tree_hash)
+    os.replace(temporary, path)
+
+async def sync_if_changed(tree: app_commands.CommandTree, application_id: int, path: str = COMMAND_TREE_HASH_FILE) -> list:
+    """
+    Syncs the global command tree where its hash differs from the last synced one
+
+    :return: list of synced app_commands.AppCommand, or None where the sync was skipped
+    :raise discord.HTTPException: Raised when the sync fails, the stored hash is left unchanged
+    """
+    tree_hash: str = command_tree_hash(tree, application_id)
+    if tree_hash == read_synced_hash(path):
+        return None
+    synced: list = await tree.sync()
+    write_synced_hash(tree_hash, path)
+    return synced
@@ -0,0 +1,88 @@
+"""
+Stand-in for the Discord gateway, used to run cluster workers locally without a bot token. A FakeGateway
+starts a ShardedDungeonBot without connecting to Discord: it loads the cogs, reports each of the bot's shards
+ready and then replays initiative commands against synthetic guilds routed to those shards, checking every
+order it reads back against the writes it made.
+
+python3 -m DungeonBot.cluster --fake-gateway --workers 2 --shards 4
+"""
+import asyncio
+import os
+import random
+
+from DBHelper import orderDB, asyncDB
+
+#Synthetic guilds spread over every gateway shard, each worker only replays commands for its own shards' guilds
+FAKE_GUILDS: int = 64
+FAKE_CHANNELS: int = 4
+FAKE_USERS: int = 16
+
+#Delay between replayed commands
+FAKE_EVENT_INTERVAL_SECONDS: float = 0.01
+
+def gateway_shard(guild_id: int, shard_count: int) -> int:
+    """Returns the gateway shard Discord delivers a guild's events on"""
+    return (guild_id >> 22) % shard_count
+
+class FakeGateway():
+    def __init__(self, bot, shard_ids: list, shard_count: int, interval: float = FAKE_EVENT_INTERVAL_SECONDS, crash_after: float = None) -> None:
+        """
+        Runs a bot against simulated gateway shards
+
+        :param bot: ShardedDungeonBot to run, constructed with the same shard_ids and shard_count
+        :param shard_ids: Gateway shards the bot handles
+        :param shard_count: Total number of gateway shards across the cluster
+        :param interval: Delay between replayed commands
+        :param crash_after: Exit the process without cleanup after this many seconds, to exercise the cluster supervisor
+        """
+        self.bot = bot
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.interval = interval
+        self.crash_after = crash_after
+        self.commands: int = 0
+        self.guild_ids: list = [
+            guild_id for guild_id in ((k + 1) << 22 for k in range(FAKE_GUILDS))
+            if gateway_shard(guild_id, shard_count) in shard_ids
+        ]
+
+    async def run(self):
+        """
+        Starts the bot, reports its shards ready and replays commands until the bot is closed
+
+        :raise RuntimeError: Raised when an order read back does not match the commands written to it
+        """
+        async with self.bot:
+            await self.bot.setup_hook()
+            for shard_id in self.shard_ids:
+                self.bot.dispatch("shard_ready", shard_id)
+            self.bot.dispatch("ready")
+
+            if self.crash_after is not None:
+                asyncio.get_running_loop().call_later(self.crash_after, os._exit, 1)
+
+            while not self.bot.is_closed():
+                if self.guild_ids:
+                    await self.replay_command()
+                await asyncio.sleep(self.interval)
+
+        print(f"Fake gateway for shards {self.shard_ids[0]}-{self.shard_ids[-1]} replayed {self.commands} commands")
+
+    async def replay_command(self):
+        """Adds a character to a random synthetic order, reads the order back and removes the character again"""
+        scope: dict = {"guild_id": random.choice(self.guild_ids), "channel_id": random.randrange(FAKE_CHANNELS)}
+        user_id: int = random.randrange(1, FAKE_USERS + 1)
+        name: str = f"Character {self.commands}"
+        try:
+            await asyncDB.run(orderDB.add_order_command, user_id, name, random.randint(1, 20), 0, **scope)
+            order: list = await asyncDB.run(orderDB.get_initiative_order, user_id, **scope)
+            removed: bool = await asyncDB.run(orderDB.remove_one_order, user_id, name, **scope)
+        except RuntimeError:
+            #The database worker shut down while the bot was closing
+            if self.bot.is_closed():
+                return
+            raise
+
+        if name not in (row[0] for row in order) or not removed:
+            raise RuntimeError(f"Order {user_id} {scope} does not match the commands written to it")
+        self.commands += 1
@@ -0,0 +1,55 @@
+"""
+Gateway profiles: the intents and discord.py cache settings DungeonBot connects to Discord with. Every cog
+works through app command interactions, which are delivered regardless of intents, so the lean profile
+only subscribes to guild events and keeps discord.py's member and message caches small.
+"""
+import os
+
+import discord
+
+class GatewayProfile():
+    def __init__(self, name: str, intents: discord.Intents, member_cache_flags: discord.MemberCacheFlags, max_messages: int, chunk_guilds_at_startup: bool) -> None:
+        """
+        Describes the gateway subscription and client side caching of the bot
+
+        :param name: Profile name used in configuration
+        :param intents: Gateway intents the bot identifies with
+        :param member_cache_flags: Which guild members discord.py keeps in memory
+        :param max_messages: Maximum number of messages held in discord.py's message cache, None to disable it
+        :param chunk_guilds_at_startup: Request every guild's full member list when connecting
+        """
+        self.name = name
+        self.intents = intents
+        self.member_cache_flags = member_cache_flags
+        self.max_messages = max_messages
+        self.chunk_guilds_at_startup = chunk_guilds_at_startup
+
+    def client_options(self) -> dict:
+        """Returns the profile as discord.Client keyword arguments"""
+        return {
+            "intents": self.intents,
+            "member_cache_flags": self.member_cache_flags,
+            "max_messages": self.max_messages,
+            "chunk_guilds_at_startup": self.chunk_guilds_at_startup
+        }
+
+GATEWAY_PROFILES: dict = {
+    #Guild events only: no member, presence or message events, no member cache and no chunking
+    "lean": GatewayProfile("lean", discord.Intents(guilds=True), discord.MemberCacheFlags.none(), 100, False),
+    #Every intent with discord.py's default caching, chunking every guild at startup
+    "full": GatewayProfile("full", discord.Intents.all(), discord.MemberCacheFlags.from_intents(discord.Intents.all()), 1000, True),
+}
+
+#Gateway profile the bot connects with, one of the GATEWAY_PROFILES keys
+GATEWAY_PROFILE: str = os.getenv("DungeonBotGatewayProfile", "lean")
+
+def get_gateway_profile(profile: str = None) -> GatewayProfile:
+    """
+    Returns the named gateway profile, or the configured GATEWAY_PROFILE where profile is None
+
+    :raise ValueError: Raised when the profile does not exist
+    """
+    name: str = GATEWAY_PROFILE if profile is None else profile
+    if name not in GATEWAY_PROFILES:
+        raise ValueError(f"Unknown gateway profile '{name}', expected one of {tuple(GATEWAY_PROFILES)}")
+    return GATEWAY_PROFILES[name]
@@ -0,0 +1,311 @@
+"""
+In-process metrics: latency histograms, counters and gauges shared by the cogs, DBHelper and the
+dice renderer. Metrics can be read as a snapshot (the /stats command) or rendered in the Prometheus
+text exposition format and written to disk for a node_exporter textfile collector.
+"""
+import asyncio
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+#Metric names
+COMMAND_LATENCY = "dungeonbot_command_latency_seconds"
+COMMAND_ERRORS = "dungeonbot_command_errors_total"
+DB_QUERY_LATENCY = "dungeonbot_db_query_seconds"
+DB_GROUP_COMMIT_LATENCY = "dungeonbot_db_group_commit_seconds"
+DB_GROUP_COMMIT_OPERATIONS = "dungeonbot_db_group_commit_operations_total"
+DB_BACKUP_LATENCY = "dungeonbot_db_backup_seconds"
+IMAGE_RENDER_LATENCY = "dungeonbot_image_render_seconds"
+IMAGE_ENCODE_LATENCY = "dungeonbot_image_encode_seconds"
+RENDER_QUEUE_LATENCY = "dungeonbot_render_queue_wait_seconds"
+EVENT_LOOP_LAG = "dungeonbot_event_loop_lag_seconds"
+EVENT_LOOP_LAG_LAST = "dungeonbot_event_loop_lag_last_seconds"
+CACHE_ENTRIES = "dungeonbot_cache_entries"
+CACHE_HITS = "dungeonbot_cache_hits_total"
+CACHE_MISSES = "dungeonbot_cache_misses_total"
+STARTUP_PHASE = "dungeonbot_startup_phase_seconds"
+
+#Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS: tuple = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+#Prometheus text file written by write_prometheus, empty to disable
+PROMETHEUS_FILE: str = os.getenv("DungeonBotMetricsFile", "./dungeonBot.prom")
+PROMETHEUS_INTERVAL_SECONDS: int = 15
+
+HELP: dict = {
+    COMMAND_LATENCY: "Time from an app command interaction being checked to the command completing",
+    COMMAND_ERRORS: "App command invocations that raised an error",
+    DB_QUERY_LATENCY: "Time spent in a DBHelper function",
+    DB_GROUP_COMMIT_LATENCY: "Time spent executing and committing one group of database operations",
+    DB_GROUP_COMMIT_OPERATIONS: "Database operations executed within group commits",
+    DB_BACKUP_LATENCY: "Time spent writing an in-memory database back to its file",
+    IMAGE_RENDER_LATENCY: "Time spent compositing a roll image",
+    IMAGE_ENCODE_LATENCY: "Time spent encoding a roll image",
+    RENDER_QUEUE_LATENCY: "Time a roll image render waited for a render pool slot",
+    EVENT_LOOP_LAG: "Delay between an event loop timer being due and it running",
+    EVENT_LOOP_LAG_LAST: "Most recently measured event loop lag",
+    CACHE_ENTRIES: "Entries held by an in-memory cache",
+    CACHE_HITS: "Lookups served by an in-memory cache",
+    CACHE_MISSES: "Lookups missed by an in-memory cache",
+    STARTUP_PHASE: "Time spent in each phase of starting the bot",
+}
+
+class Histogram():
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS) -> None:
+        """Cumulative histogram of observed values, matching Prometheus histogram semantics"""
+        self.buckets = buckets
+        self.counts: list[int] = [0] * len(buckets)
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile by linear interpolation within the bucket containing it. Values above the
+        largest bucket are reported as the largest bucket bound.
+        """
+        if self.count == 0:
+            return 0.0
+        rank: float = q * self.count
+        seen: int = 0
+        lower: float = 0.0
+        for bound, count in zip(self.buckets, self.counts):
+            if count and seen + count >= rank:
+                return lower + (bound - lower) * ((rank - seen) / count)
+            seen += count
+            lower = bound
+        return self.buckets[-1]
+
+class MetricsRegistry():
+    def __init__(self) -> None:
+        """
+        Thread safe store of histograms, counters and gauges. Each metric is identified by its name and a
+        set of label values, i.e. (COMMAND_LATENCY, {"command": "rng roll"}).
+        """
+        self.__histograms: dict = {}
+        self.__counters: dict = {}
+        self.__gauges: dict = {}
+        self.__collectors: list = []
+        self.__counter_collectors: list = []
+        self.__lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels):
+        """Records a value, in seconds for latency metrics, in a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            histogram = self.__histograms.get(key)
+            if histogram is None:
+                histogram = self.__histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        """Adds to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            self.__counters[key] = self.__counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels):
+        """Sets a gauge to its current value"""
+        key = (name, tuple(sorted(labels.items())))
+        with self.__lock:
+            self.__gauges[key] = value
+
+    def register_collector(self, collector, counter: bool = False):
+        """
+        Registers a callable returning gauge values as a list of (name, value, labels dict) tuples. Collectors
+        are called whenever metrics are read, i.e. to report cache sizes.
+
+        :param counter: The collector returns counter values instead, running totals kept elsewhere such as a cache's hit count
+        """
+        with self.__lock:
+            (self.__counter_collectors if counter else self.__collectors).append(collector)
+
+    def histograms(self) -> dict:
+        """Returns a copy of every histogram keyed by (name, labels)"""
+        with self.__lock:
+            copies: dict = {}
+            for key, histogram in self.__histograms.items():
+                copy = Histogram(histogram.buckets)
+                copy.counts = list(histogram.counts)
+                copy.count = histogram.count
+                copy.sum = histogram.sum
+                copies[key] = copy
+            return copies
+
+    def counters(self) -> dict:
+        self.__collect(True)
+        with self.__lock:
+            return dict(self.__counters)
+
+    def gauges(self) -> dict:
+        self.__collect(False)
+        with self.__lock:
+            return dict(self.__gauges)
+
+    def clear(self):
+        with self.__lock:
+            self.__histograms.clear()
+            self.__counters.clear()
+            self.__gauges.clear()
+
+    def __collect(self, counter: bool):
+        with self.__lock:
+            collectors = list(self.__counter_collectors if counter else self.__collectors)
+        for collector in collectors:
+            try:
+                for name, value, labels in collector():
+                    key = (name, tuple(sorted(labels.items())))
+                    with self.__lock:
+                        (self.__counters if counter else self.__gauges)[key] = value
+            except Exception as e:
+                print(e)
+
+#Shared registry
+REGISTRY = MetricsRegistry()
+
+def observe(name: str, value: float, **labels):
+    REGISTRY.observe(name, value, **labels)
+
+def increment(name: str, amount: float = 1, **labels):
+    REGISTRY.increment(name, amount, **labels)
+
+def set_gauge(name: str, value: float, **labels):
+    REGISTRY.set_gauge(name, value, **labels)
+
+def register_collector(collector, counter: bool = False):
+    REGISTRY.register_collector(collector, counter)
+
+def register_cache(cache_name: str, stats):
+    """
+    Reports a cache's entries as a gauge and its hits and misses as counters, labelled cache=cache_name
+
+    :param stats: Callable returning a dict with entries, hits and misses keys, i.e. OrderCache.stats
+    """
+    labels: dict = {"cache": cache_name}
+
+    def entries() -> list:
+        return [(CACHE_ENTRIES, stats()["entries"], labels)]
+
+    def lookups() -> list:
+        values: dict = stats()
+        return [(CACHE_HITS, values["hits"], labels), (CACHE_MISSES, values["misses"], labels)]
+
+    REGISTRY.register_collector(entries)
+    REGISTRY.register_collector(lookups, counter=True)
+
+def timed(name: str, **labels):
+    """
+    Decorator recording the run time of every call to the decorated function in a histogram
+
+    :param name: Histogram metric name
+    :param labels: Label values identifying the histogram
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                REGISTRY.observe(name, time.perf_counter() - start, **labels)
+        return wrapper
+    return decorator
+
+@contextmanager
+def startup_phase(phase: str):
+    """Records the time spent in the block as one phase of starting the bot, a gauge labelled phase=phase"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.set_gauge(STARTUP_PHASE, time.perf_counter() - start, phase=phase)
+
+def startup_report() -> str:
+    """
+    Formats the recorded startup phases, one line per phase in the order they were recorded, followed by their total
+
+    :return: Report text
+    """
+    phases: list = [(dict(labels)["phase"], value) for (name, labels), value in REGISTRY.gauges().items() if name == STARTUP_PHASE]
+    lines: list[str] = [f"{phase:<14}{value * 1000:10.1f} ms" for phase, value in phases]
+    lines.append(f"{'total':<14}{sum(value for phase, value in phases) * 1000:10.1f} ms")
+    return "\n".join(lines)
+
+async def monitor_event_loop_lag(interval: float = 0.5):
+    """
+    Runs forever on the event loop, recording how late each interval timer fires. Sustained lag means a
+    coroutine is blocking the loop.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        REGISTRY.observe(EVENT_LOOP_LAG, lag)
+        REGISTRY.set_gauge(EVENT_LOOP_LAG_LAST, lag)
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in pairs) + "}"
+
+def render_prometheus() -> str:
+    """
+    Renders every metric in the Prometheus text exposition format
+
+    :return: Exposition text
+    """
+    lines: list[str] = []
+    described: set = set()
+
+    def describe(name: str, kind: str):
+        if name not in described:
+            described.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), histogram in sorted(REGISTRY.histograms().items()):
+        describe(name, "histogram")
+        cumulative: int = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', bound),))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {histogram.count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+
+    for (name, labels), value in sorted(REGISTRY.counters().items()):
+        describe(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), value in sorted(REGISTRY.gauges().items()):
+        describe(name, "gauge")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    return "\n".join(lines) + "\n"
+
+def write_prometheus(path: str = PROMETHEUS_FILE):
+    """
+    Writes the Prometheus exposition text to path. The file is replaced atomically so collectors never
+    read a partial file.
+    """
+    if not path:
+        return
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as metrics_file:
+        metrics_file.write(render_prometheus())
+    os.replace(temporary_path, path)
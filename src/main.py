@@ -1,5 +1,5 @@
 import asyncio
-from DungeonBot import DungeonBot
+from DungeonBot import DungeonBot, cluster
 import os
 
 #Enter your Discord Bot Token here
@@ -10,4 +10,8 @@ async def main():
     await DungeonBot.start(TOKEN)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    #Set DungeonBotClusterWorkers to run the bot as several processes, see DungeonBot.cluster
+    if cluster.CLUSTER_WORKERS > 1:
+        cluster.supervise(TOKEN)
+    else:
+        asyncio.run(main())
\ No newline at end of file
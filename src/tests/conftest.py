@@ -0,0 +1,36 @@
+"""
+Shared test setup. Tests run against two database shards in a temporary directory, with the src/ directory
+importable like when the bot is started from it.
+"""
+import os
+import sys
+
+import pytest
+
+SRC_DIRECTORY: str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRC_DIRECTORY)
+#Read by DBHelper at import
+os.environ.setdefault("DungeonBotDatabaseShards", "2")
+
+import DBHelper
+from DBHelper.orderCache import order_cache
+from DBHelper.encounterCache import encounter_cache
+
+@pytest.fixture
+def database(tmp_path):
+    """Points DBHelper at a new database directory for the duration of a test"""
+    original: str = DBHelper.DATABASE_DIRECTORY
+    DBHelper.DATABASE_DIRECTORY = str(tmp_path / "dungeonBot.db")
+    order_cache.clear()
+    encounter_cache.clear()
+    yield tmp_path
+    DBHelper.close_connections()
+    DBHelper.DATABASE_DIRECTORY = original
+    order_cache.clear()
+    encounter_cache.clear()
+
+@pytest.fixture
+def src_directory(monkeypatch):
+    """Runs a test from the src/ directory, which the bot's asset paths are relative to"""
+    monkeypatch.chdir(SRC_DIRECTORY)
+    return SRC_DIRECTORY
@@ -0,0 +1,43 @@
+import asyncio
+import threading
+
+import DBHelper
+from DBHelper import asyncDB, orderDB
+from DBHelper.usersDB import INSERT_USER_IF_MISSING
+
+def _guild_on_shard(shard: int) -> int:
+    return next(guild_id for guild_id in range(1, 1000) if DBHelper.shard_for_guild(guild_id) == shard)
+
+def test_interactions_progress_while_a_slow_write_runs(database):
+    """A write holding shard 0's worker must block neither the event loop nor shard 1's worker"""
+    assert DBHelper.SHARD_COUNT >= 2
+    release = threading.Event()
+    started = threading.Event()
+
+    def slow_write(shard: int = 0):
+        with DBHelper.transaction(shard) as conn:
+            conn.execute(INSERT_USER_IF_MISSING, (1,))
+            started.set()
+            if not release.wait(10):
+                raise TimeoutError("The slow write was never released")
+
+    async def ticker(ticks: int) -> int:
+        for i in range(ticks):
+            await asyncio.sleep(0.001)
+        return ticks
+
+    async def scenario():
+        slow = asyncio.create_task(asyncDB.run(slow_write, shard=0))
+        await asyncio.to_thread(started.wait, 10)
+
+        #Other coroutines keep running and shard 1 keeps committing while shard 0 is busy
+        assert await asyncio.wait_for(ticker(20), 5) == 20
+        guild_id: int = _guild_on_shard(1)
+        await asyncio.wait_for(asyncDB.run(orderDB.add_order_command, 2, "Goblin", 12, 1, guild_id=guild_id, channel_id=7), 5)
+        assert await asyncDB.run(orderDB.get_initiative_order, 2, guild_id=guild_id, channel_id=7) == [("Goblin", 12, 1)]
+        assert not slow.done()
+
+        release.set()
+        await asyncio.wait_for(slow, 5)
+
+    asyncio.run(scenario())
@@ -0,0 +1,46 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+from conftest import SRC_DIRECTORY
+
+#Seconds the cluster gets to start both workers, crash them and restart them, RESTART_DELAY_SECONDS included
+CLUSTER_TIMEOUT_SECONDS: float = 90
+
+def test_fake_gateway_workers_are_restarted(tmp_path):
+    """Both fake gateway workers report ready, and a worker exiting after --crash-after is started and ready again"""
+    (tmp_path / "Database").mkdir()
+    (tmp_path / "Assets").symlink_to(os.path.join(SRC_DIRECTORY, "Assets"))
+    environment: dict = dict(os.environ, PYTHONPATH=SRC_DIRECTORY, PYTHONUNBUFFERED="1", DungeonBotDatabaseShards="2")
+    supervisor = subprocess.Popen(
+        [sys.executable, "-m", "DungeonBot.cluster", "--fake-gateway", "--workers", "2", "--shards", "2", "--crash-after", "1"],
+        cwd=tmp_path, env=environment, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, start_new_session=True
+    )
+    #Ends the read loop below should the cluster hang
+    watchdog = threading.Timer(CLUSTER_TIMEOUT_SECONDS, os.killpg, (supervisor.pid, signal.SIGKILL))
+    watchdog.start()
+    ready: list = []
+    exited: list = []
+    try:
+        for line in supervisor.stdout:
+            if line.startswith("Worker ") and line.rstrip().endswith(" ready"):
+                ready.append(int(line.split()[1]))
+            elif line.startswith("Worker ") and " exited with code " in line:
+                exited.append(int(line.split()[1]))
+            if exited and all(ready.count(worker_id) >= 2 for worker_id in exited):
+                break
+    finally:
+        watchdog.cancel()
+        supervisor.send_signal(signal.SIGTERM)
+        try:
+            supervisor.wait(60)
+        except subprocess.TimeoutExpired:
+            os.killpg(supervisor.pid, signal.SIGKILL)
+            supervisor.wait()
+        supervisor.stdout.close()
+
+    assert ready[:2] == [0, 1]
+    assert exited
+    assert all(ready.count(worker_id) >= 2 for worker_id in exited)
@@ -0,0 +1,37 @@
+import discord
+from discord import app_commands
+
+from DungeonBot.commandSync import _command_payload, command_tree_hash
+
+def _tree(description: str = "Roll a die") -> app_commands.CommandTree:
+    tree = app_commands.CommandTree(discord.Client(intents=discord.Intents.none()))
+
+    @app_commands.command(description=description)
+    @app_commands.describe(sides="Number of sides")
+    async def roll(interaction: discord.Interaction, sides: int = 20):
+        pass
+
+    @app_commands.command(description="Show the order")
+    async def show(interaction: discord.Interaction):
+        pass
+
+    tree.add_command(show)
+    tree.add_command(roll)
+    return tree
+
+def test_tree_hash_is_stable():
+    """Equal trees hash alike whatever the order commands were added in, any signature change alters the hash"""
+    tree = _tree()
+
+    assert command_tree_hash(tree, 1) == command_tree_hash(tree, 1)
+    assert command_tree_hash(tree, 1) == command_tree_hash(_tree(), 1)
+    assert command_tree_hash(tree, 1) != command_tree_hash(_tree("Roll dice"), 1)
+    assert command_tree_hash(tree, 1) != command_tree_hash(tree, 2)
+
+def test_payload_without_tree_argument():
+    """Commands of discord.py before 2.4, whose to_dict takes no tree, are still hashed"""
+    class LegacyCommand():
+        def to_dict(self) -> dict:
+            return {"name": "legacy"}
+
+    assert _command_payload(LegacyCommand(), None) == {"name": "legacy"}
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from DungeonBot.cogs.RNG.diceExpression import DiceExpressionError
+from DungeonBot.cogs.RNG.diceDistribution import expression_distribution, dice_pmf, convolve, MAX_KEEP_OUTCOMES, MAX_DISTRIBUTION_POINTS
+
+def test_known_probabilities():
+    """Exact odds match values worked out by hand"""
+    assert expression_distribution("3d8+2").at_least(15) == pytest.approx(0.59375)
+    assert expression_distribution("4d6kh3").mean() == pytest.approx(15869 / 1296)
+    assert expression_distribution("4d6kh3").mean() == pytest.approx(12.2446, abs=1e-4)
+    assert expression_distribution("1d6 - 1d6").exactly(0) == pytest.approx(1 / 6)
+    assert expression_distribution("2d6").exactly(7) == pytest.approx(6 / 36)
+
+def test_bounds():
+    """Distributions span the smallest to the largest total, negative terms included"""
+    distribution = expression_distribution("2d20kl1 - 2d4 + 3")
+
+    assert (distribution.minimum, distribution.maximum) == (1 - 8 + 3, 20 - 2 + 3)
+    assert distribution.pmf.sum() == pytest.approx(1)
+    assert distribution.at_least(distribution.minimum) == pytest.approx(1)
+    assert distribution.at_most(distribution.minimum - 1) == 0
+    assert distribution.exactly(distribution.maximum + 1) == 0
+
+def test_drop_matches_keep():
+    """Dropping the lowest die is the same distribution as keeping the rest"""
+    np.testing.assert_allclose(expression_distribution("4d6dl1").pmf, expression_distribution("4d6kh3").pmf)
+
+def test_fft_convolution_matches_direct():
+    """Large pools convolved with FFT match direct convolution"""
+    first, second = dice_pmf(300, 20), dice_pmf(200, 20)
+
+    np.testing.assert_allclose(convolve(first, second), np.convolve(first, second), atol=1e-12)
+    assert expression_distribution("500d20").mean() == pytest.approx(500 * 10.5)
+
+def test_oversized_distributions_are_refused():
+    """Keep/drop terms over MAX_KEEP_OUTCOMES outcomes and totals over MAX_DISTRIBUTION_POINTS raise"""
+    assert 20 ** 20 > MAX_KEEP_OUTCOMES
+    with pytest.raises(DiceExpressionError):
+        expression_distribution("20d20kh1")
+    with pytest.raises(DiceExpressionError):
+        expression_distribution(f"{MAX_DISTRIBUTION_POINTS // 999 + 1}d1000")
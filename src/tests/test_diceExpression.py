@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from DungeonBot.cogs.RNG import diceExpression
+from DungeonBot.cogs.RNG.diceExpression import DiceExpressionError, DiceTerm, ConstantTerm, MAX_DICE, MAX_SIDES, MAX_TERMS, parse
+
+def test_terms_are_parsed_in_order():
+    """Dice, keep/drop and constant terms keep their signs and read back in expression order"""
+    parsed = parse("4d6kh3 - d20 + 2D8dl1 - 3")
+
+    assert [type(term) for term in parsed.terms] == [DiceTerm, DiceTerm, DiceTerm, ConstantTerm]
+    assert [term.sign for term in parsed.terms] == [1, -1, 1, -1]
+    assert str(parsed) == "4d6kh3 - 1d20 + 2d8kh1 - 3"
+    assert parsed.dice_count() == 7
+
+@pytest.mark.parametrize("modifier, keep, keep_count", [
+    ("kh3", "h", 3), ("k3", "h", 3), ("kl1", "l", 1), ("dl1", "h", 3), ("dh2", "l", 2)
+])
+def test_keep_and_drop_modifiers(modifier, keep, keep_count):
+    """Drop modifiers are stored as the equivalent keep of the remaining dice"""
+    term = parse(f"4d6{modifier}").terms[0]
+
+    assert (term.keep, term.keep_count) == (keep, keep_count)
+
+def test_kept_values():
+    """4d6kh3 counts the three highest dice and 4d6kl1 the lowest"""
+    values = np.array([2, 6, 1, 4])
+
+    assert sorted(parse("4d6kh3").terms[0].kept(values)) == [2, 4, 6]
+    assert sorted(parse("4d6kl1").terms[0].kept(values)) == [1]
+    assert sorted(parse("4d6dh1").terms[0].kept(values)) == [1, 2, 4]
+
+def test_rolled_totals_are_within_range():
+    """Every roll of 4d6kh3 + 2 totals the kept dice and the constant"""
+    diceExpression.seed(0)
+    try:
+        for i in range(100):
+            total, results = parse("4d6kh3 + 2").roll()
+            term, values, subtotal = results[0]
+            assert len(values) == 4
+            assert subtotal == sum(sorted(values)[1:])
+            assert total == subtotal + 2
+            assert 5 <= total <= 20
+    finally:
+        diceExpression.seed()
+
+@pytest.mark.parametrize("expression", ["", "   ", "2d", "d", "4d6x", "2d6 3", "1d6 +", "0d6", "2d0", "4d6kh5", "4d6dl4"])
+def test_malformed_expressions_are_refused(expression):
+    with pytest.raises(DiceExpressionError):
+        parse(expression)
+
+def test_limits():
+    """Expressions at the limits parse, one past any of them is refused"""
+    parse(f"{MAX_DICE}d6")
+    parse(f"d{MAX_SIDES}")
+    parse(" + ".join(["1"] * MAX_TERMS))
+
+    with pytest.raises(DiceExpressionError):
+        parse(f"{MAX_DICE + 1}d6")
+    with pytest.raises(DiceExpressionError):
+        parse(f"{MAX_DICE}d6 + d6")
+    with pytest.raises(DiceExpressionError):
+        parse(f"d{MAX_SIDES + 1}")
+    with pytest.raises(DiceExpressionError):
+        parse(" + ".join(["1"] * (MAX_TERMS + 1)))
@@ -0,0 +1,29 @@
+import pytest
+
+from DBHelper import encounterDB, orderDB
+
+def _start_combat():
+    orderDB.add_many_order_commands(1, [("Fighter", 18, 0), ("Goblin", 12, 0), ("Wizard", 5, 0)])
+    encounterDB.next_turn(1)
+
+def test_delay_passes_the_turn(database):
+    """Delaying the current character moves it after the target and passes the turn to the next one"""
+    _start_combat()
+
+    assert encounterDB.delay_turn(1, after_name="Wizard") == (1, 0, "Goblin")
+    assert [row[0] for row in orderDB.get_initiative_order(1)] == ["Goblin", "Wizard", "Fighter"]
+
+def test_failed_delay_leaves_the_turn(database, monkeypatch):
+    """A delay whose write fails changes neither the cached order nor the cached turn"""
+    _start_combat()
+    encounterDB.next_turn(1)
+
+    def fail(*args):
+        raise OSError("disk I/O error")
+
+    monkeypatch.setattr(encounterDB, "_upsert_turn", fail)
+    with pytest.raises(OSError):
+        encounterDB.delay_turn(1, after_name="Wizard")
+
+    assert encounterDB.get_turn(1) == (1, 1, "Goblin")
+    assert [row[0] for row in orderDB.get_initiative_order(1)] == ["Fighter", "Goblin", "Wizard"]
@@ -0,0 +1,39 @@
+import pytest
+
+import DBHelper
+from DBHelper import groupCommit, orderDB
+from DBHelper.groupCommit import GroupCommitWorker
+
+def test_reads_run_outside_of_group_commits(database):
+    """Read only calls neither join a group nor hold the write lock"""
+    @DBHelper.read_only
+    def in_transaction(shard: int = 0) -> bool:
+        return DBHelper.get_connection(shard).in_transaction
+
+    worker = GroupCommitWorker(0)
+    try:
+        assert worker.submit(orderDB.add_order_command, (1, "Goblin", 10, 0)).result(10) is None
+        assert worker.submit(in_transaction).result(10) is False
+        assert worker.submit(orderDB.get_initiative_order, (1,)).result(10) == [("Goblin", 10, 0)]
+        assert worker.commits == 1
+    finally:
+        worker.shutdown()
+
+def test_connection_failure_fails_queued_calls(database, monkeypatch):
+    """A worker whose connection cannot be opened fails its calls instead of leaving them pending"""
+    def fail(shard: int = 0):
+        raise OSError("unable to open database file")
+
+    monkeypatch.setattr(groupCommit, "get_connection", fail)
+    worker = GroupCommitWorker(0)
+    try:
+        with pytest.raises(OSError):
+            worker.submit(orderDB.get_initiative_order, (1,)).result(10)
+        with pytest.raises(OSError):
+            worker.submit(orderDB.add_order_command, (1, "Goblin", 10, 0)).result(10)
+
+        #The next call opens the connection again
+        monkeypatch.setattr(groupCommit, "get_connection", DBHelper.get_connection)
+        assert worker.submit(orderDB.get_initiative_order, (1,)).result(10) == []
+    finally:
+        worker.shutdown()
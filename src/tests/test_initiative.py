@@ -0,0 +1,45 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from DBHelper import usersDB
+from DungeonBot.cogs.Initiative import initiative
+from DungeonBot.cogs.Initiative.liveTracker import LiveTrackers
+
+class _Response():
+    def __init__(self) -> None:
+        self.messages: list = []
+
+    async def send_message(self, content=None, **kwargs):
+        self.messages.append(content)
+
+    def is_done(self) -> bool:
+        return bool(self.messages)
+
+class _User():
+    id: int = 1
+
+class _DirectMessage():
+    """Direct message interaction, its order scope is looked up in the database"""
+    guild_id = None
+    channel_id: int = 2
+    user = _User()
+
+    def __init__(self) -> None:
+        self.response = _Response()
+
+@pytest.mark.parametrize("command, arguments", [
+    ("clear", ()), ("claim", ()), ("add", ("Goblin",)), ("remove", ("Goblin",)), ("next", ()), ("round", ())
+])
+def test_failed_scope_lookup_is_answered(database, monkeypatch, command, arguments):
+    """Commands answer 'Something went wrong' when the order scope of a direct message cannot be read"""
+    def locked(user_id: int):
+        raise sqlite3.OperationalError("database is locked")
+    monkeypatch.setattr(usersDB, "get_private_scope", locked)
+    group = initiative(LiveTrackers(client=None, render=None, window=0), name="initiative", description="initiative")
+    interaction = _DirectMessage()
+
+    asyncio.run(getattr(group, command).callback(group, interaction, *arguments))
+
+    assert interaction.response.messages == ["Something went wrong"]
@@ -0,0 +1,33 @@
+import asyncio
+
+from DBHelper import asyncDB, trackerDB
+from DungeonBot.cogs.Initiative.liveTracker import LiveTrackers
+
+class _RecordingTrackers(LiveTrackers):
+    """Records tracker lookups instead of fetching messages"""
+    def __init__(self) -> None:
+        super().__init__(client=None, render=None, window=0)
+        self.lookups: list = []
+
+    async def get_message(self, user_id: int, scope: dict):
+        self.lookups.append((user_id, scope["guild_id"], scope["channel_id"]))
+        return None
+
+def test_only_tracked_orders_are_looked_up(database):
+    """Mutations of orders without a tracker schedule no edit, trackers set before startup are loaded"""
+    tracked: dict = {"guild_id": 5, "channel_id": 7}
+    untracked: dict = {"guild_id": 5, "channel_id": 8}
+
+    async def scenario() -> _RecordingTrackers:
+        await asyncDB.run(trackerDB.set_tracker, 1, 5, 7, 100, **tracked)
+        trackers = _RecordingTrackers()
+        await trackers.load()
+        trackers.touch(1, untracked)
+        trackers.touch(1, tracked)
+        await asyncio.sleep(0.05)
+        #The tracker message was not found, the order is no longer tracked
+        trackers.touch(1, tracked)
+        await asyncio.sleep(0.05)
+        return trackers
+
+    assert asyncio.run(scenario()).lookups == [(1, 5, 7)]
@@ -0,0 +1,83 @@
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import threading
+
+import DBHelper
+from DBHelper.usersDB import INSERT_USER_IF_MISSING
+
+from conftest import SRC_DIRECTORY
+
+#Adds orders forever, backing up every 50 rows and reporting each backup and the writes made after it
+_CHILD: str = """
+import sys
+import DBHelper
+from DBHelper import orderDB
+
+DBHelper.DATABASE_DIRECTORY = sys.argv[1]
+DBHelper.init_database()
+rows = 0
+while True:
+    orderDB.add_order_command(1, f"character {rows}", 10, 0)
+    rows += 1
+    if rows % 50 == 0:
+        DBHelper.backup_database(0)
+        print(f"backup {rows}", flush=True)
+    elif rows % 50 == 25:
+        print(f"written {rows}", flush=True)
+"""
+
+def test_killed_process_keeps_the_last_backup(tmp_path):
+    """A process killed between backups leaves its file holding exactly the last backup"""
+    path: str = str(tmp_path / "dungeonBot.db")
+    environment: dict = dict(os.environ, PYTHONPATH=SRC_DIRECTORY, DungeonBotDatabaseStorage="memory",
+        DungeonBotDatabaseShards="1", DungeonBotSharedDatabase="0")
+    child = subprocess.Popen([sys.executable, "-c", _CHILD, path], env=environment, stdout=subprocess.PIPE, text=True)
+    backed_up: int = 0
+    try:
+        for line in child.stdout:
+            #Skips the migration messages printed at startup
+            if not line.startswith(("backup ", "written ")):
+                continue
+            event, rows = line.split()
+            if event == "backup":
+                backed_up = int(rows)
+            elif backed_up >= 150:
+                #Writes committed in memory since the last backup
+                break
+    finally:
+        child.send_signal(signal.SIGKILL)
+        child.wait()
+        child.stdout.close()
+
+    assert backed_up >= 150
+    with sqlite3.connect(path) as disk:
+        assert disk.execute("PRAGMA integrity_check;").fetchone()[0] == "ok"
+        assert disk.execute(f"SELECT count(*) FROM {DBHelper.ORDER_COMMAND_TABLE};").fetchone()[0] == backed_up
+    disk.close()
+
+def test_memory_connections_wait_for_table_locks(database, monkeypatch):
+    """A read on another thread waits for a write transaction instead of failing with 'database table is locked'"""
+    monkeypatch.setattr(DBHelper, "STORAGE_MODE", "memory")
+    monkeypatch.setattr(DBHelper, "SHARED_DATABASE", False)
+    DBHelper.init_database()
+    written = threading.Event()
+    release = threading.Event()
+
+    def write():
+        with DBHelper.transaction() as conn:
+            conn.execute(INSERT_USER_IF_MISSING, (1,))
+            written.set()
+            release.wait(10)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    written.wait(10)
+    threading.Timer(0.1, release.set).start()
+    users: int = DBHelper.get_connection().execute(f"SELECT count(*) FROM {DBHelper.USERS_TABLE};").fetchone()[0]
+    writer.join()
+
+    assert release.is_set()
+    assert users == 1
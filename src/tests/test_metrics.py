@@ -0,0 +1,12 @@
+import Metrics
+
+def test_cache_lookups_are_counters():
+    """Cache hits and misses are exported as counters, the number of entries as a gauge"""
+    Metrics.register_cache("test", lambda: {"entries": 2, "hits": 5, "misses": 1})
+    labels: tuple = (("cache", "test"),)
+
+    assert Metrics.REGISTRY.counters()[(Metrics.CACHE_HITS, labels)] == 5
+    assert Metrics.REGISTRY.counters()[(Metrics.CACHE_MISSES, labels)] == 1
+    assert Metrics.REGISTRY.gauges()[(Metrics.CACHE_ENTRIES, labels)] == 2
+    assert (Metrics.CACHE_HITS, labels) not in Metrics.REGISTRY.gauges()
+    assert f'{Metrics.CACHE_HITS}{{cache="test"}} 5' in Metrics.render_prometheus()
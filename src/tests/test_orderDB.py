@@ -0,0 +1,63 @@
+import sqlite3
+
+import pytest
+
+import DBHelper
+from DBHelper import orderDB
+from DBHelper.orderCache import order_cache
+
+def test_claim_moves_the_legacy_order(database):
+    """Orders from before orders were scoped to channels move to a guild channel, keeping their tie order"""
+    orderDB.add_order_command(1, "Goblin", 10, 0)
+    orderDB.add_order_command(1, "Ogre", 10, 0)
+    orderDB.add_order_command(1, "Wizard", 15, 2)
+    legacy: list = orderDB.get_initiative_order(1)
+
+    assert orderDB.claim_legacy_order(1, guild_id=5, channel_id=7) == 3
+    assert orderDB.get_initiative_order(1, guild_id=5, channel_id=7) == legacy
+    assert orderDB.get_initiative_order(1) == []
+    assert orderDB.claim_legacy_order(1, guild_id=5, channel_id=7) == 0
+
+def test_changed_shard_count_is_refused(database, monkeypatch):
+    """A database file opened with another shard count raises instead of losing its guilds' orders"""
+    DBHelper.init_database()
+    DBHelper.close_connections()
+    monkeypatch.setattr(DBHelper, "SHARD_COUNT", DBHelper.SHARD_COUNT + 1)
+
+    with pytest.raises(DBHelper.ShardLayoutError):
+        DBHelper.get_connection(0)
+
+def test_tied_initiatives_keep_the_oldest_first(database):
+    """Characters with the same initiative are ordered by when they were added, like the stable sort they replaced"""
+    orderDB.add_order_command(1, "Goblin", 10, 2)
+    orderDB.add_order_command(1, "Rogue", 12, 0)
+    orderDB.add_many_order_commands(1, [("Ogre", 11, 1), ("Wizard", 15, 0)])
+    expected: list = ["Wizard", "Goblin", "Rogue", "Ogre"]
+
+    assert [row[0] for row in orderDB.get_initiative_order(1)] == expected
+    #Read back from the database rather than from the order cache
+    order_cache.clear()
+    assert [row[0] for row in orderDB.get_initiative_order(1)] == expected
+
+def test_tie_query_reads_the_initiative_index(database):
+    """Orders are read pre-sorted from the initiative index, without a temporary sort"""
+    plan: list = DBHelper.get_connection().execute(f"""
+        EXPLAIN QUERY PLAN
+        SELECT rowid FROM {DBHelper.ORDER_COMMAND_TABLE}
+        WHERE {DBHelper.USER_ID} = 1 AND {DBHelper.GUILD_ID} = 0 AND {DBHelper.CHANNEL_ID} = 0
+        ORDER BY {DBHelper.INITIATIVE} DESC, rowid ASC;""").fetchall()
+
+    assert any(DBHelper.ORDER_INITIATIVE_INDEX in row[3] for row in plan)
+    assert not any("TEMP B-TREE" in row[3] for row in plan)
+
+def test_maintenance_leaves_legacy_files_alone(database):
+    """A file created without auto_vacuum is not rebuilt by the maintenance pass"""
+    with sqlite3.connect(DBHelper.shard_path(0)) as legacy:
+        legacy.execute("CREATE TABLE filler (data blob);")
+        legacy.execute("INSERT INTO filler VALUES (zeroblob(100000));")
+    legacy.close()
+
+    assert DBHelper.reclaim_free_pages(force=True) == 0
+    assert DBHelper.get_connection().execute("PRAGMA auto_vacuum;").fetchone()[0] == 0
+    DBHelper.init_auto_vacuum(rebuild=True)
+    assert DBHelper.get_connection().execute("PRAGMA auto_vacuum;").fetchone()[0] == 2
@@ -0,0 +1,26 @@
+import pytest
+
+from DungeonBot.cogs.Initiative.partyList import PartyListError, MAX_PARTY_SIZE, parse_party
+
+def test_copies_are_numbered():
+    assert parse_party("Goblin x6 +2, Ogre +0") == [(f"Goblin {number}", 2, None) for number in range(1, 7)] + [("Ogre", 0, None)]
+
+def test_modifiers_and_rolls():
+    """Entries may be split by commas, semicolons or new lines, with optional spaces around signs"""
+    assert parse_party("Wizard - 1 = 17; Bandit Captain x2\nRogue=20,") == [
+        ("Wizard", -1, 17), ("Bandit Captain 1", 0, None), ("Bandit Captain 2", 0, None), ("Rogue", 0, 20)
+    ]
+
+def test_party_size_limit():
+    """A party of exactly MAX_PARTY_SIZE characters parses, one more is refused"""
+    assert len(parse_party(f"Goblin x{MAX_PARTY_SIZE - 1}, Ogre")) == MAX_PARTY_SIZE
+
+    with pytest.raises(PartyListError):
+        parse_party(f"Goblin x{MAX_PARTY_SIZE + 1}")
+    with pytest.raises(PartyListError):
+        parse_party(f"Goblin x{MAX_PARTY_SIZE}, Ogre")
+
+@pytest.mark.parametrize("text", ["", " , ;\n", "Goblin x0"])
+def test_empty_parties_are_refused(text):
+    with pytest.raises(PartyListError):
+        parse_party(text)
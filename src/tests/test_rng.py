@@ -0,0 +1,47 @@
+import asyncio
+
+from DungeonBot.cogs.RNG import RNG
+from DungeonBot.cogs.RNG.dieImage import DIE_ASSETS, ROLL_IMAGE_CACHE, ROLL_IMAGE_CACHE_MAX_ROLLS, rollImage
+from DungeonBot.cogs.RNG.renderPool import RenderPool
+
+class _Response():
+    def __init__(self) -> None:
+        self.messages: list = []
+
+    async def send_message(self, content=None, **kwargs):
+        self.messages.append(content)
+
+class _Interaction():
+    def __init__(self) -> None:
+        self.response = _Response()
+
+def test_render_pool_is_created_outside_of_an_event_loop(src_directory):
+    """A render pool created at import renders in event loops started later"""
+    DIE_ASSETS.load()
+    pool = RenderPool(kind="thread", workers=1)
+    try:
+        for i in range(2):
+            image, total = asyncio.run(pool.roll_image(6, 3))
+            assert 3 <= total <= 18
+            assert image.getvalue()
+    finally:
+        pool.shutdown()
+
+def test_invalid_roll_is_answered():
+    """A roll rejected before its image is rendered answers with the validation error"""
+    interaction = _Interaction()
+    asyncio.run(RNG.roll.callback(RNG(name="rng", description="rng"), interaction, die_type=7))
+
+    assert len(interaction.response.messages) == 1
+
+def test_only_small_rolls_are_cached(src_directory):
+    """Large rolls are rendered without being cached, so they cannot evict the warmed single die images"""
+    DIE_ASSETS.load()
+    ROLL_IMAGE_CACHE.clear()
+    try:
+        rollImage(20, ROLL_IMAGE_CACHE_MAX_ROLLS + 1)
+        assert ROLL_IMAGE_CACHE.stats()["entries"] == 0
+        rollImage(20, ROLL_IMAGE_CACHE_MAX_ROLLS)
+        assert ROLL_IMAGE_CACHE.stats()["entries"] == 1
+    finally:
+        ROLL_IMAGE_CACHE.clear()